@@ -0,0 +1,45 @@
+"""
+对计算题语料（tests/data/calc_problems.tsv）测量本地求解器的单题耗时与覆盖率。
+大模型调用一次通常需要数百毫秒到数秒，本地求解为微秒级。
+
+    python -m benchmarks.bench_calc_solver [rounds]
+"""
+
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from tg_signer.calc_solver import solve
+
+CORPUS_FILE = Path(__file__).parent.parent / "tests" / "data" / "calc_problems.tsv"
+
+
+def load_questions():
+    return [
+        line.split("\t")[0]
+        for line in CORPUS_FILE.read_text("utf-8").splitlines()
+        if line and not line.startswith("#")
+    ]
+
+
+def main(rounds: int):
+    questions = load_questions()
+    solved = sum(solve(q) is not None for q in questions)
+    timings = []
+    for _ in range(rounds):
+        for q in questions:
+            start = time.perf_counter()
+            solve(q)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    print(f"questions: {len(questions)}, solved locally: {solved}")
+    print(
+        f"per question: mean {statistics.mean(timings):.1f}us, "
+        f"p50 {timings[len(timings) // 2]:.1f}us, "
+        f"p99 {timings[int(len(timings) * 0.99)]:.1f}us"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,79 @@
+"""
+对本地HTTP服务进行转发压测，比较每条消息新建`httpx.AsyncClient`与使用`HttpClientPool`的吞吐量。
+
+    python -m benchmarks.bench_http_pool [requests] [concurrency]
+"""
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+from tg_signer.http_pool import HttpClientPool, HttpPoolLimits
+
+BODY = b'{"ok": true}'
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    b"Content-Length: %d\r\n\r\n%s" % (len(BODY), BODY)
+)
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            writer.write(RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def per_message_client(url: str, content: bytes):
+    """旧实现：每条消息一个新的AsyncClient"""
+    async with httpx.AsyncClient() as client:
+        await client.post(url, content=content, timeout=10)
+
+
+async def run(name: str, send, url: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    content = b'{"text": "hello"}'
+
+    async def one():
+        async with semaphore:
+            await send(url, content)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<12} {total} requests in {elapsed:6.2f}s -> {total / elapsed:8.1f} req/s"
+    )
+
+
+async def main(total: int, concurrency: int):
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/callback"
+    async with server:
+        await run("per-message", per_message_client, url, total, concurrency)
+        async with HttpClientPool(
+            HttpPoolLimits(max_concurrency=concurrency, http2=False)
+        ) as pool:
+
+            async def pooled(u, content):
+                await pool.post(u, content=content)
+
+            await run("pooled", pooled, url, total, concurrency)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*(args + [1000, 20][len(args) :])))
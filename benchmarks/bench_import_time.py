@@ -0,0 +1,51 @@
+"""
+用`python -X importtime`统计各入口模块的累计导入耗时，并列出最耗时的依赖。
+
+    python -m benchmarks.bench_import_time [top_n]
+"""
+
+import subprocess
+import sys
+
+TARGETS = ("tg_signer.cli", "tg_signer.config", "tg_signer.core", "tg_signer.ai_tools")
+ROUNDS = 5
+
+
+def profile(code: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cum, name = line.split("|")
+        if cum.strip().isdigit():
+            result[name.strip()] = int(cum) / 1000
+    return result
+
+
+def main(top_n: int):
+    # 解释器启动时就会导入的模块（site等）不计入
+    startup = set(profile("pass"))
+    for module in TARGETS:
+        runs = [profile(f"import {module}") for _ in range(ROUNDS)]
+        best = min(runs, key=lambda r: r[module])
+        print(f"{module:<20} {best[module]:8.1f} ms (best of {ROUNDS})")
+        heaviest = sorted(
+            (
+                (ms, name)
+                for name, ms in best.items()
+                if name != module and "." not in name and name not in startup
+            ),
+            reverse=True,
+        )[:top_n]
+        for ms, name in heaviest:
+            print(f"    {name:<24} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,83 @@
+"""
+模拟大量任务的一次执行周期（查询当天记录 -> 写入记录 -> 清理过期记录），
+比较旧版每任务一个`sign_record.json`（整文件读写）与共享SQLite存储的耗时。
+
+    python -m benchmarks.bench_state_store [tasks] [history_days]
+"""
+
+import json
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from tg_signer.state_store import JSONStateStore, SQLiteStateStore
+
+
+def legacy_cycle(root: Path, task: str, today: str):
+    """旧实现：读取整个文件，追加一天，非原子地重写"""
+    path = root / task / "1" / "sign_record.json"
+    with open(path, "r", encoding="utf-8") as fp:
+        record = json.load(fp)
+    _ = record.get(today)
+    record[today] = today + "T08:00:00"
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(record, fp)
+
+
+def store_cycle(store, task: str, today: str, expire_before: str):
+    store.get("1", task, today)
+    store.upsert("1", task, today, today + "T08:00:00")
+    store.prune(expire_before, account="1", task=task)
+
+
+def history(days: int):
+    start = date(2020, 1, 1)
+    return {
+        str(start + timedelta(days=i)): str(start + timedelta(days=i)) + "T08:00:00"
+        for i in range(days)
+    }
+
+
+def run(name, fn, tasks):
+    start = time.perf_counter()
+    for task in tasks:
+        fn(task)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<8} {len(tasks)} tasks in {elapsed:6.2f}s -> "
+        f"{len(tasks) / elapsed:8.1f} tasks/s"
+    )
+
+
+def main(num_tasks: int, days: int):
+    tasks = [f"task_{i}" for i in range(num_tasks)]
+    records = history(days)
+    today = str(date(2020, 1, 1) + timedelta(days=days))
+    expire_before = str(date(2020, 1, 1) + timedelta(days=days - 90))
+    with tempfile.TemporaryDirectory() as d:
+        root = Path(d)
+        legacy_root = root / "legacy"
+        json_store = JSONStateStore(root / "json")
+        sqlite_store = SQLiteStateStore(root / "state.sqlite3")
+        for task in tasks:
+            path = legacy_root / task / "1" / "sign_record.json"
+            path.parent.mkdir(parents=True)
+            path.write_text(json.dumps(records))
+            json_store.upsert_many("1", task, records)
+            sqlite_store.upsert_many("1", task, records)
+
+        run("legacy", lambda t: legacy_cycle(legacy_root, t, today), tasks)
+        run("json", lambda t: store_cycle(json_store, t, today, expire_before), tasks)
+        run(
+            "sqlite",
+            lambda t: store_cycle(sqlite_store, t, today, expire_before),
+            tasks,
+        )
+        sqlite_store.close()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*(args + [2000, 365][len(args) :]))
@@ -0,0 +1,96 @@
+"""
+比较`UserSigner.wait_for`旧的0.3秒轮询实现与基于Condition的事件驱动实现的响应延迟。
+
+    python -m benchmarks.bench_wait_for
+"""
+
+import asyncio
+import statistics
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+from tg_signer.config import ClickKeyboardByTextAction, SignChatV3
+from tg_signer.core import UserSigner
+
+ROUNDS = 20
+
+
+def fake_message(chat_id: int, text: str):
+    message = MagicMock()
+    message.chat.id = chat_id
+    message.text = text
+    message.photo = None
+    message.reply_markup = None
+    return message
+
+
+async def polling_wait_for(signer: UserSigner, chat: SignChatV3, action, timeout=10):
+    """旧实现：每0.3秒扫描一次整个消息列表"""
+    start = time.perf_counter()
+    last_message = None
+    while time.perf_counter() - start < timeout:
+        await asyncio.sleep(0.3)
+        messages = signer.context.chat_messages.get(chat.chat_id)
+        if not messages or messages[-1] == last_message:
+            continue
+        last_message = messages[-1]
+        for message in messages:
+            if await signer._handle_action_message(action, message):
+                signer.context.chat_messages[chat.chat_id].remove(message)
+                return None
+    return None
+
+
+async def measure(signer: UserSigner, chat: SignChatV3, waiter) -> list:
+    latencies = []
+    arrived = {}
+
+    async def handle(action, message):
+        if message.text == "ok":
+            latencies.append(time.perf_counter() - arrived["at"])
+            return True
+        return False
+
+    signer._handle_action_message = handle
+    for i in range(ROUNDS):
+        signer.context.chat_messages[chat.chat_id].clear()
+
+        async def feed(delay: float):
+            await asyncio.sleep(delay)
+            arrived["at"] = time.perf_counter()
+            await signer._on_message(None, fake_message(chat.chat_id, "ok"))
+
+        # 让消息在轮询周期内的不同位置到达
+        feeder = asyncio.create_task(feed(0.05 + (i % 5) * 0.05))
+        await waiter(signer, chat, chat.actions[0])
+        await feeder
+    return latencies
+
+
+def report(name: str, latencies: list):
+    ms = sorted(x * 1000 for x in latencies)
+    print(
+        f"{name:<8} n={len(ms)} mean={statistics.mean(ms):8.3f}ms "
+        f"p50={ms[len(ms) // 2]:8.3f}ms max={ms[-1]:8.3f}ms"
+    )
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        signer = UserSigner(task_name="bench", session_dir=tmp, workdir=tmp)
+        signer.log = lambda *args, **kwargs: None
+        chat = SignChatV3(chat_id=1, actions=[ClickKeyboardByTextAction(text="x")])
+        signer.context.sign_chats[chat.chat_id].append(chat)
+
+        report("polling", await measure(signer, chat, polling_wait_for))
+        report(
+            "event",
+            await measure(
+                signer, chat, lambda s, c, a: UserSigner.wait_for(s, c, a, timeout=10)
+            ),
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
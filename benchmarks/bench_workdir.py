@@ -0,0 +1,73 @@
+"""
+比较大量任务目录下旧版路径解析（每次访问都`is_dir`/`makedirs`，`os.listdir`后逐个`is_dir`）
+与`WorkdirLayout`（路径缓存、单次`os.scandir`并按目录mtime缓存）的耗时。
+
+    python -m benchmarks.bench_workdir [tasks] [accesses]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tg_signer.workdir import WorkdirLayout
+
+
+def legacy_make_dirs(path: Path):
+    if not path.is_dir():
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def legacy_config_file(root: Path, task: str) -> Path:
+    workdir = legacy_make_dirs(root)
+    tasks_dir = legacy_make_dirs(workdir / "signs")
+    return legacy_make_dirs(tasks_dir / task) / "config.json"
+
+
+def legacy_task_list(root: Path):
+    tasks_dir = legacy_make_dirs(legacy_make_dirs(root) / "signs")
+    return [d for d in os.listdir(tasks_dir) if tasks_dir.joinpath(d).is_dir()]
+
+
+def timeit(name, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {repeat:>6} x {elapsed / repeat * 1e6:10.1f} us")
+
+
+def main(num_tasks: int, accesses: int):
+    with tempfile.TemporaryDirectory() as d:
+        root = Path(d)
+        for i in range(num_tasks):
+            (root / "signs" / f"task_{i}").mkdir(parents=True)
+        # 刚修改过的目录不会使用缓存（见RACY_WINDOW），将mtime调早以测量缓存命中
+        past = time.time() - 60
+        os.utime(root / "signs", (past, past))
+        layout = WorkdirLayout(root, "signs")
+        print(f"{num_tasks} tasks")
+        timeit(
+            "legacy config_file",
+            lambda: legacy_config_file(root, "task_0"),
+            accesses,
+        )
+        timeit(
+            "layout config_file",
+            lambda: layout.task_dir("task_0") / "config.json",
+            accesses,
+        )
+        timeit("legacy get_task_list", lambda: legacy_task_list(root), 20)
+        timeit(
+            "layout scan (uncached)",
+            lambda: (layout.task_index.invalidate(), layout.task_index.names()),
+            20,
+        )
+        timeit("layout scan (cached)", layout.task_index.names, 20)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*(args + [5000, 10000][len(args) :]))
@@ -0,0 +1,147 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError
+
+from tg_signer.ai_tools import (
+    AIClient,
+    AIClientLimits,
+    calculate_problem,
+    close_ai_clients,
+    get_ai_client,
+    stream_reply,
+)
+
+
+def fake_completion(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def make_client(create, **limits) -> AIClient:
+    limits.setdefault("backoff_base", 0.001)
+    client = AIClient("sk-test", model="m", limits=AIClientLimits(**limits))
+    client.openai.chat.completions.create = create
+    return client
+
+
+def connection_error():
+    return APIConnectionError(request=httpx.Request("POST", "http://ai.test"))
+
+
+@pytest.mark.asyncio
+async def test_registry(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_MODEL", raising=False)
+    assert get_ai_client() is None
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    c1 = get_ai_client()
+    assert c1 is get_ai_client()
+    assert c1 is not get_ai_client(model="other")
+    assert c1 is not get_ai_client(api_key="sk-other")
+    await close_ai_clients()
+    assert c1.closed
+    assert get_ai_client() is not c1
+    await close_ai_clients()
+
+
+@pytest.mark.asyncio
+async def test_retry_then_success():
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise connection_error()
+        return fake_completion(" 42 ")
+
+    client = make_client(create, max_retries=2, timeout=5)
+    assert await calculate_problem("6*7", client=client) == "42"
+    assert len(calls) == 3
+    assert calls[0]["model"] == "m"
+    assert calls[0]["timeout"] == 5
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_retry_exhausted_and_not_retryable():
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        raise connection_error()
+
+    client = make_client(create, max_retries=1)
+    with pytest.raises(APIConnectionError):
+        await client.chat_completion(messages=[])
+    assert len(calls) == 2
+
+    async def bad_request(**kwargs):
+        calls.append(kwargs)
+        request = httpx.Request("POST", "http://ai.test")
+        raise BadRequestError(
+            "bad", response=httpx.Response(400, request=request), body=None
+        )
+
+    calls.clear()
+    client.openai.chat.completions.create = bad_request
+    with pytest.raises(BadRequestError):
+        await client.chat_completion(messages=[])
+    assert len(calls) == 1
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    inflight = peak = 0
+
+    async def create(**kwargs):
+        nonlocal inflight, peak
+        inflight += 1
+        peak = max(peak, inflight)
+        await asyncio.sleep(0.01)
+        inflight -= 1
+        return fake_completion("ok")
+
+    client = make_client(create, max_concurrency=2)
+    await asyncio.gather(*(client.chat_completion(messages=[]) for _ in range(6)))
+    assert peak == 2
+    await client.aclose()
+
+
+def fake_chunk(content):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeStream:
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for content in self.contents:
+            yield fake_chunk(content)
+
+
+@pytest.mark.asyncio
+async def test_stream_reply_retries_before_first_chunk():
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise connection_error()
+        return FakeStream(["你", None, "好"])
+
+    client = make_client(create, max_retries=1)
+    deltas = [d async for d in stream_reply("prompt", "hi", client=client)]
+    assert deltas == ["你", "好"]
+    assert len(calls) == 2
+    assert calls[1]["stream"] is True
+    assert client._semaphore._value == client.limits.max_concurrency
+    await client.aclose()
@@ -0,0 +1,114 @@
+import io
+import itertools
+import json
+
+import pytest
+
+from tg_signer import archive
+from tg_signer.archive import (
+    ArchiveError,
+    export_tasks,
+    import_tasks,
+    open_archive,
+    read_archive,
+    validate_configs,
+)
+from tg_signer.config import MonitorConfig, SignConfigV3
+
+V2 = {"chats": [{"chat_id": 1, "sign_text": "签到"}], "sign_at": "06:00:00"}
+V3 = {
+    "chats": [{"chat_id": 2, "actions": [{"action": 1, "text": "打卡"}]}],
+    "sign_at": "0 6 * * *",
+    "_version": 3,
+}
+
+
+def make_task(tasks_dir, name, config):
+    task_dir = tasks_dir / name
+    task_dir.mkdir(parents=True)
+    (task_dir / "config.json").write_text(json.dumps(config), encoding="utf-8")
+
+
+def test_export_import_roundtrip(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    make_task(src, "a", V2)
+    make_task(src, "b", V3)
+    (src / "empty").mkdir()
+    make_task(src, "broken", None)
+    (src / "broken" / "config.json").write_text("{", encoding="utf-8")
+
+    archive = tmp_path / "tasks.jsonl.gz"
+    with open_archive(archive, "w") as fp:
+        count, errors = export_tasks(src, fp, SignConfigV3)
+    assert count == 2
+    assert [task for task, _ in errors] == ["broken"]
+
+    with open_archive(archive, "r") as fp:
+        items = list(read_archive(fp, SignConfigV3))
+    assert [task for task, _ in items] == ["a", "b"]
+
+    results = import_tasks(dst, items, SignConfigV3)
+    assert [(r.task, r.status) for r in results] == [("a", "new"), ("b", "new")]
+    saved = json.loads((dst / "a" / "config.json").read_text(encoding="utf-8"))
+    # 旧版本配置导入时升级为当前版本
+    assert saved["_version"] == 3
+    assert saved["chats"][0]["actions"][0]["text"] == "签到"
+
+    results = import_tasks(dst, items, SignConfigV3)
+    assert {r.status for r in results} == {"unchanged"}
+
+
+def test_dry_run_diff_and_invalid(tmp_path):
+    make_task(tmp_path, "a", V3)
+    changed = {**V3, "sign_at": "0 7 * * *"}
+    items = [("a", changed), ("b", {"foo": 1}), ("../c", V3), ("a", V3)]
+    results = import_tasks(tmp_path, items, SignConfigV3, dry_run=True)
+    assert [r.status for r in results] == ["changed", "invalid", "invalid", "invalid"]
+    assert '-  "sign_at": "0 6 * * *"' in results[0].diff
+    assert '+  "sign_at": "0 7 * * *"' in results[0].diff
+    # dry-run不写入
+    saved = json.loads((tmp_path / "a" / "config.json").read_text(encoding="utf-8"))
+    assert saved["sign_at"] == "0 6 * * *"
+    assert not (tmp_path / "b").exists()
+
+
+def test_parallel_validation(tmp_path):
+    items = [(f"t{i}", {**V3, "sign_at": f"0 {i} * * *"}) for i in range(6)]
+    items.append(("bad", {"chats": 1}))
+    results = import_tasks(tmp_path, items, SignConfigV3, workers=2)
+    assert [r.status for r in results] == ["new"] * 6 + ["invalid"]
+    assert len(list(tmp_path.iterdir())) == 6
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_validate_configs_streams(monkeypatch, workers):
+    """分块读取输入，不会在返回第一个结果前读完全部配置"""
+    monkeypatch.setattr(archive, "CHUNK_SIZE", 3)
+    consumed = 0
+
+    def items():
+        nonlocal consumed
+        for i in range(1000):
+            consumed += 1
+            yield f"t{i}", V3
+
+    results = validate_configs(items(), SignConfigV3, workers=workers)
+    first = list(itertools.islice(results, 5))
+    assert [task for task, _, error in first if error is None] == [
+        f"t{i}" for i in range(5)
+    ]
+    assert consumed <= 3 * (workers * 2 + 1)
+    results.close()
+
+
+def test_read_archive_errors():
+    with pytest.raises(ArchiveError):
+        list(read_archive(io.StringIO(""), SignConfigV3))
+    with pytest.raises(ArchiveError):
+        list(read_archive(io.StringIO('{"task": "a"}\n'), SignConfigV3))
+    fp = io.StringIO()
+    export_tasks("/nonexistent", fp, MonitorConfig)
+    fp.seek(0)
+    # 监控配置的归档不能导入为签到配置
+    with pytest.raises(ArchiveError):
+        list(read_archive(fp, SignConfigV3))
@@ -0,0 +1,62 @@
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+
+from tg_signer.calc_solver import (
+    UnsupportedExpression,
+    cn_to_number,
+    evaluate,
+    solve,
+)
+
+CORPUS_FILE = Path(__file__).parent / "data" / "calc_problems.tsv"
+
+
+def load_corpus():
+    corpus = []
+    for line in CORPUS_FILE.read_text("utf-8").splitlines():
+        if not line or line.startswith("#"):
+            continue
+        question, answer = line.split("\t")
+        corpus.append((question, answer or None))
+    return corpus
+
+
+@pytest.mark.parametrize("question,answer", load_corpus())
+def test_corpus(question, answer):
+    assert solve(question) == answer
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("十", 10),
+        ("十二", 12),
+        ("二十", 20),
+        ("一百零五", 105),
+        ("两千三百", 2300),
+        ("一万二千", 12000),
+        ("一亿二千万", 120000000),
+        ("一二三", 123),
+        ("三点一四", Fraction("3.14")),
+    ],
+)
+def test_cn_to_number(text, expected):
+    assert cn_to_number(text) == expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "__import__('os')",
+        "a + 1",
+        "[1, 2]",
+        "2 ** 1000",
+        "9" * 30 + " * " + "9" * 30,
+        "1 + " * 100 + "1",
+    ],
+)
+def test_evaluate_rejects(expression):
+    with pytest.raises(UnsupportedExpression):
+        evaluate(expression)
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from pyrogram import errors
+
+from tg_signer.command_queue import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    CommandQueue,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    def test_wait_time(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        assert bucket.wait_time() == 0
+        bucket.consume()
+        bucket.consume()
+        assert bucket.wait_time() == pytest.approx(0.5)
+        clock.now = 0.5
+        assert bucket.wait_time() == 0
+        clock.now = 100
+        bucket._refill(clock())
+        assert bucket.tokens == 2
+
+    def test_pause(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=10, clock=clock)
+        bucket.pause(3)
+        assert bucket.wait_time() == pytest.approx(3)
+
+
+def _recorder(log, name, result=None):
+    async def func():
+        log.append(name)
+        return result
+
+    return func
+
+
+class TestCommandQueue:
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        queue = CommandQueue(account_rate=1000, account_burst=1000, chat_rate=1000)
+        log = []
+        futures = [
+            queue.submit(_recorder(log, "low"), priority=PRIORITY_LOW),
+            queue.submit(_recorder(log, "normal")),
+            queue.submit(_recorder(log, "high"), priority=PRIORITY_HIGH),
+        ]
+        await asyncio.gather(*futures)
+        assert log == ["high", "normal", "low"]
+
+    @pytest.mark.asyncio
+    async def test_chat_rate_limit_does_not_block_other_chats(self):
+        queue = CommandQueue(
+            account_rate=1000, account_burst=1000, chat_rate=20, chat_burst=1
+        )
+        log = []
+        futures = [queue.submit(_recorder(log, f"a{i}"), chat_id="a") for i in range(3)]
+        futures.append(queue.submit(_recorder(log, "b0"), chat_id="b"))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*futures)
+        assert log[:2] == ["a0", "b0"]
+        # 同一chat的第3条消息至少等待两个令牌的补充时间
+        assert loop.time() - start >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_own_bucket_bypasses_chat_limit(self):
+        queue = CommandQueue(
+            account_rate=0.01,
+            account_burst=1,
+            chat_rate=0.01,
+            chat_burst=1,
+            schedule_rate=1000,
+            schedule_burst=1000,
+        )
+        log = []
+        futures = [
+            queue.submit(_recorder(log, i), chat_id="a", bucket=queue.schedule_bucket)
+            for i in range(20)
+        ]
+        await asyncio.wait_for(asyncio.gather(*futures), 1)
+        assert log == list(range(20))
+        # 不占用账号和chat的令牌
+        assert queue.account_bucket.wait_time() == 0
+
+    @pytest.mark.asyncio
+    async def test_dedupe(self):
+        queue = CommandQueue(account_rate=1000, account_burst=1000, chat_rate=1000)
+        log = []
+        f1 = queue.submit(_recorder(log, "x", 1), dedupe_key="k")
+        f2 = queue.submit(_recorder(log, "x", 2), dedupe_key="k")
+        assert f1 is f2
+        assert await f1 == 1
+        assert log == ["x"]
+        assert await queue.submit(_recorder(log, "x", 3), dedupe_key="k") == 3
+
+    @pytest.mark.asyncio
+    async def test_flood_wait_absorbed(self):
+        queue = CommandQueue(account_rate=1000, account_burst=1000, chat_rate=1000)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise errors.FloodWait(value=0)
+            return "sent"
+
+        assert await queue.run(flaky, chat_id=1) == "sent"
+        assert len(attempts) == 3
+
+    @pytest.mark.asyncio
+    async def test_flood_wait_too_long(self):
+        queue = CommandQueue(account_rate=1000, account_burst=1000, max_flood_wait=5)
+
+        async def flood():
+            raise errors.FloodWait(value=3600)
+
+        with pytest.raises(errors.FloodWait):
+            await queue.run(flood, chat_id=1)
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate(self):
+        queue = CommandQueue()
+
+        async def bad():
+            raise ValueError("x")
+
+        with pytest.raises(ValueError):
+            await queue.run(bad)
+        await queue.join()
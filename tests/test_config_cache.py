@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from pyrogram import filters
+
+from tg_signer.config import MonitorConfig, SignConfigV3
+from tg_signer.config_cache import ConfigCache, ConfigLoadError
+from tg_signer.core import UserMonitor
+
+SIGN_CONFIG = {
+    "chats": [{"chat_id": 1, "actions": [{"action": 1, "text": "签到"}]}],
+    "sign_at": "0 6 * * *",
+}
+
+
+def write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_cache_hit_and_change(tmp_path):
+    path = tmp_path / "config.json"
+    write(path, {**SIGN_CONFIG, "_version": 3})
+    cache = ConfigCache()
+    c1, from_old, stamp1 = cache.load(path, SignConfigV3)
+    c2, _, stamp2 = cache.load(path, SignConfigV3)
+    assert c1 is c2 and not from_old and stamp1 == stamp2
+    assert cache.stats == {"hit": 1, "miss": 1}
+
+    write(path, {**SIGN_CONFIG, "sign_at": "30 7 * * *"})
+    c3, _, stamp3 = cache.load(path, SignConfigV3)
+    assert c3.sign_at == "30 7 * * *"
+    assert stamp3 != stamp1
+
+    cache.invalidate(path)
+    assert cache.load(path, SignConfigV3)[0] is not c3
+
+
+def test_cache_errors(tmp_path):
+    cache = ConfigCache()
+    path = tmp_path / "config.json"
+    with pytest.raises(FileNotFoundError):
+        cache.load(path, SignConfigV3)
+    path.write_text("{not json", encoding="utf-8")
+    with pytest.raises(ConfigLoadError):
+        cache.load(path, SignConfigV3)
+    write(path, {"foo": 1})
+    with pytest.raises(ConfigLoadError):
+        cache.load(path, SignConfigV3)
+
+
+@pytest.mark.asyncio
+async def test_monitor_hot_reload(tmp_path):
+    monitor = UserMonitor(task_name="m", session_dir=tmp_path, workdir=tmp_path)
+    monitor.config_reload_interval = 0.01
+    rule = {"chat_id": 1, "rule": "contains", "rule_value": "kfc"}
+    write(monitor.config_file, {"match_cfgs": [rule]})
+    cfg = monitor.load_config()
+    old_index = monitor.match_index
+    chat_filter = filters.chat(cfg.chat_ids)
+    assert monitor.reload_config() is None
+
+    write(
+        monitor.config_file,
+        {"match_cfgs": [rule, {"chat_id": 2, "rule": "exact", "rule_value": "hi"}]},
+    )
+    new_cfg = await monitor.wait_for_config_change(1)
+    assert isinstance(new_cfg, MonitorConfig)
+    monitor.apply_config(new_cfg, chat_filter)
+    assert monitor.match_index is not old_index
+    assert len(monitor.match_index) == 2
+    assert set(chat_filter) == {1, 2}
+
+    # 无效的配置不会替换正在使用的配置
+    monitor.config_file.write_text("{", encoding="utf-8")
+    assert await monitor.wait_for_config_change(0.05) is None
+    assert monitor.config is new_cfg
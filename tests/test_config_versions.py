@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from tg_signer.config import (
+    BaseJSONConfig,
+    MonitorConfig,
+    SignConfigV1,
+    SignConfigV2,
+    SignConfigV3,
+)
+from tg_signer.config_cache import ConfigLoadError
+from tg_signer.core import UserSigner
+
+V1 = {"chat_id": 1, "sign_text": "签到", "sign_at": "06:00:00", "random_seconds": 0}
+V2 = {"chats": [{"chat_id": 1, "sign_text": "签到"}], "sign_at": "06:00:00"}
+V3 = {
+    "chats": [{"chat_id": 1, "actions": [{"action": 1, "text": "签到"}]}],
+    "sign_at": "06:00:00",
+}
+
+
+@pytest.fixture
+def validations(monkeypatch):
+    """记录每次校验使用的配置类"""
+    calls = []
+    original = BaseJSONConfig.valid.__func__
+
+    def valid(cls, d):
+        calls.append(cls)
+        return original(cls, d)
+
+    monkeypatch.setattr(BaseJSONConfig, "valid", classmethod(valid))
+    return calls
+
+
+def test_to_jsonable_stamps_version():
+    config = SignConfigV3.model_validate(V3)
+    assert config.to_jsonable()["_version"] == 3
+    assert MonitorConfig(match_cfgs=[]).to_jsonable()["_version"] == 1
+    assert SignConfigV3.history() == {2: SignConfigV2, 1: SignConfigV1}
+
+
+def test_stamped_current_validates_once(validations):
+    config, from_old = SignConfigV3.load({**V3, "_version": 3})
+    assert not from_old
+    assert config.chats[0].actions[0].text == "签到"
+    assert validations == [SignConfigV3]
+
+
+@pytest.mark.parametrize(
+    "data,version,cls", [(V1, 1, SignConfigV1), (V2, 2, SignConfigV2)]
+)
+def test_stamped_old_dispatches_directly(validations, data, version, cls):
+    config, from_old = SignConfigV3.load({**data, "_version": version})
+    assert from_old
+    assert isinstance(config, SignConfigV3)
+    assert config.chats[0].actions[0].text == "签到"
+    assert validations == [cls]
+
+
+def test_unstamped_files_are_upgraded():
+    # 没有版本号的V1配置也能一次升级到V3
+    config, from_old = SignConfigV3.load(V1)
+    assert from_old and isinstance(config, SignConfigV3)
+    assert SignConfigV3.load(V3)[1] is True
+    assert SignConfigV3.load({**V3, "_version": 99}) is None
+    assert SignConfigV3.load({**V1, "_version": 3}) is None
+    assert SignConfigV3.load([V3]) is None
+
+
+@pytest.mark.asyncio
+async def test_load_writes_back_stamped(tmp_path):
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer.config_file.write_text(json.dumps(V1), encoding="utf-8")
+    config = signer.load_config()
+    assert isinstance(config, SignConfigV3)
+    saved = json.loads(signer.config_file.read_text(encoding="utf-8"))
+    assert saved["_version"] == 3
+    assert SignConfigV3.load(saved) == (config, False)
+
+
+@pytest.mark.asyncio
+async def test_import_validates(tmp_path):
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer.import_(json.dumps({**V2, "_version": 2}))
+    saved = json.loads(signer.export())
+    assert saved["_version"] == 3 and saved["chats"][0]["actions"]
+    with pytest.raises(ConfigLoadError):
+        signer.import_("{")
+    with pytest.raises(ConfigLoadError):
+        signer.import_(json.dumps({"foo": 1}))
@@ -1,10 +1,20 @@
 import asyncio
 import pathlib
+from unittest.mock import MagicMock
 
 import pytest
 
+from tg_signer.config import (
+    ClickKeyboardByTextAction,
+    MatchConfig,
+    SendTextAction,
+    SignChatV3,
+    SignConfigV3,
+)
 from tg_signer.core import (
     BaseUserWorker,
+    UserMonitor,
+    UserSigner,
     get_client,
 )
 
@@ -107,3 +117,181 @@ async def test_client_context_manager_reference_counting_and_start_stop(
 
     # instance should be removed from cache after stop
     assert key not in core._CLIENT_INSTANCES
+
+
+def _fake_message(chat_id: int, text: str):
+    message = MagicMock()
+    message.chat.id = chat_id
+    message.text = text
+    message.photo = None
+    message.reply_markup = None
+    return message
+
+
+@pytest.mark.asyncio
+async def test_wait_for_wakes_on_new_message(monkeypatch, tmp_path):
+    """wait_for should be woken by `_on_message` instead of polling, and each
+    message should be handed to the pending action exactly once.
+    """
+    _clear_client_state()
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    chat = SignChatV3(chat_id=1, actions=[ClickKeyboardByTextAction(text="签到")])
+    signer.context.sign_chats[chat.chat_id].append(chat)
+
+    seen = []
+
+    async def fake_handle(action, message):
+        seen.append(message.text)
+        return message.text == "ok"
+
+    monkeypatch.setattr(signer, "_handle_action_message", fake_handle)
+
+    async def feed():
+        await asyncio.sleep(0.02)
+        await signer._on_message(None, _fake_message(1, "noise"))
+        await asyncio.sleep(0.02)
+        await signer._on_message(None, _fake_message(1, "ok"))
+
+    feeder = asyncio.create_task(feed())
+    start = asyncio.get_running_loop().time()
+    await signer.wait_for(chat, chat.actions[0], timeout=5)
+    elapsed = asyncio.get_running_loop().time() - start
+    await feeder
+
+    assert seen == ["noise", "ok"]
+    assert elapsed < 0.2
+    assert [m.text for m in signer.context.chat_messages[1]] == ["noise"]
+
+
+@pytest.mark.asyncio
+async def test_wait_for_timeout(monkeypatch, tmp_path):
+    _clear_client_state()
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    chat = SignChatV3(chat_id=1, actions=[ClickKeyboardByTextAction(text="签到")])
+
+    async def fake_handle(action, message):
+        return False
+
+    monkeypatch.setattr(signer, "_handle_action_message", fake_handle)
+    assert await signer.wait_for(chat, chat.actions[0], timeout=0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_sign_chats_concurrently(monkeypatch, tmp_path):
+    _clear_client_state()
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    chats = [
+        SignChatV3(chat_id=chat_id, name=name, actions=[SendTextAction(text="x")])
+        for chat_id, name in [(1, "a1"), (2, "b"), (1, "a2"), (3, "c"), (4, "d")]
+    ]
+    config = SignConfigV3(
+        chats=chats, sign_at="0 6 * * *", sign_interval=0, concurrency=2
+    )
+    running = 0
+    peak = 0
+    order = []
+
+    async def fake_sign(chat):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        order.append(chat.name)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    monkeypatch.setattr(signer, "sign", fake_sign)
+    await signer.sign_chats_concurrently(config)
+    assert peak == 2
+    assert sorted(order) == ["a1", "a2", "b", "c", "d"]
+    assert order.index("a1") < order.index("a2")
+
+
+@pytest.mark.asyncio
+async def test_ensure_login_uses_dialog_snapshot(monkeypatch, tmp_path):
+    _clear_client_state()
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    me = MagicMock(
+        id=42,
+        is_bot=False,
+        first_name="A",
+        last_name=None,
+        username="a",
+        phone_number=None,
+    )
+    chats = [{"id": 1, "title": "t", "type": "ChatType.GROUP", "username": None}]
+    signer.save_dialog_snapshot(me, chats, 20)
+
+    logins = []
+
+    async def fake_login(num_of_dialogs=20, print_chat=True):
+        logins.append(num_of_dialogs)
+
+    monkeypatch.setattr(signer, "login", fake_login)
+    await signer.ensure_login(20, print_chat=True)
+    assert logins == []
+    assert signer.user.id == 42
+
+    # 需要更多对话、快照过期或强制刷新时完整登录
+    signer.user = None
+    await signer.ensure_login(50, print_chat=False)
+    signer.user = None
+    monkeypatch.setattr(signer, "dialog_snapshot_ttl", -1)
+    await signer.ensure_login(20, print_chat=False)
+    monkeypatch.setattr(signer, "dialog_snapshot_ttl", 3600)
+    signer.user = None
+    signer.refresh_dialogs = True
+    await signer.ensure_login(20, print_chat=False)
+    assert logins == [50, 20, 20]
+
+
+@pytest.mark.asyncio
+async def test_streaming_reply_single_flight(monkeypatch, tmp_path):
+    """相同消息并发到达时只有一个调用方流式发送，其余等待最终文本后直接发送"""
+    import tg_signer.core as core
+
+    _clear_client_state()
+    monitor = UserMonitor(task_name="m", session_dir=tmp_path, workdir=tmp_path)
+    match_cfg = MatchConfig(
+        chat_id=1, rule="all", ai_reply=True, ai_prompt="p", ai_stream=True
+    )
+    release = asyncio.Event()
+    streams = 0
+
+    async def fake_stream_reply(prompt, text, client=None):
+        nonlocal streams
+        streams += 1
+        yield "hello"
+        await release.wait()
+        yield " world"
+
+    sent, edited = [], []
+
+    async def fake_send(chat_id, text, **kwargs):
+        sent.append(text)
+        return _fake_message(chat_id, text)
+
+    async def fake_edit(message, text, priority=None):
+        edited.append(text)
+        return message
+
+    monkeypatch.setattr(core, "get_ai_client", lambda: object())
+    monkeypatch.setattr(core, "stream_reply", fake_stream_reply)
+    monkeypatch.setattr(monitor, "send_message", fake_send)
+    monkeypatch.setattr(monitor, "edit_message_text", fake_edit)
+
+    tasks = [
+        asyncio.create_task(monitor.reply(match_cfg, _fake_message(1, "hi")))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0.01)
+    assert sent == ["hello"]
+    release.set()
+    await asyncio.gather(*tasks)
+    assert streams == 1
+    assert sent == ["hello", "hello world", "hello world"]
+    assert edited == ["hello world"]
+
+    # 之后相同的消息直接使用缓存
+    await monitor.reply(match_cfg, _fake_message(1, "hi"))
+    assert streams == 1
+    assert sent[-1] == "hello world"
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from tg_signer import events
+from tg_signer.events import EventEmitter, percentile, summarize
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_emit_and_summarize(tmp_path):
+    path = tmp_path / "events.jsonl"
+    emitter = EventEmitter(account="a", task="t")
+    emitter.emit("send_command", chat=1)  # 未开启时不记录
+    events.configure_events(path)
+    try:
+        with emitter.timed("send_command", chat=1) as ev:
+            ev["message_id"] = 10
+        with pytest.raises(ValueError):
+            with emitter.timed("ai_call", kind="calculate"):
+                raise ValueError("boom")
+        emitter.emit("recv_message", chat=1, message_id=11, latency_ms=120)
+    finally:
+        events.shutdown_events()
+
+    lines = [json.loads(line) for line in path.read_text("utf-8").splitlines()]
+    assert [e["event"] for e in lines] == ["send_command", "ai_call", "recv_message"]
+    assert lines[0]["account"] == "a" and lines[0]["message_id"] == 10
+    assert lines[0]["outcome"] == "ok" and "latency_ms" in lines[0]
+    assert lines[1]["outcome"] == "error"
+
+    rows = summarize(events.iter_events([str(path)]), ("event",))
+    by_event = {r["event"]: r for r in rows}
+    assert by_event["recv_message"]["p99"] == 120
+    assert by_event["ai_call"]["outcomes"] == {"error": 1}
+    rows = summarize(events.iter_events([str(path)]), event_types=["send_command"])
+    assert [r["event"] for r in rows] == ["send_command"]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from tg_signer.http_pool import (
+    HttpClientPool,
+    HttpPoolLimits,
+    close_http_pool,
+    get_http_pool,
+)
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    while True:
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        if length:
+            await reader.readexactly(length)
+        body = b'{"ok": true}'
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+        )
+        await writer.drain()
+
+
+class TestHttpClientPool:
+    @pytest.mark.asyncio
+    async def test_client_reused_per_origin(self):
+        async with HttpClientPool(HttpPoolLimits(http2=False)) as pool:
+            c1 = pool.get_client("http://127.0.0.1:8000/a")
+            c2 = pool.get_client("http://127.0.0.1:8000/b?x=1")
+            c3 = pool.get_client("http://127.0.0.1:8001/a")
+            assert c1 is c2
+            assert c1 is not c3
+        assert pool.closed
+        assert c1.is_closed and c3.is_closed
+
+    @pytest.mark.asyncio
+    async def test_keepalive_connection_reused(self):
+        connections = []
+
+        async def handler(reader, writer):
+            connections.append(writer)
+            try:
+                await _serve(reader, writer)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with HttpClientPool(HttpPoolLimits(http2=False)) as pool:
+                for _ in range(5):
+                    response = await pool.post(
+                        f"http://127.0.0.1:{port}/", content=b"{}"
+                    )
+                    assert response.json() == {"ok": True}
+            assert len(connections) == 1
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_process_pool_per_loop(self):
+        pool = get_http_pool()
+        assert get_http_pool() is pool
+        await close_http_pool()
+        assert pool.closed
+        assert get_http_pool() is not pool
+        await close_http_pool()
@@ -0,0 +1,152 @@
+import io
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from tg_signer import core, image_cache
+from tg_signer.config import ChooseOptionByImageAction
+from tg_signer.image_cache import ImageChoiceCache, get_image_choice_cache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_hit_miss_and_file_id(tmp_path, clock):
+    cache = ImageChoiceCache(tmp_path / "c.json", clock=clock)
+    assert cache.get(b"img", ["A", "B"]) is None
+    cache.put(b"img", ["A", "B"], "B", file_id="uniq")
+    # 选项顺序、首尾空白不影响命中
+    assert cache.get(b"img", [" B", "A "]) == "B"
+    assert cache.get_by_file_id("uniq", ["B", "A"]) == "B"
+    assert cache.get_by_file_id("other", ["A", "B"]) is None
+    # 选项不同视为不同题目
+    assert cache.get(b"img", ["A", "C"]) is None
+    assert cache.stats == {"file_id": 1, "sha256": 1, "dhash": 0, "miss": 2}
+    assert cache.hit_rate == 0.5
+
+
+def test_ttl_lru_and_persistence(tmp_path, clock):
+    path = tmp_path / "c.json"
+    cache = ImageChoiceCache(path, max_entries=2, ttl=100, clock=clock)
+    cache.put(b"1", ["A"], "A")
+    cache.put(b"2", ["A"], "A")
+    assert cache.get(b"1", ["A"]) == "A"
+    cache.put(b"3", ["A"], "A")
+    assert len(cache) == 2
+    assert cache.get(b"2", ["A"]) is None
+
+    reloaded = ImageChoiceCache(path, ttl=100, clock=clock)
+    assert reloaded.get(b"1", ["A"]) == "A"
+    assert reloaded.get(b"3", ["A"]) == "A"
+
+    clock.now += 101
+    assert reloaded.get(b"1", ["A"]) is None
+    assert len(ImageChoiceCache(path, ttl=100, clock=clock)) == 0
+
+    reloaded.invalidate(b"3", ["A"])
+    assert len(reloaded) == 0
+
+    reloaded.put(b"4", ["A"], "A", file_id="f4")
+    reloaded.invalidate(None, ["A"], file_id="f4")
+    assert reloaded.get_by_file_id("f4", ["A"]) is None
+    assert len(reloaded) == 0
+
+
+def test_dhash_optional(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(image_cache, "dhash", lambda image, size=8: len(image))
+    cache = ImageChoiceCache(tmp_path / "c.json", max_distance=1, clock=clock)
+    cache.put(b"\x00" * 8, ["A", "B"], "A")
+    # 8=0b1000, 9=0b1001 汉明距离为1
+    assert cache.get(b"\x01" * 9, ["A", "B"]) == "A"
+    assert cache.get(b"\x01" * 7, ["A", "B"]) is None
+    assert cache.stats["dhash"] == 1
+
+
+def test_dhash_disabled_by_default(tmp_path, monkeypatch, clock):
+    # 同一模板的验证码图片dHash相近，默认不按dHash命中
+    monkeypatch.setattr(image_cache, "dhash", lambda image, size=8: 0)
+    cache = ImageChoiceCache(tmp_path / "c.json", clock=clock)
+    cache.put(b"template-1", ["A", "B"], "A")
+    assert cache.get(b"template-2", ["A", "B"]) is None
+
+    # 未开启时写入也不解码图片计算dHash
+    def fail(image, size=8):
+        raise AssertionError("不应计算dHash")
+
+    monkeypatch.setattr(image_cache, "dhash", fail)
+    cache.put(b"template-3", ["A", "B"], "B")
+    assert cache.get(b"template-4", ["A", "B"]) is None
+
+
+def test_get_image_choice_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TG_IMAGE_CACHE", "0")
+    assert get_image_choice_cache(tmp_path) is None
+    monkeypatch.setenv("TG_IMAGE_CACHE", "1")
+    cache = get_image_choice_cache(tmp_path)
+    assert cache is get_image_choice_cache(tmp_path)
+    assert cache.path == tmp_path / "cache" / "image_choices.json"
+    assert cache.max_distance is None
+
+    monkeypatch.setenv("TG_IMAGE_DHASH_DISTANCE", "4")
+    assert get_image_choice_cache(tmp_path / "other").max_distance == 4
+    monkeypatch.setenv("TG_IMAGE_DHASH_DISTANCE", "x")
+    assert get_image_choice_cache(tmp_path / "invalid").max_distance is None
+
+
+def _captcha_message():
+    message = MagicMock()
+    message.chat.id = 1
+    message.id = 10
+    message.photo.file_id = "file"
+    message.photo.file_unique_id = "uniq"
+    message.reply_markup = InlineKeyboardMarkup(
+        [[InlineKeyboardButton(t, callback_data=t) for t in ("A", "B")]]
+    )
+    return message
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("reply,cached", [("验证成功", True), ("答案错误", False)])
+async def test_choice_cached_only_after_success(tmp_path, monkeypatch, reply, cached):
+    monkeypatch.setenv("TG_IMAGE_CACHE", "1")
+    signer = core.UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer._app = MagicMock()
+    signer._app.download_media = AsyncMock(return_value=io.BytesIO(b"img"))
+    monkeypatch.setattr(core, "get_ai_client", lambda: object())
+    monkeypatch.setattr(core, "choose_option_by_image", AsyncMock(return_value=1))
+    signer.request_callback_answer = AsyncMock(
+        return_value=SimpleNamespace(message=reply)
+    )
+    action = ChooseOptionByImageAction()
+    assert await signer._choose_option_by_image(action, _captcha_message())
+    assert (signer.image_choice_cache.get(b"img", ["A", "B"]) == "B") is cached
+
+
+@pytest.mark.asyncio
+async def test_wrong_cached_choice_invalidated(tmp_path, monkeypatch):
+    monkeypatch.setenv("TG_IMAGE_CACHE", "1")
+    signer = core.UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    cache = signer.image_choice_cache
+    cache.put(b"img", ["A", "B"], "B", file_id="uniq")
+    signer.request_callback_answer = AsyncMock(return_value=None)
+    action = ChooseOptionByImageAction()
+    assert await signer._choose_option_by_image(action, _captcha_message())
+    assert cache.get_by_file_id("uniq", ["A", "B"]) is None
+    assert len(cache) == 0
+
+    # 缓存的答案不在选项中时也删除
+    cache.put(b"img", ["A", "B"], "C", file_id="uniq")
+    assert not await signer._choose_option_by_image(action, _captcha_message())
+    assert len(cache) == 0
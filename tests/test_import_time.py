@@ -0,0 +1,68 @@
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+# 这些依赖导入较慢，只应在真正用到时才导入
+HEAVY_MODULES = ("pyrogram", "openai", "httpx", "croniter", "json_repair")
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+# CLI模块导入耗时上限（毫秒），机器较慢时可通过环境变量放宽
+CLI_IMPORT_BUDGET_MS = int(os.environ.get("TG_IMPORT_BUDGET_MS", 500))
+
+
+def import_profile(code: str) -> dict:
+    """用`python -X importtime`在子进程中执行代码，返回 模块名 -> 累计导入耗时(微秒)"""
+    # 在临时目录中运行，CLI写出的日志文件不会留在仓库目录
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT), env.get("PYTHONPATH")])
+    )
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=cwd,
+            env=env,
+        )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cum, name = line.split("|")
+        if cum.strip().isdigit():
+            cumulative[name.strip()] = int(cum)
+    return cumulative
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["version"], ["--help"], ["monitor", "--help"], ["stats", "--help"]],
+)
+def test_light_commands_skip_heavy_imports(args):
+    code = (
+        "from tg_signer.cli import tg_signer\n"
+        f"tg_signer({args!r}, standalone_mode=False)"
+    )
+    profile = import_profile(code)
+    assert "tg_signer.core" not in profile
+    assert [m for m in HEAVY_MODULES if m in profile] == []
+
+
+def test_cli_import_budget():
+    # 取多次中的最小值，减少偶发抖动
+    elapsed = min(
+        import_profile("import tg_signer.cli")["tg_signer.cli"] for _ in range(3)
+    )
+    assert elapsed / 1000 < CLI_IMPORT_BUDGET_MS
+
+
+def test_core_defers_optional_dependencies():
+    profile = import_profile("import tg_signer.core")
+    assert [
+        m for m in ("openai", "httpx", "croniter", "json_repair") if m in profile
+    ] == []
@@ -0,0 +1,42 @@
+import logging
+import threading
+
+from tg_signer.logger import LazyStr, configure_logger, shutdown_logger
+
+
+def test_async_logger_formats_off_thread(tmp_path):
+    log_file = tmp_path / "tg-signer.log"
+    logger = configure_logger("info", str(log_file), async_mode=True, per_account=True)
+    threads = []
+
+    def expensive():
+        threads.append(threading.current_thread().name)
+        return "formatted"
+
+    try:
+        logger.info("msg: %s", LazyStr(expensive), extra={"account": "acc/1"})
+        logger.debug("skipped: %s", LazyStr(expensive))
+        logger.info("no account")
+    finally:
+        shutdown_logger()
+
+    # pytest自身的日志捕获handler会在主线程格式化，这里只关心后台线程
+    assert threads.count("tg-signer-logger") == 1
+    content = log_file.read_text(encoding="utf-8")
+    assert "msg: formatted" in content
+    assert "no account" in content
+    account_log = tmp_path / "tg-signer.acc_1.log"
+    account_content = account_log.read_text(encoding="utf-8")
+    assert "msg: formatted" in account_content
+    assert "no account" not in account_content
+    assert not logging.getLogger("tg-signer").handlers
+
+
+def test_sync_logger(tmp_path):
+    log_file = tmp_path / "tg-signer.log"
+    logger = configure_logger("info", str(log_file), async_mode=False)
+    try:
+        logger.info("hello %s", "world")
+        assert "hello world" in log_file.read_text(encoding="utf-8")
+    finally:
+        shutdown_logger()
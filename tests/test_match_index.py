@@ -0,0 +1,77 @@
+import random
+from unittest.mock import MagicMock
+
+import pytest
+
+from tg_signer.config import MatchConfig
+from tg_signer.match_index import LiteralMatcher, MatchIndex
+
+
+def make_message(chat_id, username, text, from_user=None):
+    message = MagicMock()
+    message.chat.id = chat_id
+    message.chat.username = username
+    message.text = text
+    message.from_user = MagicMock(**(from_user or {"id": 1, "username": "u"}))
+    return message
+
+
+class TestLiteralMatcher:
+    @pytest.mark.parametrize(
+        "literals, text, expected",
+        [
+            (["he", "hello", "ell"], "say hello", {"he", "hello", "ell"}),
+            (["abc", "bc", "c"], "xabcx", {"abc", "bc", "c"}),
+            (["a.b", "a"], "axb", {"a"}),
+            (["", "zz"], "abc", {""}),
+            (["aa"], "aaa", {"aa"}),
+        ],
+    )
+    def test_search(self, literals, text, expected):
+        assert LiteralMatcher(literals).search(text) == expected
+
+
+class TestMatchIndex:
+    def test_same_result_as_linear_scan(self):
+        rnd = random.Random(42)
+        words = ["签到", "hello", "Hello", "ell", "bot", "抽奖", "a.b", "win"]
+        cfgs = []
+        for _ in range(300):
+            rule = rnd.choice(["exact", "contains", "regex", "all"])
+            value = rnd.choice(words)
+            if rule == "regex":
+                value = rnd.choice([r"\bhello\b", r"签到\d+", r"^bot", "a.b"])
+            cfgs.append(
+                MatchConfig(
+                    chat_id=rnd.choice([1, 2, "grp", "@grp"]),
+                    rule=rule,
+                    rule_value=None if rule == "all" else value,
+                    ignore_case=rnd.random() < 0.5,
+                    from_user_ids=rnd.choice([None, [1], [2], ["@u"]]),
+                )
+            )
+        index = MatchIndex(cfgs)
+        texts = ["hello", "HELLO world", "签到123", "bot 抽奖", "axb", "a.b", "win"]
+        for _ in range(200):
+            message = make_message(
+                rnd.choice([1, 2, 3]),
+                rnd.choice([None, "grp", "other"]),
+                rnd.choice(texts),
+                {"id": rnd.choice([1, 2]), "username": "u", "is_self": False},
+            )
+            expected = [cfg for cfg in cfgs if cfg.match(message)]
+            assert index.match(message) == expected
+
+    def test_preserves_config_order(self):
+        cfgs = [
+            MatchConfig(chat_id=1, rule="regex", rule_value="lo"),
+            MatchConfig(chat_id=1, rule="contains", rule_value="hel"),
+            MatchConfig(chat_id=1, rule="all"),
+            MatchConfig(chat_id=1, rule="exact", rule_value="HELLO"),
+        ]
+        message = make_message(1, None, "hello")
+        assert MatchIndex(cfgs).match(message) == cfgs
+
+    def test_no_rules_for_chat(self):
+        index = MatchIndex([MatchConfig(chat_id=1, rule="all")])
+        assert index.match(make_message(2, "x", "hello")) == []
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import urllib.request
+
+import pytest
+
+from tg_signer.metrics import (
+    MetricsRegistry,
+    SnapshotWriter,
+    start_http_server,
+    track,
+)
+
+
+@pytest.fixture
+def registry():
+    r = MetricsRegistry()
+    r.enabled = True
+    return r
+
+
+def test_disabled_is_noop():
+    r = MetricsRegistry()
+    c = r.counter("c_total", "c", ["a"])
+    c.inc(a="x")
+    r.histogram("h_seconds", "h").observe(1)
+    assert c.samples() == []
+    assert "c_total{" not in r.render()
+
+
+def test_render(registry):
+    c = registry.counter("c_total", "c", ["rule"])
+    c.inc(rule="contains")
+    c.inc(2, rule='a"b')
+    g = registry.gauge("g", "g", ["stage"])
+    g.labels(stage="reply").set_function(lambda: 3)
+    h = registry.histogram("h_seconds", "h", buckets=(0.1, 1))
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(5)
+    text = registry.render()
+    assert 'c_total{rule="contains"} 1' in text
+    assert 'c_total{rule="a\\"b"} 2' in text
+    assert 'g{stage="reply"} 3' in text
+    assert 'h_seconds_bucket{le="0.1"} 1' in text
+    assert 'h_seconds_bucket{le="1"} 2' in text
+    assert 'h_seconds_bucket{le="+Inf"} 3' in text
+    assert "h_seconds_count 3" in text
+    assert "# TYPE h_seconds histogram" in text
+
+
+def test_track(monkeypatch, registry):
+    import tg_signer.metrics as metrics
+
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    calls = registry.counter("calls_total", "calls", ["func", "outcome"])
+    seconds = registry.histogram("call_seconds", "seconds", ["func"])
+    with track(calls, seconds, func="f"):
+        pass
+    with pytest.raises(ValueError):
+        with track(calls, seconds, func="f"):
+            raise ValueError
+    # 取消不是错误，只记录耗时
+    with pytest.raises(asyncio.CancelledError):
+        with track(calls, seconds, func="f"):
+            raise asyncio.CancelledError
+    snapshot = registry.snapshot()
+    values = {
+        s["labels"]["outcome"]: s["value"] for s in snapshot["calls_total"]["samples"]
+    }
+    assert values == {"ok": 1, "error": 1}
+    assert snapshot["call_seconds"]["samples"][0]["count"] == 3
+
+
+def test_http_and_snapshot(tmp_path, registry):
+    registry.counter("up_total", "up").inc()
+    server = start_http_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as resp:
+            assert resp.status == 200
+            assert "up_total 1" in resp.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    path = tmp_path / "metrics.json"
+    writer = SnapshotWriter(str(path), interval=60, registry=registry)
+    writer.start()
+    writer.stop()
+    data = json.loads(path.read_text("utf-8"))
+    assert data["metrics"]["up_total"]["samples"][0]["value"] == 1
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from tg_signer.pipeline import DispatchPipeline
+
+
+class TestDispatchPipeline:
+    @pytest.mark.asyncio
+    async def test_stage_concurrency_limit(self):
+        pipeline = DispatchPipeline({"slow": 2, "fast": 1})
+        running = 0
+        peak = 0
+        done = []
+
+        async def slow_job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        async def fast_job():
+            done.append("fast")
+
+        for _ in range(6):
+            await pipeline.submit("slow", slow_job)
+        await pipeline.submit("fast", fast_job)
+        # 慢任务不会阻塞其它阶段
+        await asyncio.sleep(0.005)
+        assert done == ["fast"]
+        await pipeline.stop()
+        assert peak == 2
+        assert not pipeline.running
+
+    @pytest.mark.asyncio
+    async def test_backpressure_and_stats(self):
+        pipeline = DispatchPipeline({"s": 1}, maxsize=2)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        await pipeline.submit("s", blocked)
+        await asyncio.sleep(0)
+        await pipeline.submit("s", failing)
+        await pipeline.submit("s", blocked)
+        assert pipeline.depth("s") == 2
+
+        submit = asyncio.create_task(pipeline.submit("s", blocked))
+        await asyncio.sleep(0.01)
+        assert not submit.done()
+
+        release.set()
+        await submit
+        await pipeline.join()
+        stats = pipeline.stats()["s"]
+        assert stats["submitted"] == 4
+        assert stats["completed"] == 3
+        assert stats["failed"] == 1
+        assert stats["depth"] == 0
+        await pipeline.stop()
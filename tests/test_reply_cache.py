@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from tg_signer.reply_cache import ReplyCache, normalize_text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_text():
+    assert normalize_text("  Hello　World！！！ ") == normalize_text("hello world")
+    assert normalize_text("抽\u200b奖  啦~~~") == "抽奖 啦"
+    assert normalize_text("a!!b") == "a!b"
+    assert normalize_text("ab") != normalize_text("a b")
+
+
+def test_ttl_and_bound():
+    clock = FakeClock()
+    cache = ReplyCache(max_entries=2, ttl=10, clock=clock)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+@pytest.mark.asyncio
+async def test_single_flight():
+    cache = ReplyCache()
+    calls = 0
+    release = asyncio.Event()
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "reply"
+
+    tasks = [asyncio.create_task(cache.get_or_call("k", call)) for _ in range(50)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == ["reply"] * 50
+    assert calls == 1
+    assert await cache.get_or_call("k", call) == "reply"
+    assert calls == 1
+    assert cache.stats == {"hit": 1, "coalesced": 49, "miss": 1}
+
+
+@pytest.mark.asyncio
+async def test_failure_not_cached_and_cancel_isolated():
+    cache = ReplyCache()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise ValueError("boom")
+
+    tasks = [asyncio.create_task(cache.get_or_call("k", fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert cache.get("k") is None
+
+    release.clear()
+
+    async def ok():
+        await release.wait()
+        return "reply"
+
+    first = asyncio.create_task(cache.get_or_call("k", ok))
+    second = asyncio.create_task(cache.get_or_call("k", ok))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "reply"
+    assert cache.get("k") == "reply"
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from tg_signer.scheduler import DeleteScheduler, TimerWheel
+
+
+class TestTimerWheel:
+    @pytest.mark.asyncio
+    async def test_fires_not_before_delay(self):
+        wheel = TimerWheel(tick=0.01, slots=4)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        fired = {}
+
+        async def job(name):
+            fired[name] = loop.time() - start
+
+        for delay in (0, 0.02, 0.07):
+            wheel.schedule(delay, lambda d=delay: job(d))
+        await wheel.join()
+        assert set(fired) == {0, 0.02, 0.07}
+        for delay, at in fired.items():
+            assert at >= delay
+        assert wheel.pending == 0
+        await wheel.stop()
+
+    @pytest.mark.asyncio
+    async def test_cancel(self):
+        wheel = TimerWheel(tick=0.01, slots=8)
+        fired = []
+        entry = wheel.schedule(0.02, lambda: fired.append(1))
+        entry.cancel()
+        await asyncio.sleep(0.05)
+        assert fired == []
+        await wheel.stop()
+
+
+class _RPCError(Exception):
+    def __init__(self, error_id):
+        super().__init__(error_id)
+        self.ID = error_id
+
+
+class _FakeClient:
+    def __init__(self, fail=False, failures=0, error=None):
+        self.fail = fail
+        self.failures = failures
+        self.error = error
+        self.calls = []
+
+    async def delete_messages(self, chat_id, message_ids):
+        if self.error is not None:
+            raise self.error
+        if self.fail:
+            raise ConnectionError("Client has not been started yet")
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Connection lost")
+        self.calls.append((chat_id, sorted(message_ids)))
+        return len(message_ids)
+
+
+class TestDeleteScheduler:
+    @pytest.mark.asyncio
+    async def test_batches_per_chat(self, tmp_path):
+        client = _FakeClient()
+        scheduler = DeleteScheduler(client, tmp_path / "deletes.json", tick=0.01)
+        for message_id in (1, 2, 3):
+            scheduler.schedule(100, message_id, 0.02)
+        scheduler.schedule(200, 9, 0.02)
+        scheduler.schedule(100, 4, 0)
+        assert len(scheduler) == 5
+        await scheduler.drain()
+        assert sorted(client.calls) == [(100, [1, 2, 3]), (100, [4]), (200, [9])]
+        assert len(scheduler) == 0
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_drain_waits_for_immediate_delete(self, tmp_path):
+        client = _FakeClient()
+        scheduler = DeleteScheduler(client, tmp_path / "deletes.json", tick=0.01)
+        scheduler.schedule(100, 1, 0)
+        assert scheduler.wheel.pending == 1
+        await scheduler.drain()
+        assert client.calls == [(100, [1])]
+        assert len(scheduler) == 0
+        assert scheduler.wheel.pending == 0
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_failed_deletes_retried_with_backoff(self, tmp_path):
+        client = _FakeClient(failures=2)
+        scheduler = DeleteScheduler(
+            client, tmp_path / "deletes.json", tick=0.01, retry_delay=0.01
+        )
+        scheduler.schedule(100, 1, 0)
+        scheduler.schedule(100, 2, 0)
+        await scheduler.drain()
+        assert client.calls == [(100, [1, 2])]
+        assert len(scheduler) == 0
+        await scheduler.stop()
+
+        # 超过重试次数后留待下次启动
+        client = _FakeClient(fail=True)
+        scheduler = DeleteScheduler(
+            client, tmp_path / "deletes.json", tick=0.01, retry_delay=0.01
+        )
+        scheduler.schedule(100, 3, 0)
+        await scheduler.drain()
+        assert len(scheduler) == 1
+        await scheduler.stop()
+        assert len(DeleteScheduler(client, tmp_path / "deletes.json")._load()) == 1
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_not_retried(self, tmp_path):
+        client = _FakeClient(error=_RPCError("MESSAGE_DELETE_FORBIDDEN"))
+        scheduler = DeleteScheduler(
+            client, tmp_path / "deletes.json", tick=0.01, retry_delay=0.01
+        )
+        scheduler.schedule(100, 1, 0)
+        await scheduler.drain()
+        assert len(scheduler) == 0
+        assert scheduler.wheel.pending == 0
+        await scheduler.stop()
+        assert DeleteScheduler(client, tmp_path / "deletes.json")._load() == {}
+
+    @pytest.mark.asyncio
+    async def test_pending_deletes_survive_restart(self, tmp_path):
+        state_file = tmp_path / "deletes.json"
+        scheduler = DeleteScheduler(_FakeClient(fail=True), state_file, tick=0.01)
+        scheduler.schedule(100, 1, 0)
+        scheduler.schedule(100, 2, 60)
+        await asyncio.sleep(0.02)
+        await scheduler.stop()
+        assert len(scheduler) == 2
+
+        client = _FakeClient()
+        restarted = DeleteScheduler(client, state_file, tick=0.01)
+        restarted.start()
+        assert len(restarted) == 2
+        await asyncio.sleep(0.02)
+        assert client.calls == [(100, [1])]
+        await restarted.stop()
+        assert len(DeleteScheduler(client, state_file)._load()) == 1
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from tg_signer.state_store import (
+    JSONStateStore,
+    SQLiteStateStore,
+    close_state_stores,
+    get_state_store,
+)
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        s = SQLiteStateStore(tmp_path / "state.sqlite3")
+    else:
+        s = JSONStateStore(tmp_path / "signs")
+    yield s
+    s.close()
+
+
+def test_upsert_get_last(store):
+    assert store.get("1", "t", "2024-01-01") is None
+    assert store.last("1", "t") is None
+    store.upsert("1", "t", "2024-01-01", "2024-01-01T08:00:00")
+    store.upsert("1", "t", "2024-01-02", "2024-01-02T08:00:00")
+    store.upsert("1", "t", "2024-01-01", "2024-01-01T09:00:00")
+    store.upsert("2", "t", "2024-01-05", "x")
+    assert store.get("1", "t", "2024-01-01") == "2024-01-01T09:00:00"
+    assert store.last("1", "t") == ("2024-01-02", "2024-01-02T08:00:00")
+    assert store.records("1", "t") == {
+        "2024-01-01": "2024-01-01T09:00:00",
+        "2024-01-02": "2024-01-02T08:00:00",
+    }
+
+
+def test_prune(store):
+    store.upsert_many("1", "a", {"2024-01-01": "x", "2024-02-01": "y"})
+    store.upsert_many("1", "b", {"2024-01-01": "x"})
+    assert store.prune("2024-01-15", account="1", task="a") == 1
+    assert store.records("1", "a") == {"2024-02-01": "y"}
+    assert store.records("1", "b") == {"2024-01-01": "x"}
+    assert store.prune("2024-01-15") == 1
+    assert store.records("1", "b") == {}
+
+
+def test_migrate_json(tmp_path):
+    legacy = tmp_path / "signs" / "t" / "1" / "sign_record.json"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_text(json.dumps({"2024-01-01": "old", "2024-01-02": "old"}))
+
+    store = SQLiteStateStore(tmp_path / "state.sqlite3")
+    store.upsert("1", "t", "2024-01-02", "new")
+    assert store.migrate_json("1", "t", legacy) == 1
+    assert store.records("1", "t") == {"2024-01-01": "old", "2024-01-02": "new"}
+    assert not legacy.exists()
+    assert legacy.with_name("sign_record.json.migrated").exists()
+    assert store.migrate_json("1", "t", legacy) == 0
+    store.close()
+
+
+def test_get_state_store_shared(tmp_path, monkeypatch):
+    monkeypatch.delenv("TG_STATE_BACKEND", raising=False)
+    try:
+        s1 = get_state_store(tmp_path)
+        assert isinstance(s1, SQLiteStateStore)
+        assert get_state_store(tmp_path) is s1
+        assert isinstance(get_state_store(tmp_path, "json"), JSONStateStore)
+        with pytest.raises(ValueError):
+            get_state_store(tmp_path, "redis")
+    finally:
+        close_state_stores()
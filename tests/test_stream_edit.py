@@ -0,0 +1,68 @@
+import pytest
+
+from tg_signer.stream_edit import ProgressiveMessage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    async def send(self, text):
+        self.calls.append(("send", text))
+        return "msg"
+
+    async def edit(self, message, text):
+        assert message == "msg"
+        self.calls.append(("edit", text))
+
+
+@pytest.mark.asyncio
+async def test_first_chunk_sent_then_edits_coalesced():
+    clock, rec = FakeClock(), Recorder()
+    pm = ProgressiveMessage(rec.send, rec.edit, min_interval=1, clock=clock)
+    await pm.feed(" ")
+    assert rec.calls == []
+    await pm.feed("你")
+    assert rec.calls == [("send", "你")]
+    for delta in "好，世界":
+        clock.now += 0.25
+        await pm.feed(delta)
+    # 1秒内的片段被合并成一次编辑
+    assert rec.calls == [("send", "你"), ("edit", "你好，世界")]
+    await pm.feed("！")
+    await pm.feed("  ")
+    assert await pm.finish() == "msg"
+    assert rec.calls[-1] == ("edit", "你好，世界！")
+    assert pm.edits == 2
+    # 没有新内容时不再编辑
+    await pm.finish()
+    assert pm.edits == 2
+
+
+@pytest.mark.asyncio
+async def test_finish_without_content_and_max_length():
+    rec = Recorder()
+    pm = ProgressiveMessage(rec.send, rec.edit, min_first_chars=5)
+    await pm.feed("abc")
+    assert rec.calls == []
+    assert await pm.finish() == "msg"
+    assert rec.calls == [("send", "abc")]
+
+    empty = ProgressiveMessage(rec.send, rec.edit)
+    await empty.feed("   ")
+    assert await empty.finish() is None
+
+    rec = Recorder()
+    pm = ProgressiveMessage(rec.send, rec.edit, max_length=4, min_interval=0)
+    await pm.feed("ab")
+    await pm.feed("cdef")
+    await pm.feed("gh")
+    assert rec.calls == [("send", "ab"), ("edit", "abcd")]
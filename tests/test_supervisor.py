@@ -0,0 +1,51 @@
+from tg_signer.supervisor import HashRing, Supervisor
+
+
+class TestHashRing:
+    def test_assignment_is_stable(self):
+        accounts = [f"acct_{i}" for i in range(200)]
+        shards = HashRing(range(4)).assign(accounts)
+        assert shards == HashRing(range(4)).assign(accounts)
+        assert sorted(a for v in shards.values() for a in v) == sorted(accounts)
+        assert all(len(v) > 20 for v in shards.values())
+
+    def test_adding_node_moves_few_keys(self):
+        accounts = [f"acct_{i}" for i in range(500)]
+        ring = HashRing(range(4))
+        before = {a: ring.get(a) for a in accounts}
+        ring.add(4)
+        moved = [a for a in accounts if ring.get(a) != before[a]]
+        # 只有被新节点接管的账号发生变化
+        assert all(ring.get(a) == 4 for a in moved)
+        assert len(moved) < len(accounts) / 3
+
+
+class _FakeProcess:
+    def __init__(self, exitcode=None):
+        self.exitcode = exitcode
+        self.pid = 1
+
+    def is_alive(self):
+        return self.exitcode is None
+
+
+class TestSupervisor:
+    def test_restart_crashed_worker(self, monkeypatch):
+        supervisor = Supervisor(
+            ["a", "b", "c"], "task", {}, num_workers=2, restart_delay=0
+        )
+        spawned = []
+        monkeypatch.setattr(supervisor, "_spawn", spawned.append)
+        supervisor.processes = {0: _FakeProcess(exitcode=1), 1: _FakeProcess()}
+
+        assert supervisor.check_workers()
+        assert supervisor.restarts[0] == 1
+        assert supervisor.check_workers()
+        assert spawned == [0]
+
+    def test_finished_workers_not_restarted(self, monkeypatch):
+        supervisor = Supervisor(["a", "b"], "task", {}, num_workers=2)
+        monkeypatch.setattr(supervisor, "_spawn", lambda w: None)
+        supervisor.processes = {0: _FakeProcess(0), 1: _FakeProcess(0)}
+        assert not supervisor.check_workers()
+        assert supervisor.status()["workers"][0]["alive"] is False
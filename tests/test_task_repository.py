@@ -0,0 +1,157 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from tg_signer import core
+from tg_signer.cli import tg_signer
+from tg_signer.cli.monitor import get_monitor_repository
+from tg_signer.cli.signer import get_sign_repository
+from tg_signer.config import MonitorConfig, SignConfigV3
+from tg_signer.config_cache import ConfigLoadError
+from tg_signer.core import UserMonitor, UserSigner
+from tg_signer.task_repository import TaskConfigRepository
+
+from .test_import_time import HEAVY_MODULES, import_profile
+
+V2 = {"chats": [{"chat_id": 1, "sign_text": "签到"}], "sign_at": "06:00:00"}
+
+
+def test_repository_roundtrip(tmp_path):
+    repo = TaskConfigRepository(tmp_path / "tasks", SignConfigV3)
+    assert repo.list_tasks() == []
+    config = repo.import_("b", json.dumps(V2))
+    assert isinstance(config, SignConfigV3)
+    (repo.tasks_dir / "a").mkdir()
+    assert repo.list_tasks() == ["a", "b"]
+    assert repo.list_tasks(with_config=True) == ["b"]
+    assert json.loads(repo.export("b"))["_version"] == 3
+    assert repo.load("b") == config
+
+    # 旧版本配置读取后写回
+    repo.config_file("a").write_text(json.dumps(V2), encoding="utf-8")
+    assert repo.load("a") == config
+    assert json.loads(repo.export("a"))["_version"] == 3
+
+    with pytest.raises(ConfigLoadError):
+        repo.import_("c", "{")
+    with pytest.raises(ConfigLoadError):
+        TaskConfigRepository(repo.tasks_dir, MonitorConfig).import_(
+            "c", repo.export("a")
+        )
+    with pytest.raises(FileNotFoundError):
+        repo.load("c")
+
+
+def test_worker_creates_client_lazily(tmp_path, monkeypatch):
+    def get_client(*args, **kwargs):
+        raise AssertionError("不应创建客户端")
+
+    monkeypatch.setattr(core, "get_client", get_client)
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer.import_(json.dumps(V2))
+    assert signer.load_config().chats[0].actions[0].text == "签到"
+    assert signer.get_task_list() == ["t"]
+    # CLI的离线命令与任务读写同一个目录
+    assert get_sign_repository({"workdir": tmp_path}).list_tasks() == ["t"]
+    monitor = UserMonitor(task_name="m", workdir=tmp_path)
+    monitor.write_config(MonitorConfig(match_cfgs=[]))
+    assert get_monitor_repository({"workdir": tmp_path}).list_tasks() == ["m"]
+    with pytest.raises(AssertionError):
+        _ = signer.app
+
+
+def test_cli_export_import_all_uses_worker_dirs(tmp_path):
+    """export-all/import-all读写的目录与签到、监控任务使用的目录相同"""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    UserSigner(task_name="t", workdir=src).import_(json.dumps(V2))
+    UserMonitor(task_name="m", workdir=src).write_config(MonitorConfig(match_cfgs=[]))
+
+    def run(workdir, *args):
+        tg_signer(
+            [
+                "--workdir",
+                str(workdir),
+                "--log-file",
+                str(tmp_path / "tg-signer.log"),
+                *args,
+            ],
+            standalone_mode=False,
+        )
+
+    signs, monitors = tmp_path / "signs.jsonl.gz", tmp_path / "monitors.jsonl"
+    run(src, "export-all", "-O", str(signs))
+    run(src, "monitor", "export-all", "-O", str(monitors))
+    run(dst, "import-all", "-I", str(signs))
+    run(dst, "monitor", "import-all", "-I", str(monitors))
+
+    signer = UserSigner(task_name="t", workdir=dst)
+    assert signer.get_task_list() == ["t"]
+    assert signer.load_config().chats[0].actions[0].text == "签到"
+    monitor = UserMonitor(task_name="m", workdir=dst)
+    assert monitor.get_task_list() == ["m"]
+    assert monitor.load_config().match_cfgs == []
+
+
+@pytest.mark.parametrize(
+    "args,configured",
+    [
+        (["monitor", "list"], False),
+        (["monitor", "export", "m"], False),
+        (["monitor", "export-all"], False),
+        (["list"], False),
+        (["monitor", "run", "m"], True),
+    ],
+)
+def test_offline_commands_skip_observability(tmp_path, monkeypatch, args, configured):
+    """离线命令不启动事件日志线程和指标采集"""
+    from tg_signer import events, metrics
+    from tg_signer.cli import monitor
+
+    calls = []
+    monkeypatch.setenv("TG_EVENTS", "1")
+    monkeypatch.setattr(events, "configure_events", lambda *a: calls.append("events"))
+    monkeypatch.setattr(
+        metrics, "configure_metrics", lambda **kw: calls.append("metrics")
+    )
+    monkeypatch.setattr(monitor, "get_monitor", lambda *a, **kw: MagicMock())
+    get_monitor_repository({"workdir": tmp_path}).write(
+        "m", MonitorConfig(match_cfgs=[])
+    )
+    tg_signer(
+        [
+            "--workdir",
+            str(tmp_path),
+            "--log-file",
+            str(tmp_path / "tg-signer.log"),
+            "--metrics-file",
+            str(tmp_path / "metrics.json"),
+            *args,
+        ],
+        standalone_mode=False,
+    )
+    assert calls == (["events", "metrics"] if configured else [])
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["list"], ["monitor", "list"], ["export", "t"], ["import", "-I", "{cfg}", "t"]],
+)
+def test_offline_commands_skip_client(tmp_path, args):
+    cfg = tmp_path / "cfg.json"
+    cfg.write_text(json.dumps(V2), encoding="utf-8")
+    get_sign_repository({"workdir": tmp_path}).import_("t", json.dumps(V2))
+    args = [
+        "--workdir",
+        str(tmp_path),
+        "--log-file",
+        str(tmp_path / "tg-signer.log"),
+        *(a.format(cfg=cfg) for a in args),
+    ]
+    code = (
+        "from tg_signer.cli import tg_signer\n"
+        f"tg_signer({args!r}, standalone_mode=False)"
+    )
+    profile = import_profile(code)
+    assert "tg_signer.core" not in profile
+    assert [m for m in HEAVY_MODULES if m in profile] == []
@@ -0,0 +1,91 @@
+import asyncio
+import json
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from tg_signer.udp_forward import UDPTransportPool, serialize_message
+
+
+class _Receiver(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.datagrams = []
+
+    def datagram_received(self, data, addr):
+        self.datagrams.append(data)
+
+
+async def start_receiver():
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _Receiver, local_addr=("127.0.0.1", 0)
+    )
+    return transport, protocol, transport.get_extra_info("sockname")[1]
+
+
+def test_serialize_message_json():
+    message = MagicMock()
+    message.id = 7
+    message.chat.id = -100
+    message.chat.username = "grp"
+    message.from_user.id = 1
+    message.from_user.username = "u"
+    message.date = datetime(2025, 1, 1)
+    message.text = "你好"
+    data = serialize_message(message, "json")
+    assert b"\n" not in data
+    assert json.loads(data) == {
+        "id": 7,
+        "chat_id": -100,
+        "chat_username": "grp",
+        "from_user_id": 1,
+        "from_username": "u",
+        "date": "2025-01-01T00:00:00",
+        "text": "你好",
+    }
+
+
+class TestUDPTransportPool:
+    @pytest.mark.asyncio
+    async def test_sender_reused(self):
+        transport, protocol, port = await start_receiver()
+        pool = UDPTransportPool()
+        sender = await pool.get_sender("127.0.0.1", port)
+        assert await pool.get_sender("127.0.0.1", port) is sender
+        for i in range(3):
+            sender.send(b"m%d" % i)
+        await asyncio.sleep(0.05)
+        assert protocol.datagrams == [b"m0", b"m1", b"m2"]
+        pool.close()
+        assert sender.closed
+        transport.close()
+
+    @pytest.mark.asyncio
+    async def test_batch_respects_datagram_size(self):
+        transport, protocol, port = await start_receiver()
+        pool = UDPTransportPool()
+        sender = await pool.get_sender("127.0.0.1", port)
+        records = [b"x" * 10 for _ in range(10)]
+        for record in records:
+            sender.send(record, batch=True, max_datagram_size=40, batch_interval=0.01)
+        await asyncio.sleep(0.05)
+        assert all(len(d) <= 40 for d in protocol.datagrams)
+        assert b"\n".join(protocol.datagrams).split(b"\n") == records
+        assert sender.datagrams_sent == len(protocol.datagrams) < len(records)
+        pool.close()
+        transport.close()
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_smallest_datagram_size(self):
+        transport, protocol, port = await start_receiver()
+        pool = UDPTransportPool()
+        sender = await pool.get_sender("127.0.0.1", port)
+        sender.send(b"a" * 10, batch=True, max_datagram_size=25, batch_interval=0.01)
+        # 后一条记录的上限更大，但已缓冲的数据报仍不能超过25字节
+        sender.send(b"b" * 10, batch=True, max_datagram_size=100, batch_interval=0.01)
+        sender.send(b"c" * 10, batch=True, max_datagram_size=100, batch_interval=0.01)
+        await asyncio.sleep(0.05)
+        assert protocol.datagrams == [b"a" * 10 + b"\n" + b"b" * 10, b"c" * 10]
+        pool.close()
+        transport.close()
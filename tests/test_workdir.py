@@ -0,0 +1,107 @@
+import os
+from types import SimpleNamespace
+
+from tg_signer import workdir
+from tg_signer.core import UserSigner
+from tg_signer.workdir import TaskIndex, WorkdirLayout, get_workdir_layout
+
+
+def test_layout_creates_dirs_once(tmp_path, monkeypatch):
+    calls = []
+    makedirs = os.makedirs
+
+    def counting_makedirs(path, *args, **kwargs):
+        calls.append(str(path))
+        return makedirs(path, *args, **kwargs)
+
+    monkeypatch.setattr(workdir.os, "makedirs", counting_makedirs)
+    layout = WorkdirLayout(tmp_path / "w", "signs")
+    task_dir = layout.task_dir("a")
+    assert task_dir.is_dir()
+    assert layout.tasks_dir == tmp_path / "w" / "signs"
+    assert layout.user_dir(1) == tmp_path / "w" / "users" / "1"
+    created = len(calls)
+    # 之后的访问直接返回缓存的路径，不再创建目录
+    for _ in range(3):
+        assert layout.task_dir("a") is task_dir
+        assert layout.user_dir(1) is layout.user_dir(1)
+    assert len(calls) == created
+
+    layout.forget()
+    layout.task_dir("a")
+    assert len(calls) > created
+
+
+def backdate(path, seconds=60):
+    mtime = os.stat(path).st_mtime_ns - int(seconds * 1e9)
+    os.utime(path, ns=(mtime, mtime))
+    return mtime
+
+
+def test_task_index_rescans_on_change(tmp_path):
+    index = TaskIndex(tmp_path / "signs")
+    assert index.names() == []
+    (tmp_path / "signs" / "b").mkdir(parents=True)
+    (tmp_path / "signs" / "a").mkdir()
+    (tmp_path / "signs" / "file.txt").write_text("")
+    backdate(tmp_path / "signs")
+    assert index.names() == ["a", "b"]
+    assert index.names() == ["a", "b"]
+    assert index.scans == 1
+
+    (tmp_path / "signs" / "c").mkdir()
+    assert "c" in index
+    assert index.scans == 2
+
+
+def test_task_index_sees_dir_created_without_mtime_change(tmp_path, monkeypatch):
+    """mtime粒度较粗时，扫描后同一粒度内新建的任务目录不改变mtime"""
+    tasks_dir = tmp_path / "signs"
+    (tasks_dir / "a").mkdir(parents=True)
+    index = TaskIndex(tasks_dir)
+    assert index.names() == ["a"]
+    mtime = os.stat(tasks_dir).st_mtime_ns
+    (tasks_dir / "b").mkdir()
+    os.utime(tasks_dir, ns=(mtime, mtime))
+    assert index.names() == ["a", "b"]
+
+    # 链接数也不变（如btrfs）时，依靠扫描时间与mtime过近重新扫描
+    monkeypatch.setattr(workdir, "RACY_WINDOW", 3600)
+    index = TaskIndex(tasks_dir)
+    assert index.names() == ["a", "b"]
+    mtime = os.stat(tasks_dir).st_mtime_ns
+    nlink = os.stat(tasks_dir).st_nlink
+    real_stat = os.stat
+
+    def stat(path, *args, **kwargs):
+        st = real_stat(path, *args, **kwargs)
+        if os.fspath(path) == os.fspath(tasks_dir):
+            return SimpleNamespace(
+                st_mtime_ns=st.st_mtime_ns,
+                st_mtime=st.st_mtime,
+                st_ino=st.st_ino,
+                st_nlink=nlink,
+            )
+        return st
+
+    (tasks_dir / "c").mkdir()
+    os.utime(tasks_dir, ns=(mtime, mtime))
+    monkeypatch.setattr(workdir.os, "stat", stat)
+    assert index.names() == ["a", "b", "c"]
+
+    # mtime足够早时使用缓存
+    monkeypatch.undo()
+    backdate(tasks_dir)
+    index = TaskIndex(tasks_dir)
+    index.names()
+    index.names()
+    assert index.scans == 1
+
+
+def test_workers_share_layout(tmp_path):
+    s1 = UserSigner(task_name="a", workdir=tmp_path)
+    s2 = UserSigner(task_name="b", workdir=tmp_path)
+    assert s1.layout is s2.layout is get_workdir_layout(tmp_path, "signs")
+    assert s1.config_file == tmp_path / "signs" / "a" / "config.json"
+    assert s2.task_dir.is_dir()
+    assert s1.get_task_list() == ["a", "b"]
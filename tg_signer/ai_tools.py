@@ -1,30 +1,276 @@
+import asyncio
 import base64
 import json
+import logging
 import os
-from typing import Optional
+import random
+import weakref
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional, Tuple, Union
 
-import json_repair
-from openai import AsyncOpenAI, OpenAIError
+from .metrics import AI_CALL_SECONDS, AI_CALLS, AI_INFLIGHT, AI_RETRIES, track
+
+# openai、httpx、json_repair导入较慢，只在真正调用大模型时才导入
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger("tg-signer")
+
+
+def retryable_errors() -> tuple:
+    """连接失败、超时、限流和服务端5xx错误会重试"""
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+
+    return APIConnectionError, RateLimitError, InternalServerError
+
+
+def _env_number(name: str, default, type_=int):
+    try:
+        return type_(os.environ.get(name, default))
+    except ValueError:
+        return default
 
 
 def encode_image(image: bytes):
     return base64.b64encode(image).decode("utf-8")
 
 
+class AIClientLimits:
+    """大模型客户端的并发、超时与重试配置，默认值可通过环境变量覆盖"""
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        timeout: float = None,
+        max_retries: int = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+    ):
+        self.max_concurrency = max_concurrency or _env_number(
+            "TG_AI_MAX_CONCURRENCY", 4
+        )
+        self.timeout = timeout or _env_number("TG_AI_TIMEOUT", 60.0, float)
+        if max_retries is None:
+            max_retries = _env_number("TG_AI_MAX_RETRIES", 2)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+
+    def backoff(self, attempt: int, error: Exception = None) -> float:
+        """指数退避加全抖动；限流响应带有`Retry-After`时以其为准"""
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                return min(float(response.headers["retry-after"]), self.backoff_max)
+            except (KeyError, ValueError):
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+
+class AIClient:
+    """
+    一组(api_key, base_url, model)共享的大模型客户端。
+    复用同一个HTTP连接池保持长连接，用信号量限制同时进行的请求数，
+    每次请求有独立的超时，失败时按指数退避加抖动重试。
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        limits: AIClientLimits = None,
+    ):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.limits = limits or AIClientLimits()
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.limits.max_connections,
+                max_keepalive_connections=self.limits.max_keepalive_connections,
+                keepalive_expiry=self.limits.keepalive_expiry,
+            ),
+            timeout=self.limits.timeout,
+        )
+        # 重试由`chat_completion`统一处理，关闭SDK自带的重试
+        self.openai = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self._http_client,
+            max_retries=0,
+            timeout=self.limits.timeout,
+        )
+        self._semaphore = asyncio.Semaphore(self.limits.max_concurrency)
+        self.closed = False
+
+    async def _wait_retry(self, attempt: int, error: Exception):
+        # 退避期间不持有信号量，不占用并发名额
+        delay = self.limits.backoff(attempt, error)
+        AI_RETRIES.inc(error=type(error).__name__)
+        logger.warning(
+            f"调用大模型失败({type(error).__name__})，{delay:.1f}秒后第{attempt + 1}次重试"
+        )
+        await asyncio.sleep(delay)
+
+    async def chat_completion(self, timeout: float = None, **kwargs):
+        kwargs.setdefault("model", self.model)
+        timeout = timeout or self.limits.timeout
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                AI_INFLIGHT.labels().inc()
+                try:
+                    return await self.openai.chat.completions.create(
+                        timeout=timeout, **kwargs
+                    )
+                except retryable_errors() as e:
+                    if attempt >= self.limits.max_retries:
+                        raise
+                    error = e
+                finally:
+                    AI_INFLIGHT.labels().dec()
+            await self._wait_retry(attempt, error)
+            attempt += 1
+
+    async def stream_chat_completion(
+        self, timeout: float = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        流式请求，逐段返回文本。读取响应期间一直占用并发名额；
+        只在收到响应之前重试，已经输出的内容无法撤回。
+        """
+        kwargs.setdefault("model", self.model)
+        timeout = timeout or self.limits.timeout
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                AI_INFLIGHT.labels().inc()
+                try:
+                    try:
+                        stream = await self.openai.chat.completions.create(
+                            stream=True, timeout=timeout, **kwargs
+                        )
+                    except retryable_errors() as e:
+                        if attempt >= self.limits.max_retries:
+                            raise
+                        error = e
+                    else:
+                        async for delta in _iter_deltas(stream):
+                            yield delta
+                        return
+                finally:
+                    AI_INFLIGHT.labels().dec()
+            await self._wait_retry(attempt, error)
+            attempt += 1
+
+    async def aclose(self):
+        self.closed = True
+        await self.openai.close()
+
+
+# 每个事件循环一组客户端，连接和信号量不能跨事件循环复用
+_ClientKey = Tuple[str, Optional[str], Optional[str]]
+_AI_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[_ClientKey, AIClient]]" = weakref.WeakKeyDictionary()
+_DEFAULT_LIMITS: Optional[AIClientLimits] = None
+
+
+def configure_ai_clients(**kwargs) -> AIClientLimits:
+    """设置之后新建客户端使用的配置，参数见`AIClientLimits`"""
+    global _DEFAULT_LIMITS
+    _DEFAULT_LIMITS = AIClientLimits(**kwargs)
+    return _DEFAULT_LIMITS
+
+
+def get_ai_client(
+    api_key: str = None, base_url: str = None, model: str = None
+) -> Optional[AIClient]:
+    """
+    获取共享的大模型客户端，未指定的参数从`OPENAI_API_KEY`、`OPENAI_BASE_URL`、
+    `OPENAI_MODEL`环境变量读取；没有API Key时返回None。
+    """
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+    model = model or os.environ.get("OPENAI_MODEL") or None
+    key = (api_key, base_url, model)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    clients = _AI_CLIENTS.setdefault(loop, {}) if loop is not None else {}
+    client = clients.get(key)
+    if client is None or client.closed:
+        from openai import OpenAIError
+
+        try:
+            client = AIClient(api_key, base_url, model, _DEFAULT_LIMITS)
+        except OpenAIError:
+            return None
+        clients[key] = client
+    return client
+
+
+async def close_ai_clients():
+    loop = asyncio.get_running_loop()
+    clients = _AI_CLIENTS.pop(loop, {})
+    for client in clients.values():
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"关闭大模型客户端失败: {e}")
+
+
 def get_openai_client(
     api_key: str = None, base_url: str = None, **kwargs
-) -> Optional[AsyncOpenAI]:
-    try:
-        return AsyncOpenAI(api_key=api_key, base_url=base_url, **kwargs)
-    except OpenAIError:
-        return None
+) -> Optional["AsyncOpenAI"]:
+    if kwargs:
+        from openai import AsyncOpenAI, OpenAIError
+
+        try:
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, **kwargs)
+        except OpenAIError:
+            return None
+    client = get_ai_client(api_key, base_url)
+    return client.openai if client else None
+
+
+AIClientT = Union[AIClient, "AsyncOpenAI"]
+
+
+async def _iter_deltas(stream) -> AsyncIterator[str]:
+    async for chunk in stream:
+        if chunk.choices and (delta := chunk.choices[0].delta.content):
+            yield delta
+
+
+async def _chat_completion(client: Optional[AIClientT], default_model: str, **kwargs):
+    """统一的请求入口，共享客户端走并发限制与重试，兼容直接传入的`AsyncOpenAI`"""
+    client = client or get_ai_client()
+    if client is None:
+        from openai import OpenAIError
+
+        raise OpenAIError("未配置OpenAI API Key")
+    if isinstance(client, AIClient):
+        kwargs["model"] = client.model or default_model
+        return await client.chat_completion(**kwargs)
+    kwargs["model"] = os.environ.get("OPENAI_MODEL", default_model)
+    # noinspection PyTypeChecker
+    return await client.chat.completions.create(**kwargs)
 
 
 async def choose_option_by_image(
     image: bytes,
     query: str,
     options: list[tuple[int, str]],
-    client: AsyncOpenAI = None,
+    client: AIClientT = None,
     default_model="gpt-4o",
     temperature=0.1,
 ) -> int:
@@ -35,8 +281,6 @@ async def choose_option_by_image(
 }
 option字段表示你选择的选项。
 """
-    model = os.environ.get("OPENAI_MODEL", default_model)
-    client = client or get_openai_client()
     text_query = f"问题为：{query}, 选项为：{json.dumps(options)}。"
     messages = [
         {"role": "system", "content": sys_prompt},
@@ -53,50 +297,50 @@ option字段表示你选择的选项。
             ],
         },
     ]
-    # noinspection PyTypeChecker
-    completion = await client.chat.completions.create(
-        messages=messages,
-        model=model,
-        response_format={"type": "json_object"},
-        stream=False,
-        temperature=temperature,
-    )
-    message = completion.choices[0].message
-    result = json_repair.loads(message.content)
-    return int(result["option"])
+    with track(AI_CALLS, AI_CALL_SECONDS, func="choose_option_by_image"):
+        completion = await _chat_completion(
+            client,
+            default_model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            stream=False,
+            temperature=temperature,
+        )
+        message = completion.choices[0].message
+        import json_repair
+
+        result = json_repair.loads(message.content)
+        return int(result["option"])
 
 
 async def calculate_problem(
     query: str,
-    client: AsyncOpenAI = None,
+    client: AIClientT = None,
     default_model="gpt-4o",
     temperature=0.1,
 ) -> str:
     sys_prompt = """你是一个**答题助手**，可以根据用户的问题给出正确的回答，只需要回复答案，不要解释，不要输出任何其他内容。"""
-    model = os.environ.get("OPENAI_MODEL", default_model)
-    client = client or get_openai_client()
     text = f"问题是: {query}\n\n只需要给出答案，不要解释，不要输出任何其他内容。The answer is:"
-    # noinspection PyTypeChecker
-    completion = await client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": sys_prompt},
-            {"role": "user", "content": text},
-        ],
-        model=model,
-        stream=False,
-        temperature=temperature,
-    )
-    return completion.choices[0].message.content.strip()
+    with track(AI_CALLS, AI_CALL_SECONDS, func="calculate_problem"):
+        completion = await _chat_completion(
+            client,
+            default_model,
+            messages=[
+                {"role": "system", "content": sys_prompt},
+                {"role": "user", "content": text},
+            ],
+            stream=False,
+            temperature=temperature,
+        )
+        return completion.choices[0].message.content.strip()
 
 
 async def get_reply(
     prompt: str,
     query: str,
-    client: AsyncOpenAI = None,
+    client: AIClientT = None,
     default_model="gpt-4o",
 ) -> str:
-    model = os.environ.get("OPENAI_MODEL", default_model)
-    client = client or get_openai_client()
     messages = [
         {
             "role": "system",
@@ -104,11 +348,45 @@ async def get_reply(
         },
         {"role": "user", "content": f"{query}"},
     ]
-    # noinspection PyTypeChecker
-    completion = await client.chat.completions.create(
-        messages=messages,
-        model=model,
-        stream=False,
-    )
-    message = completion.choices[0].message
-    return message.content
+    with track(AI_CALLS, AI_CALL_SECONDS, func="get_reply"):
+        completion = await _chat_completion(
+            client,
+            default_model,
+            messages=messages,
+            stream=False,
+        )
+        message = completion.choices[0].message
+        return message.content
+
+
+async def stream_reply(
+    prompt: str,
+    query: str,
+    client: AIClientT = None,
+    default_model="gpt-4o",
+) -> AsyncIterator[str]:
+    """与`get_reply`相同，但按模型输出逐段返回文本"""
+    client = client or get_ai_client()
+    if client is None:
+        from openai import OpenAIError
+
+        raise OpenAIError("未配置OpenAI API Key")
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"{query}"},
+    ]
+    with track(AI_CALLS, AI_CALL_SECONDS, func="stream_reply"):
+        if isinstance(client, AIClient):
+            deltas = client.stream_chat_completion(
+                model=client.model or default_model, messages=messages
+            )
+        else:
+            # noinspection PyTypeChecker
+            stream = await client.chat.completions.create(
+                model=os.environ.get("OPENAI_MODEL", default_model),
+                messages=messages,
+                stream=True,
+            )
+            deltas = _iter_deltas(stream)
+        async for delta in deltas:
+            yield delta
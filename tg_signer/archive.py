@@ -0,0 +1,257 @@
+"""
+多个任务配置的批量导出/导入。
+
+归档为JSON Lines格式，文件名以`.gz`结尾时使用gzip压缩。
+第一行为头部，记录配置类型，之后每行一个任务：
+
+    {"format": "tg-signer-tasks", "kind": "SignConfigV3", "count": 2}
+    {"task": "my_sign", "config": {...}}
+
+只读写`tasks_dir`下各任务的`config.json`，不会创建Telegram客户端。
+"""
+
+import difflib
+import gzip
+import itertools
+import json
+import multiprocessing
+import os
+import pathlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import (
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+
+from .config import BaseJSONConfig
+from .task_repository import CONFIG_FILE_NAME, TaskConfigRepository
+
+PathT = Union[str, pathlib.Path]
+
+ARCHIVE_FORMAT = "tg-signer-tasks"
+# 任务数少于该值时在当前进程中校验，避免启动子进程的开销超过校验本身
+PARALLEL_THRESHOLD = 200
+# 每次读取并交给子进程校验的任务数
+CHUNK_SIZE = 200
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class ImportResult(NamedTuple):
+    task: str
+    # new/changed/unchanged/invalid
+    status: str
+    config: Optional[dict] = None
+    error: Optional[str] = None
+    diff: str = ""
+
+
+def open_archive(path: PathT, mode: str) -> IO[str]:
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def is_valid_task_name(name: str) -> bool:
+    return (
+        bool(name) and name not in (".", "..") and pathlib.PurePath(name).name == name
+    )
+
+
+def export_tasks(
+    tasks_dir: PathT, fp: IO[str], cfg_cls: Type[BaseJSONConfig]
+) -> Tuple[int, List[Tuple[str, str]]]:
+    """
+    逐个任务写入归档，返回 (导出数量, [(任务名, 错误信息)])。
+    配置按原样导出，不是合法JSON的配置文件会被跳过。
+    """
+    repo = TaskConfigRepository(tasks_dir, cfg_cls)
+    tasks = repo.list_tasks(with_config=True)
+    header = {"format": ARCHIVE_FORMAT, "kind": cfg_cls.__name__, "count": len(tasks)}
+    fp.write(json.dumps(header, ensure_ascii=False) + "\n")
+    count, errors = 0, []
+    for name in tasks:
+        try:
+            config = json.loads(repo.export(name))
+        except (OSError, ValueError) as e:
+            errors.append((name, str(e)))
+            continue
+        fp.write(json.dumps({"task": name, "config": config}, ensure_ascii=False))
+        fp.write("\n")
+        count += 1
+    return count, errors
+
+
+def read_archive(
+    fp: IO[str], cfg_cls: Type[BaseJSONConfig]
+) -> Iterator[Tuple[str, object]]:
+    """读取归档，依次返回 (任务名, 配置数据)"""
+    header = None
+    for lineno, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ArchiveError(f"归档第{lineno}行不是合法的JSON: {e}") from e
+        if header is None:
+            header = item
+            if not isinstance(item, dict) or item.get("format") != ARCHIVE_FORMAT:
+                raise ArchiveError("不是tg-signer任务归档")
+            if item.get("kind") != cfg_cls.__name__:
+                raise ArchiveError(
+                    f"归档中的配置类型为{item.get('kind')}，需要{cfg_cls.__name__}"
+                )
+            continue
+        if not isinstance(item, dict) or not isinstance(item.get("task"), str):
+            raise ArchiveError(f"归档第{lineno}行缺少任务名")
+        yield item["task"], item.get("config")
+    if header is None:
+        raise ArchiveError("归档为空")
+
+
+def validate_config(
+    cfg_cls: Type[BaseJSONConfig], item: Tuple[str, object]
+) -> Tuple[str, Optional[dict], Optional[str]]:
+    """校验并升级单个配置，返回 (任务名, 当前版本的配置, 错误信息)"""
+    task, data = item
+    if not is_valid_task_name(task):
+        return task, None, "任务名不合法"
+    try:
+        loaded = cfg_cls.load(data)
+    except (TypeError, ValueError) as e:
+        return task, None, str(e)
+    if loaded is None:
+        return task, None, f"无法解析为{cfg_cls.__name__}"
+    return task, loaded[0].to_jsonable(), None
+
+
+def validate_chunk(
+    cfg_cls: Type[BaseJSONConfig], chunk: List[Tuple[str, object]]
+) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    return [validate_config(cfg_cls, item) for item in chunk]
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def validate_configs(
+    items: Iterable[Tuple[str, object]],
+    cfg_cls: Type[BaseJSONConfig],
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    按顺序逐个返回校验结果，`workers`大于1时使用多个子进程并行校验。
+    `items`每次只读取`CHUNK_SIZE`个，同时进行的块数有上限，不会一次读入全部配置。
+    `workers`为None时根据第一块的大小和CPU数量自动选择。
+    """
+    chunks = iter_chunks(items, CHUNK_SIZE)
+    first = next(chunks, [])
+    if workers is None:
+        workers = 1
+        if len(first) >= PARALLEL_THRESHOLD:
+            workers = min(os.cpu_count() or 1, 8)
+    func = partial(validate_chunk, cfg_cls)
+    chunks = itertools.chain([first], chunks)
+    if workers <= 1 or len(first) <= 1:
+        for chunk in chunks:
+            yield from func(chunk)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        # `executor.map`会先读完全部输入，这里手动提交，最多`workers * 2`块在进行中
+        futures = deque()
+        for chunk in chunks:
+            futures.append(executor.submit(func, chunk))
+            if len(futures) >= workers * 2:
+                yield from futures.popleft().result()
+        while futures:
+            yield from futures.popleft().result()
+
+
+def _dumps(config) -> str:
+    return json.dumps(config, ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+
+
+def _read_current(
+    config_file: pathlib.Path, cfg_cls: Type[BaseJSONConfig]
+) -> Optional[object]:
+    """读取已有配置并转换为当前版本，便于与导入的配置比较；无法解析时返回原始内容"""
+    try:
+        with open(config_file, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return config_file.read_text(encoding="utf-8", errors="replace")
+    loaded = cfg_cls.load(data)
+    return loaded[0].to_jsonable() if loaded else data
+
+
+def iter_import_tasks(
+    tasks_dir: PathT,
+    items: Iterable[Tuple[str, object]],
+    cfg_cls: Type[BaseJSONConfig],
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+) -> Iterator[ImportResult]:
+    """
+    校验并导入多个任务配置，旧版本配置升级为当前版本后写入，边读取边导入并返回结果。
+    无效的配置会被跳过，内容没有变化的任务不会重写。
+    `dry_run`为True时只比较，不写入文件，结果中包含与已有配置的diff。
+    """
+    repo = TaskConfigRepository(tasks_dir, cfg_cls)
+    seen = set()
+    for task, config, error in validate_configs(items, cfg_cls, workers):
+        if task in seen:
+            error = error or "任务名重复"
+        seen.add(task)
+        if error is not None:
+            yield ImportResult(task, "invalid", error=error)
+            continue
+        current = _read_current(repo.config_file(task), cfg_cls)
+        if current == config:
+            yield ImportResult(task, "unchanged", config)
+            continue
+        status = "new" if current is None else "changed"
+        diff = ""
+        if dry_run:
+            old_lines = [] if current is None else _dumps(current).splitlines(True)
+            diff = "".join(
+                difflib.unified_diff(
+                    old_lines,
+                    _dumps(config).splitlines(True),
+                    fromfile=f"a/{task}/{CONFIG_FILE_NAME}",
+                    tofile=f"b/{task}/{CONFIG_FILE_NAME}",
+                )
+            )
+        else:
+            repo.write(task, config)
+        yield ImportResult(task, status, config, diff=diff)
+
+
+def import_tasks(
+    tasks_dir: PathT,
+    items: Iterable[Tuple[str, object]],
+    cfg_cls: Type[BaseJSONConfig],
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+) -> List[ImportResult]:
+    """同`iter_import_tasks`，返回全部结果"""
+    return list(iter_import_tasks(tasks_dir, items, cfg_cls, dry_run, workers))
@@ -0,0 +1,243 @@
+"""
+本地计算题求解器，在调用大模型之前先尝试本地求值。
+
+支持阿拉伯数字与中文数字（含大写、小数）、全角字符、中英文运算符描述，
+如 "3 + 5 = ?"、"三加五等于多少"、"（12 × 3）÷ 4 = ？"、"what is 7 times 6"。
+只通过白名单AST求值，不使用`eval`；无法确定时返回None，由调用方回退到大模型。
+"""
+
+import ast
+import operator
+import re
+import unicodedata
+from fractions import Fraction
+from typing import Optional
+
+_CN_DIGITS = {
+    "零": 0,
+    "〇": 0,
+    "一": 1,
+    "壹": 1,
+    "二": 2,
+    "两": 2,
+    "贰": 2,
+    "三": 3,
+    "叁": 3,
+    "四": 4,
+    "肆": 4,
+    "五": 5,
+    "伍": 5,
+    "六": 6,
+    "陆": 6,
+    "七": 7,
+    "柒": 7,
+    "八": 8,
+    "捌": 8,
+    "九": 9,
+    "玖": 9,
+}
+_CN_UNITS = {"十": 10, "拾": 10, "百": 100, "佰": 100, "千": 1000, "仟": 1000}
+_CN_SECTIONS = {"万": 10**4, "萬": 10**4, "亿": 10**8}
+
+_CN_NUM_CHARS = "".join([*_CN_DIGITS, *_CN_UNITS, *_CN_SECTIONS])
+_CN_NUM_RE = re.compile(
+    f"[{_CN_NUM_CHARS}]+(?:点[{''.join(_CN_DIGITS)}]+)?",
+)
+
+# 正则按顺序尝试，长的写在前面，避免"除以"被"除"先替换
+_WORD_OPERATORS = [
+    ("divided by", "/"),
+    ("multiplied by", "*"),
+    ("乘以", "*"),
+    ("除以", "/"),
+    ("加上", "+"),
+    ("减去", "-"),
+    ("plus", "+"),
+    ("minus", "-"),
+    ("times", "*"),
+    ("等于", "="),
+    ("加", "+"),
+    ("减", "-"),
+    ("乘", "*"),
+    ("负", "-"),
+    ("×", "*"),
+    ("✕", "*"),
+    ("✖", "*"),
+    ("·", "*"),
+    ("÷", "/"),
+    ("−", "-"),
+    ("–", "-"),
+    ("^", "**"),
+    ("【", "("),
+    ("】", ")"),
+    ("[", "("),
+    ("]", ")"),
+]
+_WORD_OPERATOR_MAP = dict(_WORD_OPERATORS)
+_WORD_OPERATOR_RE = re.compile(
+    "|".join(re.escape(word) for word, _ in _WORD_OPERATORS), re.IGNORECASE
+)
+
+_UNSUPPORTED_RE = re.compile(
+    r"[%√²³!∑∫π]|sqrt|log|sin|cos|tan|平方|立方|开方|根号|次方|阶乘|余数|取余|百分",
+    re.IGNORECASE,
+)
+_MUL_X_RE = re.compile(r"(?<=[\d)])\s*[xX]\s*(?=[\d(])")
+_EXPR_RE = re.compile(r"[\d.+\-*/()\s]+")
+_OPERATOR_RE = re.compile(r"(?<=[\d)\s])\s*(?:\*\*|[+\-*/])\s*(?=[\d(\s\-])")
+# "x + 3 = 5" 这类等号右侧已有数字的方程不属于求值题
+_EQUATION_RE = re.compile(r"=\s*-?\d")
+# 只有带提问标记的文本才当作计算题，避免把"获得10-20积分"之类的普通文本当成算式
+_QUESTION_RE = re.compile(r"[=＝?？]|等于|多少|几")
+# 算式紧挨着这些分隔符且分隔符另一侧是数字时，说明算式只是更大数字的一部分，
+# 如"1,000"、"12:30"、"1e5"
+_NUMBER_SEPARATORS = ",:.eE"
+_DATE_RE = re.compile(r"\d{4}-\d{1,2}-\d{1,2}|\d{1,2}-\d{1,2}-\d{4}")
+
+MAX_EXPRESSION_LENGTH = 200
+MAX_EXPONENT = 64
+MAX_RESULT_DIGITS = 50
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+
+class UnsupportedExpression(ValueError):
+    pass
+
+
+def cn_to_number(text: str) -> Fraction:
+    """中文数字转数字，如 "一百零五" -> 105，"三点五" -> 3.5，"一二三" -> 123"""
+    integer, _, decimal = text.partition("点")
+    if integer and not any(c in _CN_UNITS or c in _CN_SECTIONS for c in integer):
+        value = int("".join(str(_CN_DIGITS[c]) for c in integer))
+    else:
+        total = section = number = 0
+        for c in integer:
+            if c in _CN_DIGITS:
+                number = _CN_DIGITS[c]
+            elif c in _CN_UNITS:
+                # "十二"省略了开头的"一"
+                section += (number or 1) * _CN_UNITS[c]
+                number = 0
+            else:
+                total += (section + number) * _CN_SECTIONS[c]
+                section = number = 0
+        value = total + section + number
+    if decimal:
+        digits = "".join(str(_CN_DIGITS[c]) for c in decimal)
+        return value + Fraction(int(digits), 10 ** len(digits))
+    return Fraction(value)
+
+
+def _format_number(value: Fraction) -> str:
+    if value.denominator == 1:
+        return str(value.numerator)
+    return str(float(value))
+
+
+def normalize(text: str) -> str:
+    """全角转半角、运算符描述和中文数字转为算式符号"""
+    text = unicodedata.normalize("NFKC", text)
+    text = _WORD_OPERATOR_RE.sub(lambda m: _WORD_OPERATOR_MAP[m.group().lower()], text)
+    text = _CN_NUM_RE.sub(lambda m: _format_number(cn_to_number(m.group())), text)
+    return _MUL_X_RE.sub("*", text)
+
+
+def _evaluate(node: ast.AST) -> Fraction:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return Fraction(str(node.value))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return _UNARY_OPS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow):
+            if right.denominator != 1 or abs(right) > MAX_EXPONENT:
+                raise UnsupportedExpression("指数过大或不是整数")
+            right = int(right)
+        result = _BIN_OPS[type(node.op)](left, right)
+        if len(str(abs(result.numerator))) > MAX_RESULT_DIGITS:
+            raise UnsupportedExpression("结果过大")
+        return result
+    raise UnsupportedExpression(f"不支持的语法: {type(node).__name__}")
+
+
+def evaluate(expression: str) -> Fraction:
+    """安全地计算只包含数字、括号和 + - * / ** 的算式"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise UnsupportedExpression("算式过长")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise UnsupportedExpression(str(e)) from e
+    return _evaluate(tree)
+
+
+def _is_part_of_number(text: str, start: int, end: int) -> bool:
+    """`text[start:end]`两侧是否紧挨着"数字+分隔符"，如"1,000"中的"000"部分"""
+    before, after = text[max(start - 2, 0) : start], text[end : end + 2]
+    if len(before) == 2 and before[1] in _NUMBER_SEPARATORS and before[0].isdigit():
+        return True
+    if len(after) == 2 and after[0] in _NUMBER_SEPARATORS and after[1].isdigit():
+        return True
+    return False
+
+
+def extract_expression(text: str) -> Optional[str]:
+    """
+    从已归一化的文本中找出算式，优先选择等号前的算式，其次选择运算符最多的。
+    选中的算式是日期或更大数字的一部分时返回None。
+    """
+    candidates = []
+    for m in _EXPR_RE.finditer(text):
+        raw = m.group()
+        expr = raw.strip()
+        if not re.search(r"\d", expr) or not _OPERATOR_RE.search(expr):
+            continue
+        start = m.start() + len(raw) - len(raw.lstrip())
+        end = start + len(expr)
+        followed_by_eq = text[m.end() :].lstrip().startswith(("=", "?"))
+        candidates.append(
+            (followed_by_eq, len(_OPERATOR_RE.findall(expr)), expr, start, end)
+        )
+    if not candidates:
+        return None
+    _, _, expr, start, end = max(candidates, key=lambda c: (c[0], c[1]))
+    if _DATE_RE.search(expr) or _is_part_of_number(text, start, end):
+        return None
+    return expr
+
+
+def format_answer(value: Fraction, ndigits: int = 2) -> str:
+    if value.denominator == 1:
+        return str(value.numerator)
+    return f"{float(value):.{ndigits}f}".rstrip("0").rstrip(".")
+
+
+def solve(text: str, ndigits: int = 2) -> Optional[str]:
+    """
+    尝试在本地求解计算题，返回答案字符串；不是简单的四则运算题、没有提问标记
+    或无法确定算式范围时返回None，由调用方交给大模型。
+    非整数结果保留`ndigits`位小数。
+    """
+    if not text or _UNSUPPORTED_RE.search(text) or not _QUESTION_RE.search(text):
+        return None
+    normalized = normalize(text)
+    if _EQUATION_RE.search(normalized):
+        return None
+    expression = extract_expression(normalized)
+    if expression is None:
+        return None
+    try:
+        value = evaluate(expression)
+    except (UnsupportedExpression, ZeroDivisionError):
+        return None
+    return format_answer(value, ndigits)
@@ -1,18 +1,27 @@
 import asyncio
 import logging
+import pathlib
 from typing import Optional
 
 import click
 from click import Group
 
-from tg_signer.core import UserMonitor
-
-from .signer import tg_signer
+from .signer import (
+    configure_observability,
+    export_all_tasks,
+    export_task,
+    import_all_tasks,
+    import_task,
+    list_tasks,
+    tg_signer,
+)
 
 
 def get_monitor(
     task_name, ctx_obj: dict, loop: Optional[asyncio.AbstractEventLoop] = None
 ):
+    from tg_signer.core import UserMonitor
+
     monitor = UserMonitor(
         task_name=task_name,
         account=ctx_obj["account"],
@@ -22,10 +31,19 @@ def get_monitor(
         session_string=ctx_obj["session_string"],
         in_memory=ctx_obj["in_memory"],
         loop=loop,
+        refresh_dialogs=ctx_obj.get("refresh_dialogs", False),
     )
     return monitor
 
 
+def get_monitor_repository(ctx_obj: dict):
+    from tg_signer.config import MonitorConfig
+    from tg_signer.task_repository import MONITOR_TASKS_DIR, TaskConfigRepository
+
+    tasks_dir = pathlib.Path(ctx_obj["workdir"]) / MONITOR_TASKS_DIR
+    return TaskConfigRepository(tasks_dir, MonitorConfig)
+
+
 @tg_signer.group(name="monitor", help="配置和运行监控")
 @click.pass_context
 def tg_monitor(ctx: click.Context):
@@ -39,6 +57,7 @@ def tg_monitor(ctx: click.Context):
                 % f"{proxy['scheme']}://{proxy['hostname']}:{proxy['port']}"
             )
         logger.info(f"Using account: {ctx.obj['account']}")
+        configure_observability(ctx.obj)
 
 
 tg_monitor: Group
@@ -47,7 +66,7 @@ tg_monitor: Group
 @tg_monitor.command(name="list", help="列出已有配置")
 @click.pass_obj
 def list_(obj):
-    return UserMonitor(workdir=obj["workdir"]).list_()
+    list_tasks(get_monitor_repository(obj))
 
 
 @tg_monitor.command(help="根据配置运行监控")
@@ -70,6 +89,8 @@ def run(obj, task_name, num_of_dialogs):
 @click.argument("task_name", nargs=1, default="my_monitor")
 @click.pass_obj
 def reconfig(obj, task_name):
+    from tg_signer.core import UserMonitor
+
     signer = UserMonitor(task_name=task_name, workdir=obj["workdir"])
     return signer.reconfig()
 
@@ -83,13 +104,7 @@ def reconfig(obj, task_name):
 )
 @click.pass_obj
 def export(obj, task_name: str, file: str = None):
-    monitor = get_monitor(task_name, obj)
-    data = monitor.export()
-    if not file:
-        click.echo(data)
-    else:
-        with click.open_file(file, "w", encoding="utf-8") as fp:
-            fp.write(data)
+    export_task(get_monitor_repository(obj), task_name, file)
 
 
 @tg_monitor.command(
@@ -102,11 +117,39 @@ def export(obj, task_name: str, file: str = None):
 )
 @click.pass_obj
 def import_(obj, task_name: str, file: str = None):
-    monitor = get_monitor(task_name, obj)
-    if not file:
-        stdin_text = click.get_text_stream("stdin")
-        data = stdin_text.read()
-    else:
-        with click.open_file(file, "r", encoding="utf-8") as fp:
-            data = fp.read()
-    monitor.import_(data)
+    import_task(get_monitor_repository(obj), task_name, file)
+
+
+@tg_monitor.command(
+    name="export-all",
+    help="""将所有监控任务的配置导出为一个归档（JSON Lines，文件名以.gz结尾时压缩），默认输出到终端。\n\n e.g.\n\n  tg-signer monitor export-all -O monitors.jsonl.gz""",
+)
+@click.option(
+    "--file", "-O", "file", type=click.Path(), default=None, help="导出至该文件"
+)
+@click.pass_obj
+def export_all(obj, file: str = None):
+    export_all_tasks(get_monitor_repository(obj), file)
+
+
+@tg_monitor.command(
+    name="import-all",
+    help="""从归档导入多个监控任务的配置，默认从终端读取。\n\n e.g.\n\n  tg-signer monitor import-all -I monitors.jsonl.gz --dry-run""",
+)
+@click.option(
+    "--file", "-I", "file", type=click.Path(), default=None, help="导入该文件"
+)
+@click.option(
+    "--dry-run", "dry_run", is_flag=True, default=False, help="只显示变化，不写入"
+)
+@click.option(
+    "--workers",
+    "-W",
+    "workers",
+    type=int,
+    default=None,
+    help="并行校验的进程数，默认根据任务数量自动选择",
+)
+@click.pass_obj
+def import_all(obj, file: str = None, dry_run: bool = False, workers: int = None):
+    import_all_tasks(get_monitor_repository(obj), file, dry_run, workers)
@@ -1,15 +1,22 @@
 import asyncio
 import logging
+import pathlib
+from collections import Counter
 from typing import Optional
 
 import click
 from click import Context, HelpFormatter
 
-from tg_signer.core import UserSigner, get_proxy
+from tg_signer.utils import get_proxy
 
 
 class AliasedGroup(click.Group):
-    _aliases = {"run_once": "run-once", "send_text": "send-text"}
+    _aliases = {
+        "run_once": "run-once",
+        "send_text": "send-text",
+        "export_all": "export-all",
+        "import_all": "import-all",
+    }
 
     def __init__(self, name, aliases: dict[str, str] = None, *args, **kwargs):
         self.aliases = self._aliases.copy()
@@ -43,6 +50,9 @@ class AliasedGroup(click.Group):
 def get_signer(
     task_name, ctx_obj: dict, loop: Optional[asyncio.AbstractEventLoop] = None
 ):
+    # tg_signer.core依赖pyrogram等较重的库，只在需要的子命令中导入
+    from tg_signer.core import UserSigner
+
     signer = UserSigner(
         task_name=task_name,
         account=ctx_obj["account"],
@@ -52,10 +62,51 @@ def get_signer(
         session_string=ctx_obj["session_string"],
         in_memory=ctx_obj["in_memory"],
         loop=loop,
+        refresh_dialogs=ctx_obj.get("refresh_dialogs", False),
     )
     return signer
 
 
+def get_sign_repository(ctx_obj: dict):
+    """只读写配置文件，不创建Telegram客户端，也不导入tg_signer.core"""
+    from tg_signer.config import SignConfigV3
+    from tg_signer.task_repository import SIGN_TASKS_DIR, TaskConfigRepository
+
+    tasks_dir = pathlib.Path(ctx_obj["workdir"]) / SIGN_TASKS_DIR
+    return TaskConfigRepository(tasks_dir, SignConfigV3)
+
+
+def list_tasks(repo):
+    click.echo("已配置的任务：")
+    for task_name in repo.list_tasks():
+        click.echo(task_name)
+
+
+def export_task(repo, task_name: str, file: Optional[str]):
+    try:
+        data = repo.export(task_name)
+    except FileNotFoundError as e:
+        raise click.ClickException(f"任务<{task_name}>没有配置文件") from e
+    if not file:
+        click.echo(data)
+    else:
+        with click.open_file(file, "w", encoding="utf-8") as fp:
+            fp.write(data)
+
+
+def import_task(repo, task_name: str, file: Optional[str]):
+    if not file:
+        stdin_text = click.get_text_stream("stdin")
+        data = stdin_text.read()
+    else:
+        with click.open_file(file, "r", encoding="utf-8") as fp:
+            data = fp.read()
+    try:
+        repo.import_(task_name, data)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+
+
 @click.group(name="tg-signer", help="使用<子命令> --help查看使用说明", cls=AliasedGroup)
 @click.option(
     "--log-level",
@@ -127,6 +178,31 @@ def get_signer(
     is_flag=True,
     help="是否将session存储在内存中，默认为False，存储在文件",
 )
+@click.option(
+    "--refresh-dialogs",
+    "refresh_dialogs",
+    default=False,
+    is_flag=True,
+    help="忽略缓存的账号信息和对话列表快照，启动时重新获取",
+)
+@click.option(
+    "--metrics-port",
+    "metrics_port",
+    default=None,
+    type=int,
+    show_envvar=True,
+    envvar="TG_METRICS_PORT",
+    help="在本地该端口提供Prometheus格式的`/metrics`，multi-run多进程时第N个子进程使用该端口+N",
+)
+@click.option(
+    "--metrics-file",
+    "metrics_file",
+    default=None,
+    type=click.Path(),
+    show_envvar=True,
+    envvar="TG_METRICS_FILE",
+    help="定期将指标快照写入该JSON文件",
+)
 @click.pass_context
 def tg_signer(
     ctx: click.Context,
@@ -138,6 +214,9 @@ def tg_signer(
     workdir: str,
     session_string: str,
     in_memory: bool,
+    refresh_dialogs: bool,
+    metrics_port: Optional[int],
+    metrics_file: Optional[str],
 ):
     from tg_signer.logger import configure_logger
 
@@ -157,12 +236,43 @@ def tg_signer(
                 % f"{proxy['scheme']}://{proxy['hostname']}:{proxy['port']}"
             )
         logger.info(f"Using account: {account}")
+    ctx.obj["log_level"] = log_level
+    ctx.obj["log_file"] = log_file
     ctx.obj["proxy"] = proxy
     ctx.obj["session_dir"] = session_dir
     ctx.obj["account"] = account
     ctx.obj["workdir"] = workdir
     ctx.obj["session_string"] = session_string
     ctx.obj["in_memory"] = in_memory
+    ctx.obj["refresh_dialogs"] = refresh_dialogs
+    ctx.obj["metrics_port"] = metrics_port
+    ctx.obj["metrics_file"] = metrics_file
+    # `monitor`下只有`run`需要，由其子命令组判断
+    if ctx.invoked_subcommand in [
+        "run",
+        "run-once",
+        "send-text",
+        "send-dice",
+        "multi-run",
+    ]:
+        configure_observability(ctx.obj)
+
+
+def configure_observability(ctx_obj: dict):
+    """开启事件日志和指标采集，只用于会连接Telegram的命令"""
+    from tg_signer.events import (
+        EVENT_LOG_NAME,
+        configure_events,
+        events_enabled_by_env,
+    )
+
+    if events_enabled_by_env():
+        configure_events(pathlib.Path(ctx_obj["workdir"]) / EVENT_LOG_NAME)
+    metrics_port, metrics_file = ctx_obj["metrics_port"], ctx_obj["metrics_file"]
+    if metrics_port or metrics_file:
+        from tg_signer.metrics import configure_metrics
+
+        configure_metrics(port=metrics_port, snapshot_file=metrics_file)
 
 
 @tg_signer.command(help="Show version")
@@ -176,7 +286,7 @@ def version():
 @tg_signer.command(name="list", help="列出已有配置")
 @click.pass_obj
 def list_(obj):
-    return UserSigner(workdir=obj["workdir"]).list_()
+    list_tasks(get_sign_repository(obj))
 
 
 @tg_signer.command(help="登录账号（用于获取session）")
@@ -287,6 +397,8 @@ def send_dice(obj, chat_id, emoji, delete_after=None):
 @click.argument("task_name", nargs=1, default="my_sign")
 @click.pass_obj
 def reconfig(obj, task_name):
+    from tg_signer.core import UserSigner
+
     signer = UserSigner(task_name=task_name, workdir=obj["workdir"])
     return signer.reconfig()
 
@@ -330,13 +442,7 @@ def list_members(obj, chat_id: str, query: str, admin, limit):
 )
 @click.pass_obj
 def export(obj, task_name: str, file: str = None):
-    signer = get_signer(task_name, obj)
-    data = signer.export()
-    if not file:
-        click.echo(data)
-    else:
-        with click.open_file(file, "w", encoding="utf-8") as fp:
-            fp.write(data)
+    export_task(get_sign_repository(obj), task_name, file)
 
 
 @tg_signer.command(
@@ -349,14 +455,99 @@ def export(obj, task_name: str, file: str = None):
 )
 @click.pass_obj
 def import_(obj, task_name: str, file: str = None):
-    signer = get_signer(task_name, obj)
+    import_task(get_sign_repository(obj), task_name, file)
+
+
+def export_all_tasks(repo, file: Optional[str]):
+    from tg_signer.archive import export_tasks, open_archive
+
+    tasks_dir, cfg_cls = repo.tasks_dir, repo.cfg_cls
     if not file:
-        stdin_text = click.get_text_stream("stdin")
-        data = stdin_text.read()
+        count, errors = export_tasks(
+            tasks_dir, click.get_text_stream("stdout"), cfg_cls
+        )
     else:
-        with click.open_file(file, "r", encoding="utf-8") as fp:
-            data = fp.read()
-    signer.import_(data)
+        with open_archive(file, "w") as fp:
+            count, errors = export_tasks(tasks_dir, fp, cfg_cls)
+    for task, error in errors:
+        click.echo(f"跳过任务<{task}>: {error}", err=True)
+    click.echo(f"已导出{count}个任务", err=True)
+
+
+def import_all_tasks(repo, file: Optional[str], dry_run: bool, workers: Optional[int]):
+    from tg_signer.archive import (
+        ArchiveError,
+        iter_import_tasks,
+        open_archive,
+        read_archive,
+    )
+
+    tasks_dir, cfg_cls = repo.tasks_dir, repo.cfg_cls
+    counts = Counter()
+
+    def run(fp):
+        # 边读取边校验、导入，不会一次读入整个归档
+        for r in iter_import_tasks(
+            tasks_dir, read_archive(fp, cfg_cls), cfg_cls, dry_run, workers
+        ):
+            counts[r.status] += 1
+            if r.status == "invalid":
+                click.echo(f"invalid  {r.task}: {r.error}", err=True)
+            elif r.status != "unchanged":
+                click.echo(f"{r.status:<8} {r.task}")
+                if r.diff:
+                    click.echo(r.diff, nl=False)
+
+    error = None
+    try:
+        if not file:
+            run(click.get_text_stream("stdin"))
+        else:
+            with open_archive(file, "r") as fp:
+                run(fp)
+    except (ArchiveError, OSError) as e:
+        error = e
+    summary = ", ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+    click.echo(f"{'[dry-run] ' if dry_run else ''}{summary or '没有任务'}", err=True)
+    if error is not None:
+        raise click.ClickException(f"{error}，之后的任务未导入") from error
+    if counts["invalid"]:
+        raise click.ClickException(f"{counts['invalid']}个任务配置无效，已跳过")
+
+
+@tg_signer.command(
+    name="export-all",
+    help="""将所有签到任务的配置导出为一个归档（JSON Lines，文件名以.gz结尾时压缩），默认输出到终端。\n\n e.g.\n\n  tg-signer export-all -O tasks.jsonl.gz""",
+)
+@click.option(
+    "--file", "-O", "file", type=click.Path(), default=None, help="导出至该文件"
+)
+@click.pass_obj
+def export_all(obj, file: str = None):
+    export_all_tasks(get_sign_repository(obj), file)
+
+
+@tg_signer.command(
+    name="import-all",
+    help="""从归档导入多个签到任务的配置，默认从终端读取。\n\n e.g.\n\n  tg-signer import-all -I tasks.jsonl.gz --dry-run""",
+)
+@click.option(
+    "--file", "-I", "file", type=click.Path(), default=None, help="导入该文件"
+)
+@click.option(
+    "--dry-run", "dry_run", is_flag=True, default=False, help="只显示变化，不写入"
+)
+@click.option(
+    "--workers",
+    "-W",
+    "workers",
+    type=int,
+    default=None,
+    help="并行校验的进程数，默认根据任务数量自动选择",
+)
+@click.pass_obj
+def import_all(obj, file: str = None, dry_run: bool = False, workers: int = None):
+    import_all_tasks(get_sign_repository(obj), file, dry_run, workers)
 
 
 @tg_signer.command(help="批量配置Telegram自带的定时发送消息功能")
@@ -428,10 +619,37 @@ def list_schedule_messages(obj, chat_id):
     type=int,
     help="获取最近N个对话, 请确保想要签到的对话在最近N个对话内",
 )
+@click.option(
+    "--workers",
+    "-W",
+    "workers",
+    default=1,
+    show_default=True,
+    type=int,
+    help="子进程数量，大于1时账号将分配到多个进程中运行，异常退出的进程会自动重启",
+)
 @click.pass_obj
-def multi_run(obj, accounts, task_name, num_of_dialogs):
+def multi_run(obj, accounts, task_name, num_of_dialogs, workers):
     logger = logging.getLogger("tg-signer")
     logger.info(f"开始使用一套配置({task_name})同时运行多个账号..")
+    if workers > 1:
+        from tg_signer.supervisor import Supervisor
+
+        supervisor = Supervisor(
+            accounts,
+            task_name,
+            obj,
+            num_workers=workers,
+            num_of_dialogs=num_of_dialogs,
+            log_level=obj["log_level"],
+            log_file=obj["log_file"],
+            status_file=pathlib.Path(obj["workdir"])
+            / "supervisor"
+            / f"{task_name}.json",
+        )
+        logger.info(f"账号分配: {supervisor.shards}")
+        supervisor.run()
+        return
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     coros = []
@@ -440,3 +658,70 @@ def multi_run(obj, accounts, task_name, num_of_dialogs):
         signer = get_signer(task_name, obj, loop=loop)
         coros.append(signer.run(num_of_dialogs))
     loop.run_until_complete(asyncio.gather(*coros))
+
+
+@tg_signer.command(help="统计事件日志中各类事件的数量和耗时分位数(ms)")
+@click.option(
+    "--file",
+    "-f",
+    "files",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="事件日志文件，可指定多个，默认读取工作目录下的events*.jsonl*",
+)
+@click.option(
+    "--event",
+    "-e",
+    "event_types",
+    multiple=True,
+    type=click.Choice(["send_command", "recv_message", "action_result", "ai_call"]),
+    help="只统计指定类型的事件，可指定多个",
+)
+@click.option(
+    "--by",
+    "group_by",
+    multiple=True,
+    type=click.Choice(["event", "account", "task", "chat", "kind", "action"]),
+    help="分组字段，可指定多个，默认按event分组",
+)
+@click.option(
+    "--since",
+    "since_hours",
+    type=float,
+    default=None,
+    help="只统计最近N小时内的事件",
+)
+@click.pass_obj
+def stats(obj, files, event_types, group_by, since_hours):
+    import time
+
+    from tg_signer.events import default_event_files, iter_events, summarize
+
+    files = files or default_event_files(obj["workdir"])
+    if not files:
+        click.echo("未找到事件日志")
+        return
+    group_by = group_by or ("event",)
+    since = time.time() - since_hours * 3600 if since_hours else None
+    rows = summarize(iter_events(files), group_by, event_types, since)
+
+    def fmt(v):
+        return "-" if v is None else f"{v:.0f}"
+
+    header = [*group_by, "count", "outcomes", "p50", "p95", "p99"]
+    table = [header]
+    for row in rows:
+        outcomes = ",".join(f"{k}={v}" for k, v in sorted(row["outcomes"].items()))
+        table.append(
+            [
+                *(str(row[k]) for k in group_by),
+                str(row["count"]),
+                outcomes or "-",
+                fmt(row["p50"]),
+                fmt(row["p95"]),
+                fmt(row["p99"]),
+            ]
+        )
+    widths = [max(len(r[i]) for r in table) for i in range(len(header))]
+    for r in table:
+        click.echo("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip())
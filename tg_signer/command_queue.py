@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Union
+
+from pyrogram import errors
+
+from .metrics import FLOOD_WAIT_SECONDS, FLOOD_WAITS
+
+logger = logging.getLogger("tg-signer")
+
+PRIORITY_HIGH = 0  # 签到动作、按钮点击
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # AI回复等
+
+CommandFuncT = Callable[[], Awaitable[Any]]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """令牌桶：以`rate`个/秒的速度补充，最多积累`capacity`个"""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self, n: float = 1) -> float:
+        """距离可以取出`n`个令牌还需要等待的秒数"""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < n:
+            wait = max(wait, (n - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, n: float = 1):
+        self._refill(self.clock())
+        self.tokens -= n
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（如遇到FloodWait）"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+class Command:
+    __slots__ = (
+        "func",
+        "chat_id",
+        "priority",
+        "dedupe_key",
+        "future",
+        "flood_retries",
+        "bucket",
+    )
+
+    def __init__(
+        self,
+        func: CommandFuncT,
+        chat_id: Union[int, str, None],
+        priority: int,
+        dedupe_key: Optional[Hashable],
+        future: asyncio.Future,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        self.func = func
+        self.chat_id = chat_id
+        self.priority = priority
+        self.dedupe_key = dedupe_key
+        self.future = future
+        self.flood_retries = 0
+        # 指定时只从该令牌桶取令牌，不占用账号和chat的令牌桶
+        self.bucket = bucket
+
+
+class CommandQueue:
+    """
+    统一的发送队列，一个账号一个实例。
+
+    待执行的命令保存在按``(when_ts, priority, seq)``排序的小顶堆中，到期的命令按优先级执行；
+    每个命令执行前需同时从账号令牌桶和该chat的令牌桶中取得令牌，
+    某个chat被限速时，其它chat的命令可以继续执行。
+    遇到`FloodWait`/`SlowmodeWait`时暂停对应令牌桶，并把命令重新放回队列。
+    相同`dedupe_key`的命令在完成前只会执行一次。
+    设置定时消息不会立即出现在chat中，使用独立的`schedule_bucket`限速，
+    速率可通过`TG_SCHEDULE_SEND_RATE`调整。
+    """
+
+    def __init__(
+        self,
+        account_rate: float = None,
+        account_burst: float = 5,
+        chat_rate: float = None,
+        chat_burst: float = 3,
+        max_flood_wait: float = 600,
+        max_flood_retries: int = 3,
+        schedule_rate: float = None,
+        schedule_burst: float = 10,
+    ):
+        self.account_bucket = TokenBucket(
+            account_rate or _env_float("TG_ACCOUNT_SEND_RATE", 3), account_burst
+        )
+        self.chat_rate = chat_rate or _env_float("TG_CHAT_SEND_RATE", 1)
+        self.chat_burst = chat_burst
+        self.chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self.schedule_bucket = TokenBucket(
+            schedule_rate or _env_float("TG_SCHEDULE_SEND_RATE", 10), schedule_burst
+        )
+        self.max_flood_wait = max_flood_wait
+        self.max_flood_retries = max_flood_retries
+        # 延时堆: (when_ts, priority, seq, command)；就绪堆: (priority, seq, command)
+        self._heap: List[tuple] = []
+        self._ready: List[tuple] = []
+        self._seq = itertools.count()
+        self._dedupe: Dict[Hashable, asyncio.Future] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    def __len__(self):
+        return len(self._heap) + len(self._ready)
+
+    def _buckets(self, command: Command) -> List[TokenBucket]:
+        if command.bucket is not None:
+            return [command.bucket]
+        chat_bucket = self._chat_bucket(command.chat_id)
+        if chat_bucket is None:
+            return [self.account_bucket]
+        return [self.account_bucket, chat_bucket]
+
+    def _chat_bucket(self, chat_id) -> Optional[TokenBucket]:
+        if chat_id is None:
+            return None
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate, self.chat_burst
+            )
+        return bucket
+
+    def submit(
+        self,
+        func: CommandFuncT,
+        *,
+        chat_id: Union[int, str, None] = None,
+        priority: int = PRIORITY_NORMAL,
+        delay: float = 0,
+        dedupe_key: Optional[Hashable] = None,
+        bucket: Optional[TokenBucket] = None,
+    ) -> asyncio.Future:
+        """
+        将命令加入队列，返回该命令结果的Future。
+        :param func: 无参数的协程函数，执行实际的请求
+        :param delay: 至少在该秒数之后执行
+        :param dedupe_key: 若已有相同key的命令在等待或执行中，直接返回该命令的Future
+        :param bucket: 使用该令牌桶代替账号和chat的令牌桶，如`schedule_bucket`
+        """
+        loop = asyncio.get_running_loop()
+        if dedupe_key is not None and dedupe_key in self._dedupe:
+            return self._dedupe[dedupe_key]
+        future = loop.create_future()
+        command = Command(func, chat_id, priority, dedupe_key, future, bucket)
+        if dedupe_key is not None:
+            self._dedupe[dedupe_key] = future
+            future.add_done_callback(lambda _: self._dedupe.pop(dedupe_key, None))
+        self._push(command, loop.time() + delay)
+        return future
+
+    async def run(self, func: CommandFuncT, **kwargs):
+        """提交命令并等待其结果"""
+        return await self.submit(func, **kwargs)
+
+    def _push(self, command: Command, when_ts: float):
+        heapq.heappush(
+            self._heap, (when_ts, command.priority, next(self._seq), command)
+        )
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._heap or self._ready:
+            now = loop.time()
+            # 到期的命令移入就绪堆，就绪命令之间按优先级执行
+            while self._heap and self._heap[0][0] <= now:
+                _, priority, seq, command = heapq.heappop(self._heap)
+                heapq.heappush(self._ready, (priority, seq, command))
+            while self._ready:
+                priority, seq, command = heapq.heappop(self._ready)
+                if command.future.done():
+                    continue
+                buckets = self._buckets(command)
+                wait = max(bucket.wait_time() for bucket in buckets)
+                if wait > 0:
+                    # 被限速的命令推迟，让其它chat的命令先执行
+                    heapq.heappush(self._heap, (now + wait, priority, seq, command))
+                    continue
+                for bucket in buckets:
+                    bucket.consume()
+                task = asyncio.create_task(self._execute(command))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+            if not self._heap:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), max(0.0, self._heap[0][0] - loop.time())
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, command: Command):
+        try:
+            result = await command.func()
+        except (errors.FloodWait, errors.SlowmodeWait) as e:
+            self._on_flood(command, e)
+        except Exception as e:
+            if not command.future.done():
+                command.future.set_exception(e)
+        else:
+            if not command.future.done():
+                command.future.set_result(result)
+
+    def _on_flood(self, command: Command, e: errors.RPCError):
+        seconds = float(e.value or 0)
+        FLOOD_WAITS.inc(error=e.ID)
+        FLOOD_WAIT_SECONDS.inc(seconds, error=e.ID)
+        command.flood_retries += 1
+        if (
+            seconds > self.max_flood_wait
+            or command.flood_retries > self.max_flood_retries
+        ):
+            if not command.future.done():
+                command.future.set_exception(e)
+            return
+        logger.warning(f"{e.ID}: 等待{seconds}秒后重试 (chat: {command.chat_id})")
+        if command.bucket is not None:
+            command.bucket.pause(seconds)
+        else:
+            chat_bucket = self._chat_bucket(command.chat_id)
+            if chat_bucket is not None:
+                chat_bucket.pause(seconds)
+            if isinstance(e, errors.FloodWait) or chat_bucket is None:
+                self.account_bucket.pause(seconds)
+        self._push(command, asyncio.get_running_loop().time() + seconds)
+
+    async def join(self):
+        while self._heap or self._ready or self._inflight:
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+            elif self._dispatcher is not None:
+                await self._dispatcher
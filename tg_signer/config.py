@@ -3,6 +3,7 @@ from datetime import time
 from enum import Enum
 from functools import cached_property
 from typing import (
+    TYPE_CHECKING,
     ClassVar,
     Dict,
     List,
@@ -14,9 +15,11 @@ from typing import (
 )
 
 from pydantic import AnyHttpUrl, BaseModel, ValidationError
-from pyrogram.types import Chat, Message
 from typing_extensions import Self, TypeAlias
 
+if TYPE_CHECKING:
+    from pyrogram.types import Chat, Message
+
 
 def get_display_width(text: str) -> int:
     """计算文本在终端中的显示宽度（考虑中文字符占2个字符位）"""
@@ -51,6 +54,8 @@ class BaseJSONConfig(BaseModel):
     version: ClassVar[Union[str, int]] = 0
     olds: ClassVar[Optional[List[Type["BaseJSONConfig"]]]] = None
     is_current: ClassVar[bool] = False
+    # 写入文件时记录配置版本的字段，加载时据此直接选择对应的类，无需逐个尝试
+    version_field: ClassVar[str] = "_version"
 
     @classmethod
     def valid(cls, d):
@@ -61,20 +66,61 @@ class BaseJSONConfig(BaseModel):
         return instance
 
     def to_jsonable(self):
-        return self.model_dump(mode="json")
+        data = self.model_dump(mode="json")
+        if self.version:
+            data[self.version_field] = self.version
+        return data
 
     @classmethod
     def to_current(cls, obj: Self):
         return obj
 
     @classmethod
-    def load(cls, d: dict) -> Optional[Tuple[Self, bool]]:
-        if instance := cls.valid(d):
-            return instance, False
+    def history(cls) -> Dict[Union[str, int], Type["BaseJSONConfig"]]:
+        """所有旧版本的配置类，按版本号索引，包括旧版本的旧版本"""
+        result = {}
         for old in cls.olds or []:
-            if old_inst := old.valid(d):
-                return old.to_current(old_inst), True
-        return None
+            result.setdefault(old.version, old)
+            for version, older in old.history().items():
+                result.setdefault(version, older)
+        return result
+
+    @classmethod
+    def upgrade(cls, obj: "BaseJSONConfig") -> Self:
+        """沿 `to_current` 逐级升级旧版本配置，如 V1 -> V2 -> V3"""
+        while not isinstance(obj, cls):
+            upgraded = type(obj).to_current(obj)
+            if type(upgraded) is type(obj):
+                raise TypeError(f"{type(obj).__name__}无法升级为{cls.__name__}")
+            obj = upgraded
+        return obj
+
+    @classmethod
+    def load(cls, d: dict) -> Optional[Tuple[Self, bool]]:
+        """
+        返回 (配置, 是否需要写回文件)，无法解析时返回None。
+        带版本号的配置只校验一次；没有版本号的旧文件依次尝试当前及各旧版本，
+        升级后写回时会带上版本号。
+        """
+        if not isinstance(d, dict):
+            return None
+        if cls.version_field not in d:
+            if instance := cls.valid(d):
+                return instance, True
+            for old in cls.history().values():
+                if old_inst := old.valid(d):
+                    return cls.upgrade(old_inst), True
+            return None
+        d = dict(d)
+        version = d.pop(cls.version_field)
+        if version == cls.version:
+            if instance := cls.valid(d):
+                return instance, False
+            return None
+        old = cls.history().get(version)
+        if old is None or not (old_inst := old.valid(d)):
+            return None
+        return cls.upgrade(old_inst), True
 
 
 class SignConfigV1(BaseJSONConfig):
@@ -318,6 +364,7 @@ class SignConfigV3(BaseJSONConfig):
     sign_at: str  # 签到时间，time或crontab表达式
     random_seconds: int = 0
     sign_interval: int = 1  # 连续签到的间隔时间，单位秒
+    concurrency: int = 1  # 同时签到的chat数量，1表示逐个签到
 
 
 MatchRuleT: TypeAlias = Literal["exact", "contains", "regex", "all"]
@@ -327,6 +374,10 @@ class UDPForward(BaseModel):
     type: Literal["udp"] = "udp"
     host: str
     port: int
+    format: Literal["str", "json"] = "str"  # 序列化方式，json为只含常用字段的单行JSON
+    batch: bool = False  # 合并多条消息为一个数据报（以换行分隔）
+    max_datagram_size: int = 1400  # 合并时单个数据报的最大字节数
+    batch_interval: float = 0.05  # 合并时最多等待的秒数
 
 
 class HttpCallback(BaseModel):
@@ -347,6 +398,7 @@ class MatchConfig(BaseJSONConfig):
     default_send_text: Optional[str] = None  # 默认发送内容
     ai_reply: bool = False  # 是否使用AI回复
     ai_prompt: Optional[str] = None
+    ai_stream: bool = False  # AI回复是否流式发送：先发送首段，再逐步编辑消息
     send_text_search_regex: Optional[str] = None  # 用正则表达式从消息中提取发送内容
     delete_after: Optional[int] = None
     ignore_case: bool = True  # 忽略大小写
@@ -394,6 +446,25 @@ class MatchConfig(BaseJSONConfig):
             or ("me" in self.from_user_set and message.from_user.is_self)
         )
 
+    @cached_property
+    def folded_rule_value(self) -> Optional[str]:
+        if self.rule_value is None:
+            return None
+        return self.rule_value.lower()
+
+    @cached_property
+    def rule_pattern(self) -> Optional[re.Pattern]:
+        if self.rule != "regex" or self.rule_value is None:
+            return None
+        flags = re.IGNORECASE if self.ignore_case else 0
+        return re.compile(self.rule_value, flags=flags)
+
+    @cached_property
+    def send_text_pattern(self) -> Optional[re.Pattern]:
+        if not self.send_text_search_regex:
+            return None
+        return re.compile(self.send_text_search_regex)
+
     def match_text(self, text: str) -> bool:
         """
         根据`rule`校验`text`是否匹配
@@ -403,15 +474,14 @@ class MatchConfig(BaseJSONConfig):
             return True
         if self.rule == "exact":
             if self.ignore_case:
-                return rule_value.lower() == text.lower()
+                return self.folded_rule_value == text.lower()
             return rule_value == text
         elif self.rule == "contains":
             if self.ignore_case:
-                return rule_value.lower() in text.lower()
+                return self.folded_rule_value in text.lower()
             return rule_value in text
         elif self.rule == "regex":
-            flags = re.IGNORECASE if self.ignore_case else 0
-            return bool(re.search(rule_value, text, flags=flags))
+            return bool(self.rule_pattern.search(text))
         return False
 
     def match_chat(self, chat: "Chat"):
@@ -426,8 +496,8 @@ class MatchConfig(BaseJSONConfig):
 
     def get_send_text(self, text: str) -> str:
         send_text = self.default_send_text
-        if self.send_text_search_regex:
-            m = re.search(self.send_text_search_regex, text)
+        if self.send_text_pattern:
+            m = self.send_text_pattern.search(text)
             if not m:
                 return send_text
             try:
@@ -0,0 +1,96 @@
+import json
+import os
+import pathlib
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple, Type, TypeVar, Union
+
+from .config import BaseJSONConfig
+
+ConfigT = TypeVar("ConfigT", bound=BaseJSONConfig)
+
+
+class FileStamp(NamedTuple):
+    mtime_ns: int
+    size: int
+
+
+def file_stamp(path: Union[str, pathlib.Path]) -> Optional[FileStamp]:
+    """文件的(mtime, size)，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return FileStamp(st.st_mtime_ns, st.st_size)
+
+
+class ConfigLoadError(ValueError):
+    pass
+
+
+class ConfigCache:
+    """
+    按 (路径, 配置类) 缓存解析后的配置，文件的(mtime, size)不变时直接返回缓存，
+    避免重复读取文件、pydantic校验以及逐个尝试旧版本格式。
+    多个账号使用同一份配置时共享同一个实例，调用方不应修改返回的配置。
+    """
+
+    def __init__(self):
+        self._entries: Dict[
+            Tuple[str, type], Tuple[FileStamp, BaseJSONConfig, bool]
+        ] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0}
+
+    @staticmethod
+    def _key(path: pathlib.Path, cfg_cls: type) -> Tuple[str, type]:
+        return str(path.resolve()), cfg_cls
+
+    def load(
+        self, path: Union[str, pathlib.Path], cfg_cls: Type[ConfigT]
+    ) -> Tuple[ConfigT, bool, FileStamp]:
+        """
+        返回 (配置, 是否由旧版本转换而来, 读取时的文件标记)。
+        :raises FileNotFoundError: 文件不存在
+        :raises ConfigLoadError: 文件内容不是合法的配置
+        """
+        path = pathlib.Path(path)
+        key = self._key(path, cfg_cls)
+        stamp = file_stamp(path)
+        if stamp is None:
+            raise FileNotFoundError(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self.stats["hit"] += 1
+            return entry[1], entry[2], stamp
+        self.stats["miss"] += 1
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                loaded = cfg_cls.load(json.load(fp))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ConfigLoadError(f"配置文件{path}不是合法的JSON: {e}") from e
+        if loaded is None:
+            raise ConfigLoadError(
+                f"配置文件{path}格式错误，无法解析为{cfg_cls.__name__}"
+            )
+        config, from_old = loaded
+        with self._lock:
+            self._entries[key] = (stamp, config, from_old)
+        return config, from_old, stamp
+
+    def invalidate(self, path: Union[str, pathlib.Path]):
+        resolved = str(pathlib.Path(path).resolve())
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == resolved]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_CONFIG_CACHE = ConfigCache()
+
+
+def get_config_cache() -> ConfigCache:
+    return _CONFIG_CACHE
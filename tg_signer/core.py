@@ -1,26 +1,28 @@
 import asyncio
+import functools
 import json
 import logging
+import math
 import os
 import pathlib
 import random
+import re
 import time
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta, timezone
 from datetime import time as dt_time
 from typing import (
     BinaryIO,
+    Dict,
     Generic,
     List,
     Optional,
+    Tuple,
     Type,
     TypeVar,
     Union,
 )
-from urllib import parse
 
-import httpx
-from croniter import CroniterBadCronError, croniter
 from pydantic import BaseModel, ConfigDict, ValidationError
 from pyrogram import Client as BaseClient
 from pyrogram import errors, filters
@@ -56,16 +58,64 @@ from tg_signer.config import (
 )
 
 from .ai_tools import (
+    AIClient,
     calculate_problem,
     choose_option_by_image,
-    get_openai_client,
+    close_ai_clients,
+    get_ai_client,
     get_reply,
+    stream_reply,
+)
+from .calc_solver import solve as solve_calculation
+from .command_queue import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    CommandQueue,
+)
+from .config_cache import ConfigLoadError, FileStamp, file_stamp, get_config_cache
+from .events import EventEmitter
+from .http_pool import close_http_pool, get_http_pool
+from .image_cache import ImageChoiceCache, get_image_choice_cache
+from .logger import LazyStr
+from .match_index import MatchIndex
+from .metrics import (
+    CLIENT_STARTS,
+    CLIENT_STOPS,
+    CLIENTS_ACTIVE,
+    FORWARD_SECONDS,
+    FORWARDS,
+    MONITOR_MATCHES,
+    MONITOR_MESSAGES,
+    PIPELINE_DEPTH,
+    WAIT_FOR_SECONDS,
+    track,
 )
 from .notification.server_chan import sc_send
-from .utils import NumberingLangT, numbering
+from .pipeline import DispatchPipeline
+from .reply_cache import ReplyCache, normalize_text
+from .scheduler import DeleteScheduler
+from .state_store import StateStore, get_state_store
+from .stream_edit import ProgressiveMessage
+from .task_repository import (
+    CONFIG_FILE_NAME,
+    MONITOR_TASKS_DIR,
+    SIGN_TASKS_DIR,
+    TaskConfigRepository,
+)
+from .udp_forward import close_udp_pool, get_udp_pool, serialize_message
+from .utils import NumberingLangT, get_api_config, get_proxy, numbering
+from .workdir import get_workdir_layout
 
 logger = logging.getLogger("tg-signer")
 
+_LOG_LEVELS = {
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
 print_to_user = print
 
 DICE_EMOJIS = ("🎲", "🎯", "🏀", "⚽", "🎳", "🎰")
@@ -121,6 +171,19 @@ def readable_message(message: Message):
     return s
 
 
+# 机器人回调应答中表示验证未通过的文本
+_CHALLENGE_FAILED_RE = re.compile(
+    r"错误|失败|不正确|不对|重试|wrong|incorrect|fail|invalid|try again", re.IGNORECASE
+)
+
+
+def is_challenge_failed(answer) -> bool:
+    """点击按钮后的回调应答：请求失败或应答文本表示答案错误时返回True"""
+    if answer is None:
+        return True
+    return bool(_CHALLENGE_FAILED_RE.search(getattr(answer, "message", None) or ""))
+
+
 def readable_chat(chat: Chat):
     if chat.type == ChatType.BOT:
         type_ = "BOT"
@@ -138,6 +201,20 @@ def readable_chat(chat: Chat):
     return f"id: {chat.id}, username: {none_or_dash(chat.username)}, title: {none_or_dash(chat.title)}, type: {type_}, name: {none_or_dash(chat.first_name)}"
 
 
+def _chat_from_snapshot(data: dict) -> Chat:
+    chat_type = data.get("type")
+    if isinstance(chat_type, str):
+        chat_type = ChatType[chat_type.rsplit(".", 1)[-1]]
+    return Chat(
+        id=data["id"],
+        type=chat_type,
+        title=data.get("title"),
+        username=data.get("username"),
+        first_name=data.get("first_name"),
+        last_name=data.get("last_name"),
+    )
+
+
 _CLIENT_INSTANCES: dict[str, "Client"] = {}
 
 # reference counts and async locks for shared client lifecycle management
@@ -146,6 +223,12 @@ _CLIENT_INSTANCES: dict[str, "Client"] = {}
 _CLIENT_REFS: defaultdict[str, int] = defaultdict(int)
 _CLIENT_ASYNC_LOCKS: dict[str, asyncio.Lock] = {}
 
+# 延时删除调度器，按持久化文件路径（工作目录+账号）共享
+_DELETE_SCHEDULERS: dict[str, DeleteScheduler] = {}
+
+# 发送队列，同一账号的所有任务共享一个，从而共享速率限制
+_COMMAND_QUEUES: dict[str, CommandQueue] = {}
+
 
 class Client(BaseClient):
     def __init__(self, name: str, *args, **kwargs):
@@ -168,6 +251,9 @@ class Client(BaseClient):
                     await self.start()
                 except ConnectionError:
                     pass
+                else:
+                    CLIENT_STARTS.inc(account=self.name)
+                    CLIENTS_ACTIVE.labels().inc()
             return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -181,6 +267,9 @@ class Client(BaseClient):
                     await self.stop()
                 except ConnectionError:
                     pass
+                else:
+                    CLIENT_STOPS.inc(account=self.name)
+                    CLIENTS_ACTIVE.labels().dec()
                 _CLIENT_INSTANCES.pop(self.key, None)
 
     @property
@@ -207,26 +296,6 @@ class Client(BaseClient):
             os.remove(self.session_string_file)
 
 
-def get_api_config():
-    api_id = int(os.environ.get("TG_API_ID", 611335))
-    api_hash = os.environ.get("TG_API_HASH", "d524b414d21f4d37f08684c1df41ac9c")
-    return api_id, api_hash
-
-
-def get_proxy(proxy: str = None):
-    proxy = proxy or os.environ.get("TG_PROXY")
-    if proxy:
-        r = parse.urlparse(proxy)
-        return {
-            "scheme": r.scheme,
-            "hostname": r.hostname,
-            "port": r.port,
-            "username": r.username,
-            "password": r.password,
-        }
-    return None
-
-
 def get_client(
     name: str = "my_account",
     proxy: dict = None,
@@ -258,13 +327,6 @@ def get_now():
     return datetime.now(tz=timezone(timedelta(hours=8)))
 
 
-def make_dirs(path: pathlib.Path, exist_ok=True):
-    path = pathlib.Path(path)
-    if not path.is_dir():
-        os.makedirs(path, exist_ok=exist_ok)
-    return path
-
-
 ConfigT = TypeVar("ConfigT", bound=BaseJSONConfig)
 
 
@@ -272,6 +334,10 @@ class BaseUserWorker(Generic[ConfigT]):
     _workdir = "."
     _tasks_dir = "tasks"
     cfg_cls: Type["ConfigT"] = BaseJSONConfig
+    # 账号身份与对话列表快照的有效期（秒），过期后启动时重新拉取
+    dialog_snapshot_ttl = 24 * 60 * 60
+    # 运行中检查配置文件是否变化的间隔（秒）
+    config_reload_interval = 5
 
     def __init__(
         self,
@@ -284,6 +350,7 @@ class BaseUserWorker(Generic[ConfigT]):
         in_memory: bool = False,
         *,
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        refresh_dialogs: bool = False,
     ):
         self.task_name = task_name or "my_task"
         self._session_dir = pathlib.Path(session_dir)
@@ -291,22 +358,42 @@ class BaseUserWorker(Generic[ConfigT]):
         self._proxy = proxy
         if workdir:
             self._workdir = pathlib.Path(workdir)
-        self.app = get_client(
-            account,
-            proxy,
-            workdir=self._session_dir,
-            session_string=session_string,
-            in_memory=in_memory,
-            loop=loop,
-        )
-        self.loop = self.app.loop
+        self.layout = get_workdir_layout(self._workdir, self._tasks_dir)
+        # 客户端在首次使用时才创建，只读写配置的命令不需要客户端
+        self._client_kwargs = {
+            "session_string": session_string,
+            "in_memory": in_memory,
+            "loop": loop,
+        }
+        self._app: Optional[Client] = None
         self.user: Optional[User] = None
+        self.refresh_dialogs = refresh_dialogs
         self._config = None
+        # 当前配置对应的配置文件(mtime, size)，用于检测配置变化
+        self._config_stamp: Optional[FileStamp] = None
+        self.events = EventEmitter(account=account, task=self.task_name)
+        # chat id -> 最近一次向该chat发送指令的时间，用于计算响应耗时
+        self._last_sent_at: Dict[int, float] = {}
         self.context = self.ensure_ctx()
 
     def ensure_ctx(self):
         return {}
 
+    @property
+    def app(self) -> Client:
+        if self._app is None:
+            self._app = get_client(
+                self._account,
+                self._proxy,
+                workdir=self._session_dir,
+                **self._client_kwargs,
+            )
+        return self._app
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.app.loop
+
     def app_run(self, coroutine=None):
         if coroutine is not None:
             run = self.loop.run_until_complete
@@ -316,30 +403,47 @@ class BaseUserWorker(Generic[ConfigT]):
 
     @property
     def workdir(self) -> pathlib.Path:
-        workdir = self._workdir
-        make_dirs(workdir)
-        return pathlib.Path(workdir)
+        return self.layout.workdir
 
     @property
-    def tasks_dir(self):
-        tasks_dir = self.workdir / self._tasks_dir
-        make_dirs(tasks_dir)
-        return pathlib.Path(tasks_dir)
+    def tasks_dir(self) -> pathlib.Path:
+        return self.layout.tasks_dir
 
     @property
-    def task_dir(self):
-        task_dir = self.tasks_dir / self.task_name
-        make_dirs(task_dir)
-        return task_dir
+    def task_dir(self) -> pathlib.Path:
+        return self.layout.task_dir(self.task_name)
 
     def get_user_dir(self, user: User):
-        user_dir = self.workdir / "users" / str(user.id)
-        make_dirs(user_dir)
-        return user_dir
+        return self.layout.user_dir(user.id)
+
+    @property
+    def account_index_file(self):
+        """账号名 -> user id 的索引文件，用于在未登录时定位快照"""
+        return self.workdir / "users" / "accounts" / f"{self._account}.json"
+
+    @property
+    def configs(self) -> TaskConfigRepository[ConfigT]:
+        return TaskConfigRepository(self.tasks_dir, self.cfg_cls)
 
     @property
     def config_file(self):
-        return self.task_dir.joinpath("config.json")
+        return self.task_dir.joinpath(CONFIG_FILE_NAME)
+
+    @property
+    def command_queue(self) -> CommandQueue:
+        queue = _COMMAND_QUEUES.get(self.app.key)
+        if queue is None:
+            queue = _COMMAND_QUEUES[self.app.key] = CommandQueue()
+        return queue
+
+    @property
+    def delete_scheduler(self) -> DeleteScheduler:
+        state_file = self.workdir / "pending_deletes" / f"{self._account}.json"
+        key = str(state_file.resolve())
+        scheduler = _DELETE_SCHEDULERS.get(key)
+        if scheduler is None or scheduler.client is not self.app:
+            scheduler = _DELETE_SCHEDULERS[key] = DeleteScheduler(self.app, state_file)
+        return scheduler
 
     @property
     def config(self) -> ConfigT:
@@ -349,25 +453,32 @@ class BaseUserWorker(Generic[ConfigT]):
     def config(self, value):
         self._config = value
 
-    def log(self, msg, level: str = "INFO", **kwargs):
-        msg = f"账户「{self._account}」- 任务「{self.task_name}」: {msg}"
-        if level.upper() == "INFO":
-            logger.info(msg, **kwargs)
-        elif level.upper() == "WARNING":
-            logger.warning(msg, **kwargs)
-        elif level.upper() == "ERROR":
-            logger.error(msg, **kwargs)
-        elif level.upper() == "CRITICAL":
-            logger.critical(msg, **kwargs)
-        else:
-            logger.debug(msg, **kwargs)
+    def log(self, msg, *args, level: str = "INFO", **kwargs):
+        """
+        `msg`支持%格式化参数，格式化延迟到日志真正输出时（异步日志模式下在后台线程）进行。
+        账号和任务名通过`extra`传递，供按账号拆分日志文件使用。
+        """
+        levelno = _LOG_LEVELS.get(level.upper(), logging.DEBUG)
+        if not logger.isEnabledFor(levelno):
+            return
+        extra = {"account": self._account, "task": self.task_name}
+        extra.update(kwargs.pop("extra", None) or {})
+        kwargs.setdefault("stacklevel", 2)
+        logger.log(
+            levelno,
+            "账户「%s」- 任务「%s」: " + (msg if args else "%s"),
+            self._account,
+            self.task_name,
+            *(args or (msg,)),
+            extra=extra,
+            **kwargs,
+        )
 
     def ask_for_config(self):
         raise NotImplementedError
 
     def write_config(self, config: BaseJSONConfig):
-        with open(self.config_file, "w", encoding="utf-8") as fp:
-            json.dump(config.to_jsonable(), fp, ensure_ascii=False)
+        self.configs.write(self.task_name, config)
 
     def reconfig(self):
         config = self.ask_for_config()
@@ -379,19 +490,41 @@ class BaseUserWorker(Generic[ConfigT]):
         if not self.config_file.exists():
             config = self.reconfig()
         else:
-            with open(self.config_file, "r", encoding="utf-8") as fp:
-                config, from_old = cfg_cls.load(json.load(fp))
-                if from_old:
-                    self.write_config(config)
+            config, from_old, _ = get_config_cache().load(self.config_file, cfg_cls)
+            if from_old:
+                self.write_config(config)
+        self._config_stamp = file_stamp(self.config_file)
         self.config = config
         return config
 
+    def reload_config(self) -> Optional[ConfigT]:
+        """
+        配置文件有变化时重新加载并返回新配置，没有变化时返回None。
+        新配置无效时记录警告并继续使用原配置，直到文件再次变化。
+        """
+        stamp = file_stamp(self.config_file)
+        if stamp is None or stamp == self._config_stamp:
+            return None
+        try:
+            config = self.load_config()
+        except (ConfigLoadError, OSError) as e:
+            self._config_stamp = stamp
+            self.log(f"重新加载配置失败，继续使用原配置: {e}", level="WARNING")
+            return None
+        self.log("配置文件已更新，已重新加载")
+        return config
+
+    async def wait_for_config_change(self, timeout: float) -> Optional[ConfigT]:
+        """等待最多`timeout`秒，期间配置文件变化时立即返回新配置，否则返回None"""
+        deadline = time.monotonic() + max(timeout, 0)
+        while (remaining := deadline - time.monotonic()) > 0:
+            await asyncio.sleep(min(remaining, self.config_reload_interval))
+            if (config := self.reload_config()) is not None:
+                return config
+        return None
+
     def get_task_list(self):
-        signs = []
-        for d in os.listdir(self.tasks_dir):
-            if self.tasks_dir.joinpath(d).is_dir():
-                signs.append(d)
-        return signs
+        return self.configs.list_tasks()
 
     def list_(self):
         print_to_user("已配置的任务：")
@@ -405,6 +538,75 @@ class BaseUserWorker(Generic[ConfigT]):
         ) as fp:
             fp.write(str(user))
 
+    def save_dialog_snapshot(self, me: User, latest_chats: list, num_of_dialogs: int):
+        snapshot = {
+            "account": self._account,
+            "fetched_at": time.time(),
+            "num_of_dialogs": num_of_dialogs,
+            "me": {
+                "id": me.id,
+                "is_self": True,
+                "is_bot": me.is_bot,
+                "first_name": me.first_name,
+                "last_name": me.last_name,
+                "username": me.username,
+                "phone_number": me.phone_number,
+            },
+            "chats": latest_chats,
+        }
+        snapshot_file = self.get_user_dir(me).joinpath("snapshot.json")
+        tmp_file = snapshot_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as fp:
+            json.dump(snapshot, fp, default=Object.default, ensure_ascii=False)
+        os.replace(tmp_file, snapshot_file)
+
+        index_file = self.account_index_file
+        self.layout.dir("users", "accounts")
+        tmp_file = index_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as fp:
+            json.dump({"user_id": me.id}, fp)
+        os.replace(tmp_file, index_file)
+
+    def load_dialog_snapshot(self, num_of_dialogs: int = 20) -> Optional[dict]:
+        """读取未过期且覆盖所需对话数量的快照，不可用时返回None"""
+        try:
+            with open(self.account_index_file, "r", encoding="utf-8") as fp:
+                user_id = json.load(fp)["user_id"]
+            snapshot_file = self.workdir / "users" / str(user_id) / "snapshot.json"
+            with open(snapshot_file, "r", encoding="utf-8") as fp:
+                snapshot = json.load(fp)
+        except (OSError, ValueError, KeyError):
+            return None
+        if snapshot.get("account") != self._account:
+            return None
+        if time.time() - snapshot.get("fetched_at", 0) > self.dialog_snapshot_ttl:
+            return None
+        if snapshot.get("num_of_dialogs", 0) < num_of_dialogs:
+            return None
+        return snapshot
+
+    async def ensure_login(self, num_of_dialogs=20, print_chat=True):
+        """
+        确保已获取当前用户信息。
+        优先使用缓存的快照，快照缺失、过期或指定了`refresh_dialogs`时才完整登录。
+        in_memory模式下peer缓存不会持久化，因此总是完整登录。
+        """
+        if self.user is not None:
+            return
+        if not self.refresh_dialogs and not self.app.in_memory:
+            snapshot = self.load_dialog_snapshot(num_of_dialogs)
+            if snapshot is not None:
+                self.user = User(**snapshot["me"])
+                self.log(
+                    f"使用缓存的对话列表快照(共{len(snapshot['chats'])}个), "
+                    f"如需刷新请使用 --refresh-dialogs"
+                )
+                if print_chat:
+                    for chat in snapshot["chats"]:
+                        print_to_user(readable_chat(_chat_from_snapshot(chat)))
+                return
+        await self.login(num_of_dialogs, print_chat=print_chat)
+
     async def login(self, num_of_dialogs=20, print_chat=True):
         app = self.app
         async with app:
@@ -438,6 +640,7 @@ class BaseUserWorker(Generic[ConfigT]):
                     default=Object.default,
                     ensure_ascii=False,
                 )
+            self.save_dialog_snapshot(me, latest_chats, num_of_dialogs)
             await self.app.save_session_string()
 
     async def logout(self):
@@ -448,27 +651,56 @@ class BaseUserWorker(Generic[ConfigT]):
         return await self.app.log_out()
 
     async def send_message(
-        self, chat_id: Union[int, str], text: str, delete_after: int = None, **kwargs
+        self,
+        chat_id: Union[int, str],
+        text: str,
+        delete_after: int = None,
+        priority: int = PRIORITY_NORMAL,
+        **kwargs,
     ):
         """
         发送文本消息
         :param chat_id:
         :param text:
         :param delete_after: 秒, 发送消息后进行删除，``None`` 表示不删除, ``0`` 表示立即删除.
+            删除由`delete_scheduler`在后台完成，本方法发送后立即返回.
+        :param priority: 在发送队列中的优先级, 越小越优先.
         :param kwargs:
         :return:
         """
-        message = await self.app.send_message(chat_id, text, **kwargs)
-        if delete_after is not None:
+        with self.events.timed("send_command", chat=chat_id, command=text) as ev:
+            message = await self.command_queue.run(
+                functools.partial(self.app.send_message, chat_id, text, **kwargs),
+                chat_id=chat_id,
+                priority=priority,
+            )
+            self._mark_sent(message, ev)
+        if message and delete_after is not None:
             self.log(
                 f"Message「{text}」 to {chat_id} will be deleted after {delete_after} seconds."
             )
-            self.log("Waiting...")
-            await asyncio.sleep(delete_after)
-            await message.delete()
-            self.log(f"Message「{text}」 to {chat_id} deleted!")
+            self.delete_scheduler.schedule(message.chat.id, message.id, delete_after)
         return message
 
+    def _mark_sent(self, message: Optional[Message], ev: dict):
+        if message:
+            self._last_sent_at[message.chat.id] = time.perf_counter()
+            ev["chat"] = message.chat.id
+            ev["message_id"] = message.id
+
+    def _emit_recv_event(self, message: Message):
+        sent_at = self._last_sent_at.get(message.chat.id)
+        self.events.emit(
+            "recv_message",
+            chat=message.chat.id,
+            message_id=message.id,
+            latency_ms=(
+                round((time.perf_counter() - sent_at) * 1000, 1)
+                if sent_at is not None
+                else None
+            ),
+        )
+
     async def send_dice(
         self,
         chat_id: Union[int, str],
@@ -490,15 +722,18 @@ class BaseUserWorker(Generic[ConfigT]):
                 f"Warning, emoji should be one of {', '.join(DICE_EMOJIS)}",
                 level="WARNING",
             )
-        message = await self.app.send_dice(chat_id, emoji, **kwargs)
+        with self.events.timed("send_command", chat=chat_id, command=emoji) as ev:
+            message = await self.command_queue.run(
+                functools.partial(self.app.send_dice, chat_id, emoji, **kwargs),
+                chat_id=chat_id,
+                priority=PRIORITY_HIGH,
+            )
+            self._mark_sent(message, ev)
         if message and delete_after is not None:
             self.log(
                 f"Dice「{emoji}」 to {chat_id} will be deleted after {delete_after} seconds."
             )
-            self.log("Waiting...")
-            await asyncio.sleep(delete_after)
-            await message.delete()
-            self.log(f"Dice「{emoji}」 to {chat_id} deleted!")
+            self.delete_scheduler.schedule(message.chat.id, message.id, delete_after)
         return message
 
     async def search_members(
@@ -529,13 +764,11 @@ class BaseUserWorker(Generic[ConfigT]):
                 )
 
     def export(self):
-        with open(self.config_file, "r", encoding="utf-8") as fp:
-            data = fp.read()
-        return data
+        return self.configs.export(self.task_name)
 
     def import_(self, config_str: str):
-        with open(self.config_file, "w", encoding="utf-8") as fp:
-            fp.write(config_str)
+        """校验并导入配置，旧版本配置升级后带版本号写入"""
+        self.configs.import_(self.task_name, config_str)
 
     def ask_one(self):
         raise NotImplementedError
@@ -576,6 +809,15 @@ class UserSignerWorkerContext(BaseModel):
     waiter: Waiter
     sign_chats: defaultdict[int, List[SignChatV3]]
     chat_messages: defaultdict[int, List[Message]]
+    # 每个chat一个Condition，收到新消息时唤醒正在等待该chat的动作
+    chat_conditions: Dict[int, asyncio.Condition]
+
+    def get_condition(self, chat_id: int) -> asyncio.Condition:
+        # 延迟创建，确保Condition在运行中的事件循环内初始化
+        cond = self.chat_conditions.get(chat_id)
+        if cond is None:
+            cond = self.chat_conditions[chat_id] = asyncio.Condition()
+        return cond
 
 
 OPENAI_USE_PROMPT = '在运行前请通过环境变量正确设置`OPENAI_API_KEY`, `OPENAI_BASE_URL`。默认模型为"gpt-4o", 可通过环境变量`OPENAI_MODEL`更改。'
@@ -583,22 +825,28 @@ OPENAI_USE_PROMPT = '在运行前请通过环境变量正确设置`OPENAI_API_KE
 
 class UserSigner(BaseUserWorker[SignConfigV3]):
     _workdir = ".signer"
-    _tasks_dir = "signs"
+    _tasks_dir = SIGN_TASKS_DIR
     cfg_cls = SignConfigV3
     context: UserSignerWorkerContext
+    # 执行记录保留天数，更早的记录会被清理
+    sign_record_retention_days = 90
 
     def ensure_ctx(self) -> UserSignerWorkerContext:
         return UserSignerWorkerContext(
             waiter=Waiter(),
             sign_chats=defaultdict(list),
             chat_messages=defaultdict(list),
+            chat_conditions={},
         )
 
     @property
     def sign_record_file(self):
-        sign_record_dir = self.task_dir / str(self.user.id)
-        make_dirs(sign_record_dir)
-        return sign_record_dir / "sign_record.json"
+        """旧版签到记录文件，仅用于迁移到`state_store`"""
+        return self.task_dir / str(self.user.id) / "sign_record.json"
+
+    @property
+    def state_store(self) -> StateStore:
+        return get_state_store(self.workdir)
 
     def _ask_actions(
         self, input_: UserInput, available_actions: List[SupportAction] = None
@@ -721,6 +969,8 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
             sign_at = dt_time.fromisoformat(sign_at_str)
             crontab_expr = cls._time_to_crontab(sign_at)
         except ValueError:
+            from croniter import CroniterBadCronError, croniter
+
             try:
                 croniter(sign_at_str)
                 crontab_expr = sign_at_str
@@ -732,15 +982,10 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
     def _time_to_crontab(sign_at: time) -> str:
         return f"{sign_at.minute} {sign_at.hour} * * *"
 
-    def load_sign_record(self):
-        sign_record = {}
-        if not self.sign_record_file.is_file():
-            with open(self.sign_record_file, "w", encoding="utf-8") as fp:
-                json.dump(sign_record, fp)
-        else:
-            with open(self.sign_record_file, "r", encoding="utf-8") as fp:
-                sign_record = json.load(fp)
-        return sign_record
+    def load_sign_record(self) -> Dict[str, str]:
+        account = str(self.user.id)
+        self.state_store.migrate_json(account, self.task_name, self.sign_record_file)
+        return self.state_store.records(account, self.task_name)
 
     async def sign(
         self,
@@ -751,38 +996,87 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
             await self.wait_for(chat, action)
             await asyncio.sleep(chat.action_interval)
 
+    async def sign_chat(self, chat: SignChatV3) -> bool:
+        self.context.sign_chats[chat.chat_id].append(chat)
+        try:
+            await self.sign(chat)
+        except errors.RPCError as _e:
+            self.log(f"签到失败: {_e} \nchat: \n{chat}")
+            self.events.emit(
+                "action_result", chat=chat.chat_id, outcome="error", error=repr(_e)
+            )
+            logger.warning(_e, exc_info=True)
+            return False
+        self.context.chat_messages[chat.chat_id].clear()
+        return True
+
+    async def sign_chats_concurrently(self, config: SignConfigV3):
+        """
+        同时签到多个chat，最多`config.concurrency`个。
+        同一个chat_id的多个配置按顺序依次执行，发送速率由`command_queue`统一限制。
+        """
+        lanes: dict[int, List[SignChatV3]] = defaultdict(list)
+        for chat in config.chats:
+            lanes[chat.chat_id].append(chat)
+        semaphore = asyncio.Semaphore(config.concurrency)
+
+        async def sign_lane(chats: List[SignChatV3]):
+            async with semaphore:
+                for i, chat in enumerate(chats):
+                    if i:
+                        await asyncio.sleep(config.sign_interval)
+                    await self.sign_chat(chat)
+
+        self.log(f"并发签到{len(lanes)}个chat, 并发数: {config.concurrency}")
+        results = await asyncio.gather(
+            *(sign_lane(chats) for chats in lanes.values()), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
     async def run(
         self, num_of_dialogs=20, only_once: bool = False, force_rerun: bool = False
     ):
-        if self.user is None:
-            await self.login(num_of_dialogs, print_chat=True)
+        from croniter import croniter
+
+        await self.ensure_login(num_of_dialogs, print_chat=True)
 
         config = self.load_config(self.cfg_cls)
-        sign_record = self.load_sign_record()
-        chat_ids = [c.chat_id for c in config.chats]
+        store = self.state_store
+        account = str(self.user.id)
+        store.migrate_json(account, self.task_name, self.sign_record_file)
+        # 只注册一次处理函数，配置变化时原地更新过滤的chat
+        chat_filter = filters.chat([c.chat_id for c in config.chats])
+        self.log(f"为以下Chat添加消息回调处理函数：{list(chat_filter)}")
+        self.app.add_handler(MessageHandler(self.on_message, chat_filter))
+
+        def apply_config(new_config: SignConfigV3):
+            nonlocal config
+            config = new_config
+            new_filter = filters.chat([c.chat_id for c in config.chats])
+            chat_filter.clear()
+            chat_filter.update(new_filter)
+            self.log(f"消息回调处理的Chat更新为：{list(chat_filter)}")
 
         async def sign_once():
-            for chat in config.chats:
-                self.context.sign_chats[chat.chat_id].append(chat)
-                try:
-                    await self.sign(chat)
-                except errors.RPCError as _e:
-                    self.log(f"签到失败: {_e} \nchat: \n{chat}")
-                    logger.warning(_e, exc_info=True)
-                    continue
-
-                self.context.chat_messages[chat.chat_id].clear()
-                await asyncio.sleep(config.sign_interval)
-            sign_record[str(now.date())] = now.isoformat()
-            with open(self.sign_record_file, "w", encoding="utf-8") as fp:
-                json.dump(sign_record, fp)
+            if config.concurrency > 1:
+                await self.sign_chats_concurrently(config)
+            else:
+                for chat in config.chats:
+                    if await self.sign_chat(chat):
+                        await asyncio.sleep(config.sign_interval)
+            store.upsert(account, self.task_name, str(now.date()), now.isoformat())
+            expire_before = now - timedelta(days=self.sign_record_retention_days)
+            store.prune(str(expire_before.date()), account=account, task=self.task_name)
 
         def need_sign(last_date_str):
             if force_rerun:
                 return True
-            if last_date_str not in sign_record:
+            last_sign_at = store.get(account, self.task_name, last_date_str)
+            if last_sign_at is None:
                 return True
-            _last_sign_at = datetime.fromisoformat(sign_record[last_date_str])
+            _last_sign_at = datetime.fromisoformat(last_sign_at)
             self.log(f"上次执行时间: {_last_sign_at}")
             _cron_it = croniter(self._validate_sign_at(config.sign_at), _last_sign_at)
             _next_run: datetime = _cron_it.next(datetime)
@@ -792,18 +1086,16 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
             return True
 
         while True:
-            self.log(f"为以下Chat添加消息回调处理函数：{chat_ids}")
-            self.app.add_handler(
-                MessageHandler(self.on_message, filters.chat(chat_ids))
-            )
             try:
                 async with self.app:
                     now = get_now()
                     self.log(f"当前时间: {now}")
                     now_date_str = str(now.date())
                     self.context = self.ensure_ctx()
+                    self.delete_scheduler.start()
                     if need_sign(now_date_str):
                         await sign_once()
+                    await self.delete_scheduler.drain()
 
             except (OSError, errors.Unauthorized) as e:
                 logger.exception(e)
@@ -812,12 +1104,19 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
 
             if only_once:
                 break
-            cron_it = croniter(self._validate_sign_at(config.sign_at), now)
-            next_run: datetime = cron_it.next(datetime) + timedelta(
-                seconds=random.randint(0, int(config.random_seconds))
-            )
-            self.log(f"下次运行时间: {next_run}")
-            await asyncio.sleep((next_run - now).total_seconds())
+            while True:
+                cron_it = croniter(self._validate_sign_at(config.sign_at), now)
+                next_run: datetime = cron_it.next(datetime) + timedelta(
+                    seconds=random.randint(0, int(config.random_seconds))
+                )
+                self.log(f"下次运行时间: {next_run}")
+                # 等待期间配置文件变化时，按新配置重新计算下次运行时间，无需重新连接
+                new_config = await self.wait_for_config_change(
+                    (next_run - get_now()).total_seconds()
+                )
+                if new_config is None:
+                    break
+                apply_config(new_config)
 
     async def run_once(self, num_of_dialogs):
         return await self.run(num_of_dialogs, only_once=True, force_rerun=True)
@@ -825,10 +1124,10 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
     async def send_text(
         self, chat_id: int, text: str, delete_after: int = None, **kwargs
     ):
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(print_chat=False)
         async with self.app:
             await self.send_message(chat_id, text, delete_after, **kwargs)
+            await self.delete_scheduler.drain()
 
     async def send_dice_cli(
         self,
@@ -837,10 +1136,10 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
         delete_after: int = None,
         **kwargs,
     ):
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(print_chat=False)
         async with self.app:
             await self.send_dice(chat_id, emoji, delete_after, **kwargs)
+            await self.delete_scheduler.drain()
 
     async def on_message(self, client, message: Message):
         try:
@@ -850,13 +1149,19 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
 
     async def _on_message(self, client: Client, message: Message):
         self.log(
-            f"收到来自「{message.from_user.username or message.from_user.id}」的消息: {readable_message(message)}"
+            "收到来自「%s」的消息: %s",
+            message.from_user.username or message.from_user.id,
+            LazyStr(readable_message, message),
         )
+        self._emit_recv_event(message)
         chats = self.context.sign_chats.get(message.chat.id)
         if not chats:
             self.log("忽略意料之外的聊天", level="WARNING")
             return
         self.context.chat_messages[message.chat.id].append(message)
+        cond = self.context.get_condition(message.chat.id)
+        async with cond:
+            cond.notify_all()
 
     async def _click_keyboard_by_text(
         self, action: ClickKeyboardByTextAction, message: Message
@@ -882,94 +1187,201 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
         self, action: ReplyByCalculationProblemAction, message
     ):
         if message.text:
-            self.log("检测到文本回复，尝试调用大模型进行计算题回答")
-            ai_client = get_openai_client()
+            self.log(f"问题: \n{message.text}")
+            started_at = time.perf_counter()
+            answer = solve_calculation(message.text)
+            if answer is not None:
+                self.log(f"本地计算结果为: {answer}")
+                self.events.emit(
+                    "ai_call",
+                    chat=message.chat.id,
+                    message_id=message.id,
+                    kind="calculate",
+                    latency_ms=round((time.perf_counter() - started_at) * 1000, 3),
+                    outcome="local",
+                )
+                await self.send_message(message.chat.id, answer, priority=PRIORITY_HIGH)
+                return True
+            self.log("本地无法求解，尝试调用大模型进行计算题回答")
+            ai_client = get_ai_client()
             if not ai_client:
                 self.log("未配置OpenAI API Key，无法使用AI服务", level="WARNING")
                 return False
-            self.log(f"问题: \n{message.text}")
-            answer = await calculate_problem(message.text, client=ai_client)
+            with self.events.timed(
+                "ai_call", chat=message.chat.id, message_id=message.id, kind="calculate"
+            ):
+                answer = await calculate_problem(message.text, client=ai_client)
             self.log(f"回答为: {answer}")
-            await self.send_message(message.chat.id, answer)
+            await self.send_message(message.chat.id, answer, priority=PRIORITY_HIGH)
             return True
         return False
 
+    @property
+    def image_choice_cache(self) -> Optional[ImageChoiceCache]:
+        return get_image_choice_cache(self.workdir)
+
+    async def _answer_image_choice(
+        self, message: Message, options: List[str]
+    ) -> Tuple[Optional[str], Optional[bytes], bool]:
+        """
+        优先从缓存中获取图片选择题的答案，未命中再调用大模型。
+        返回 (答案, 图片内容, 是否来自缓存)，按file_id命中时不下载图片，图片内容为None。
+        大模型的答案不在这里写入缓存，由调用方在点击成功后写入。
+        """
+        cache = self.image_choice_cache
+        photo = message.photo
+        ev = {
+            "chat": message.chat.id,
+            "message_id": message.id,
+            "kind": "choose_option_by_image",
+        }
+        if cache is not None:
+            started_at = time.perf_counter()
+            answer = cache.get_by_file_id(photo.file_unique_id, options)
+            if answer is not None:
+                self.log(f"命中图片选择缓存(file_id): {answer}")
+                self.events.emit(
+                    "ai_call",
+                    latency_ms=round((time.perf_counter() - started_at) * 1000, 1),
+                    outcome="cache_hit",
+                    **ev,
+                )
+                return answer, None, True
+        image_buffer: BinaryIO = await self.app.download_media(
+            photo.file_id, in_memory=True
+        )
+        image_buffer.seek(0)
+        image_bytes = image_buffer.read()
+        if cache is not None:
+            started_at = time.perf_counter()
+            answer = cache.get(image_bytes, options)
+            if answer is not None:
+                self.log(f"命中图片选择缓存: {answer}")
+                self.events.emit(
+                    "ai_call",
+                    latency_ms=round((time.perf_counter() - started_at) * 1000, 1),
+                    outcome="cache_hit",
+                    **ev,
+                )
+                return answer, image_bytes, True
+        ai_client = get_ai_client()
+        if not ai_client:
+            self.log("未配置OpenAI API Key，无法使用AI服务", level="WARNING")
+            return None, image_bytes, False
+        with self.events.timed("ai_call", **ev):
+            result_index = await choose_option_by_image(
+                image_bytes,
+                "选择正确的选项",
+                list(enumerate(options)),
+                client=ai_client,
+            )
+        return options[result_index], image_bytes, False
+
     async def _choose_option_by_image(self, action: ChooseOptionByImageAction, message):
         if reply_markup := message.reply_markup:
             if isinstance(reply_markup, InlineKeyboardMarkup) and message.photo:
                 flat_buttons = (b for row in reply_markup.inline_keyboard for b in row)
                 option_to_btn = {btn.text: btn for btn in flat_buttons if btn.text}
                 self.log("检测到图片，尝试调用大模型进行图片识别并选择选项")
-                ai_client = get_openai_client()
-                if not ai_client:
-                    self.log(
-                        "未配置OpenAI API Key，无法使用AI服务",
-                        level="WARNING",
-                    )
-                    return False
-                image_buffer: BinaryIO = await self.app.download_media(
-                    message.photo.file_id, in_memory=True
-                )
-                image_buffer.seek(0)
-                image_bytes = image_buffer.read()
                 options = list(option_to_btn)
-                result_index = await choose_option_by_image(
-                    image_bytes,
-                    "选择正确的选项",
-                    list(enumerate(options)),
-                    client=ai_client,
+                result, image_bytes, cached = await self._answer_image_choice(
+                    message, options
                 )
-                result = options[result_index]
+                if result is None:
+                    return False
                 self.log(f"选择结果为: {result}")
+                cache = self.image_choice_cache
+                file_id = message.photo.file_unique_id
                 target_btn = option_to_btn.get(result.strip())
                 if not target_btn:
                     self.log("未找到匹配的按钮", level="WARNING")
+                    if cache is not None:
+                        cache.invalidate(image_bytes, options, file_id=file_id)
                     return False
-                await self.request_callback_answer(
+                answer = await self.request_callback_answer(
                     self.app,
                     message.chat.id,
                     message.id,
                     target_btn.callback_data,
                 )
+                if cache is not None:
+                    if is_challenge_failed(answer):
+                        self.log("选择结果未通过验证，删除缓存的答案", level="WARNING")
+                        cache.invalidate(image_bytes, options, file_id=file_id)
+                    elif not cached:
+                        cache.put(image_bytes, options, result, file_id=file_id)
                 return True
         return False
 
     async def wait_for(self, chat: SignChatV3, action: ActionT, timeout=10):
         self.log(f"处理动作: {action}")
         if isinstance(action, SendTextAction):
-            return await self.send_message(chat.chat_id, action.text, chat.delete_after)
+            return await self.send_message(
+                chat.chat_id, action.text, chat.delete_after, priority=PRIORITY_HIGH
+            )
         elif isinstance(action, SendDiceAction):
             return await self.send_dice(chat.chat_id, action.dice, chat.delete_after)
         self.context.waiter.add(chat.chat_id)
-        start = time.perf_counter()
+        started_at = time.perf_counter()
+        deadline = started_at + timeout
         self.log(f"等待处理动作: {action}")
-        last_message = None
-        while time.perf_counter() - start < timeout:
-            await asyncio.sleep(0.3)
-            messages = self.context.chat_messages.get(chat.chat_id)
-            if not messages:
-                continue
-            # 暂无新消息
-            if messages[-1] == last_message:
-                continue
-            last_message = messages[-1]
-            for message in messages:
-                ok = False
-                if isinstance(action, ClickKeyboardByTextAction):
-                    ok = await self._click_keyboard_by_text(action, message)
-                elif isinstance(action, ReplyByCalculationProblemAction):
-                    ok = await self._reply_by_calculation_problem(action, message)
-                elif isinstance(action, ChooseOptionByImageAction):
-                    ok = await self._choose_option_by_image(action, message)
+        messages = self.context.chat_messages[chat.chat_id]
+        cond = self.context.get_condition(chat.chat_id)
+        # 每条消息只交给当前动作处理一次：先处理已缓存的消息，之后由`_on_message`唤醒
+        cursor = 0
+        while True:
+            while cursor < len(messages):
+                message = messages[cursor]
+                cursor += 1
+                ok = await self._handle_action_message(action, message)
                 if ok:
                     self.context.waiter.sub(message.chat.id)
-                    # 这里移除了该消息，消息列表不可再迭代
-                    self.context.chat_messages[chat.chat_id].remove(message)
+                    messages.remove(message)
+                    elapsed = time.perf_counter() - started_at
+                    WAIT_FOR_SECONDS.observe(
+                        elapsed, action=action.action.name, outcome="ok"
+                    )
+                    self.events.emit(
+                        "action_result",
+                        chat=chat.chat_id,
+                        message_id=message.id,
+                        action=action.action.name,
+                        latency_ms=round(elapsed * 1000, 1),
+                        outcome="ok",
+                    )
                     return None
-                self.log(f"忽略消息: {readable_message(message)}")
+                self.log("忽略消息: %s", LazyStr(readable_message, message))
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            async with cond:
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda n=cursor: len(messages) > n), remaining
+                    )
+                except asyncio.TimeoutError:
+                    break
         self.log(f"等待超时: \nchat: \n{chat} \naction: {action}", level="WARNING")
+        elapsed = time.perf_counter() - started_at
+        WAIT_FOR_SECONDS.observe(elapsed, action=action.action.name, outcome="timeout")
+        self.events.emit(
+            "action_result",
+            chat=chat.chat_id,
+            action=action.action.name,
+            latency_ms=round(elapsed * 1000, 1),
+            outcome="timeout",
+        )
         return None
 
+    async def _handle_action_message(self, action: ActionT, message: Message) -> bool:
+        if isinstance(action, ClickKeyboardByTextAction):
+            return await self._click_keyboard_by_text(action, message)
+        elif isinstance(action, ReplyByCalculationProblemAction):
+            return await self._reply_by_calculation_problem(action, message)
+        elif isinstance(action, ChooseOptionByImageAction):
+            return await self._choose_option_by_image(action, message)
+        return False
+
     async def request_callback_answer(
         self,
         client: Client,
@@ -978,13 +1390,32 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
         callback_data: Union[str, bytes],
         **kwargs,
     ):
+        """返回机器人的回调应答，请求失败时返回None"""
         try:
-            await client.request_callback_answer(
-                chat_id, message_id, callback_data=callback_data, **kwargs
-            )
+            with self.events.timed(
+                "send_command",
+                chat=chat_id,
+                message_id=message_id,
+                command=callback_data,
+            ):
+                answer = await self.command_queue.run(
+                    functools.partial(
+                        client.request_callback_answer,
+                        chat_id,
+                        message_id,
+                        callback_data=callback_data,
+                        **kwargs,
+                    ),
+                    chat_id=chat_id,
+                    priority=PRIORITY_HIGH,
+                    dedupe_key=("callback", chat_id, message_id, callback_data),
+                )
+            self._last_sent_at[chat_id] = time.perf_counter()
             self.log("点击完成")
+            return answer
         except (errors.BadRequest, TimeoutError) as e:
             self.log(e, level="ERROR")
+            return None
 
     async def schedule_messages(
         self,
@@ -994,10 +1425,11 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
         next_times: int = 1,
         random_seconds: int = 0,
     ):
+        from croniter import croniter
+
         now = get_now()
         it = croniter(crontab, start_time=now)
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(print_chat=False)
         results = []
         async with self.app:
             for n in range(next_times):
@@ -1005,19 +1437,19 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
                     seconds=random.randint(0, random_seconds)
                 )
                 results.append({"at": next_dt.isoformat(), "text": text})
-                await self.app.send_message(
-                    chat_id,
-                    text,
-                    schedule_date=next_dt,
+                await self.command_queue.run(
+                    functools.partial(
+                        self.app.send_message, chat_id, text, schedule_date=next_dt
+                    ),
+                    chat_id=chat_id,
+                    bucket=self.command_queue.schedule_bucket,
                 )
-                await asyncio.sleep(0.1)
                 print_to_user(f"已配置次数：{n + 1}")
         self.log(f"已配置定时发送消息，次数{next_times}")
         return results
 
     async def get_schedule_messages(self, chat_id):
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(print_chat=False)
         async with self.app:
             messages = await self.app.get_scheduled_messages(chat_id)
             for message in messages:
@@ -1026,9 +1458,38 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
 
 class UserMonitor(BaseUserWorker[MonitorConfig]):
     _workdir = ".monitor"
-    _tasks_dir = "monitors"
+    _tasks_dir = MONITOR_TASKS_DIR
     cfg_cls = MonitorConfig
     config: MonitorConfig
+    # 各处理阶段的并发数：回复（含AI生成）、Server酱推送、外部转发
+    pipeline_concurrency = {"reply": 4, "push": 2, "forward": 8}
+    pipeline_queue_size = 1000
+    # 流式AI回复两次编辑消息之间的最小间隔（秒）
+    stream_edit_interval = 1.5
+    # 相同提示词和消息的AI回复缓存
+    reply_cache_size = 1024
+    reply_cache_ttl = 300
+    _reply_cache: Optional[ReplyCache] = None
+    _match_index: Optional[MatchIndex] = None
+    _pipeline: Optional[DispatchPipeline] = None
+
+    @property
+    def pipeline(self) -> DispatchPipeline:
+        if self._pipeline is None:
+            self._pipeline = DispatchPipeline(
+                self.pipeline_concurrency, maxsize=self.pipeline_queue_size
+            )
+            for stage in self.pipeline_concurrency:
+                PIPELINE_DEPTH.labels(account=self._account, stage=stage).set_function(
+                    functools.partial(self._pipeline.depth, stage)
+                )
+        return self._pipeline
+
+    @property
+    def match_index(self) -> MatchIndex:
+        if self._match_index is None:
+            self._match_index = MatchIndex(self.config.match_cfgs)
+        return self._match_index
 
     def ask_one(self):
         input_ = UserInput()
@@ -1059,12 +1520,17 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
         default_send_text = input_("默认发送文本（不需要则回车）: ") or None
         ai_reply = False
         ai_prompt = None
+        ai_stream = False
         use_ai_reply = input_("是否使用AI进行回复(y/N): ") or "n"
         if use_ai_reply.lower() == "y":
             ai_reply = True
             while not (ai_prompt := input_("输入你的提示词（作为`system prompt`）: ")):
                 print_to_user("不可为空！")
                 continue
+            ai_stream = (
+                input_("是否流式发送AI回复（先发送首段再逐步编辑消息）(y/N): ").lower()
+                == "y"
+            )
             print_to_user(OPENAI_USE_PROMPT)
 
         send_text_search_regex = None
@@ -1137,6 +1603,7 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
                 "default_send_text": default_send_text,
                 "ai_reply": ai_reply,
                 "ai_prompt": ai_prompt,
+                "ai_stream": ai_stream,
                 "send_text_search_regex": send_text_search_regex,
                 "delete_after": delete_after,
                 "forward_to_chat_id": forward_to_chat_id,
@@ -1169,23 +1636,23 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
 
     @classmethod
     async def udp_forward(cls, f: UDPForward, message: Message):
-        data = str(message).encode("utf-8")
-        loop = asyncio.get_running_loop()
-        transport, protocol = await loop.create_datagram_endpoint(
-            lambda: _UDPProtocol(), remote_addr=(f.host, f.port)
-        )
-        try:
-            transport.sendto(data)
-        finally:
-            transport.close()
+        with track(FORWARDS, FORWARD_SECONDS, target="udp"):
+            data = serialize_message(message, f.format)
+            sender = await get_udp_pool().get_sender(f.host, f.port)
+            sender.send(
+                data,
+                batch=f.batch,
+                max_datagram_size=f.max_datagram_size,
+                batch_interval=f.batch_interval,
+            )
 
     @classmethod
     async def http_api_callback(cls, f: HttpCallback, message: Message):
         headers = f.headers or {}
         headers.update({"Content-Type": "application/json"})
         content = str(message).encode("utf-8")
-        async with httpx.AsyncClient() as client:
-            await client.post(
+        with track(FORWARDS, FORWARD_SECONDS, target="http"):
+            await get_http_pool().post(
                 str(f.url),
                 content=content,
                 headers=headers,
@@ -1198,91 +1665,218 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
         for forward in match_cfg.external_forwards:
             self.log(f"转发消息至{forward}")
             if isinstance(forward, UDPForward):
-                asyncio.create_task(
-                    self.udp_forward(
-                        forward,
-                        message,
-                    )
+                await self.pipeline.submit(
+                    "forward", functools.partial(self.udp_forward, forward, message)
                 )
             elif isinstance(forward, HttpCallback):
-                asyncio.create_task(
-                    self.http_api_callback(
-                        forward,
-                        message,
-                    )
+                await self.pipeline.submit(
+                    "forward",
+                    functools.partial(self.http_api_callback, forward, message),
                 )
 
     async def on_message(self, client, message: Message):
-        for match_cfg in self.config.match_cfgs:
-            if not match_cfg.match(message):
-                continue
+        self._emit_recv_event(message)
+        MONITOR_MESSAGES.inc(account=self._account)
+        for match_cfg in self.match_index.match(message):
             self.log(f"匹配到监控项：{match_cfg}")
+            MONITOR_MATCHES.inc(account=self._account, rule=match_cfg.rule)
             await self.forward_to_external(match_cfg, message)
+            if (
+                match_cfg.default_send_text
+                or match_cfg.send_text_search_regex
+                or match_cfg.ai_reply
+            ):
+                await self.pipeline.submit(
+                    "reply", functools.partial(self.reply, match_cfg, message)
+                )
+            if match_cfg.push_via_server_chan:
+                await self.pipeline.submit(
+                    "push",
+                    functools.partial(self.push_via_server_chan, match_cfg, message),
+                )
+
+    @property
+    def reply_cache(self) -> ReplyCache:
+        if self._reply_cache is None:
+            self._reply_cache = ReplyCache(self.reply_cache_size, self.reply_cache_ttl)
+        return self._reply_cache
+
+    @staticmethod
+    def reply_cache_key(match_cfg: MatchConfig, message: Message):
+        return match_cfg.ai_prompt, normalize_text(message.text)
+
+    async def reply(self, match_cfg: MatchConfig, message: Message):
+        ai_client = None
+        if match_cfg.ai_reply and match_cfg.ai_prompt and match_cfg.ai_stream:
+            ai_client = get_ai_client()
+        if ai_client:
+            streamed = False
+
+            async def stream():
+                nonlocal streamed
+                streamed = True
+                return await self.reply_streaming(match_cfg, message, ai_client)
+
+            # 流式回复同样经过缓存合并：只有一个调用方流式发送，
+            # 并发到达的相同消息等待其最终文本后直接发送
+            send_text = await self.reply_cache.get_or_call(
+                self.reply_cache_key(match_cfg, message), stream
+            )
+            if streamed:
+                return
+        else:
+            send_text = await self.get_send_text(match_cfg, message)
+        if not send_text:
+            self.log("发送内容为空", level="WARNING")
+            return
+        forward_to_chat_id = match_cfg.forward_to_chat_id or message.chat.id
+        self.log(f"发送文本：{send_text}至{forward_to_chat_id}")
+        await self.send_message(
+            forward_to_chat_id,
+            send_text,
+            delete_after=match_cfg.delete_after,
+            priority=PRIORITY_LOW if match_cfg.ai_reply else PRIORITY_NORMAL,
+        )
+
+    async def edit_message_text(
+        self,
+        message: Message,
+        text: str,
+        priority: int = PRIORITY_LOW,
+    ):
+        """经发送队列编辑消息，与发送消息共用同一聊天的限速"""
+        try:
+            return await self.command_queue.run(
+                functools.partial(
+                    self.app.edit_message_text, message.chat.id, message.id, text
+                ),
+                chat_id=message.chat.id,
+                priority=priority,
+            )
+        except errors.MessageNotModified:
+            return message
+
+    async def reply_streaming(
+        self, match_cfg: MatchConfig, message: Message, ai_client: AIClient
+    ) -> str:
+        """
+        流式AI回复：首段文本到达后立即发送，后续片段合并为限速的消息编辑。
+        返回最终发送的文本，没有发送时返回空字符串。
+        """
+        chat_id = match_cfg.forward_to_chat_id or message.chat.id
+        started_at = time.perf_counter()
+
+        async def send(text: str):
+            ev["first_chunk_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+            return await self.send_message(chat_id, text, priority=PRIORITY_NORMAL)
+
+        progressive = ProgressiveMessage(
+            send, self.edit_message_text, min_interval=self.stream_edit_interval
+        )
+        with self.events.timed(
+            "ai_call", chat=message.chat.id, message_id=message.id, kind="reply_stream"
+        ) as ev:
             try:
-                send_text = await self.get_send_text(match_cfg, message)
-                if not send_text:
-                    self.log("发送内容为空", level="WARNING")
-                else:
-                    forward_to_chat_id = match_cfg.forward_to_chat_id or message.chat.id
-                    self.log(f"发送文本：{send_text}至{forward_to_chat_id}")
-                    await self.send_message(
-                        forward_to_chat_id,
-                        send_text,
-                        delete_after=match_cfg.delete_after,
-                    )
+                async for delta in stream_reply(
+                    match_cfg.ai_prompt, message.text, client=ai_client
+                ):
+                    await progressive.feed(delta)
+            finally:
+                # 中途出错时保留已经收到的内容
+                sent = await progressive.finish()
+            ev["edits"] = progressive.edits
+        if sent is None:
+            self.log("发送内容为空", level="WARNING")
+            return ""
+        self.log(
+            f"流式发送文本：{progressive.text}至{chat_id}，编辑{progressive.edits}次"
+        )
+        if match_cfg.delete_after is not None:
+            self.delete_scheduler.schedule(
+                sent.chat.id, sent.id, match_cfg.delete_after
+            )
+        return progressive.text.strip()
 
-                if match_cfg.push_via_server_chan:
-                    server_chan_send_key = (
-                        match_cfg.server_chan_send_key
-                        or os.environ.get("SERVER_CHAN_SEND_KEY")
-                    )
-                    if not server_chan_send_key:
-                        self.log("未配置Server酱的SendKey", level="WARNING")
-                    else:
-                        await sc_send(
-                            server_chan_send_key,
-                            f"匹配到监控项：{match_cfg.chat_id}",
-                            f"消息内容为:\n\n{message.text}",
-                        )
-            except IndexError as e:
-                logger.exception(e)
+    async def push_via_server_chan(self, match_cfg: MatchConfig, message: Message):
+        server_chan_send_key = match_cfg.server_chan_send_key or os.environ.get(
+            "SERVER_CHAN_SEND_KEY"
+        )
+        if not server_chan_send_key:
+            self.log("未配置Server酱的SendKey", level="WARNING")
+            return
+        await sc_send(
+            server_chan_send_key,
+            f"匹配到监控项：{match_cfg.chat_id}",
+            f"消息内容为:\n\n{message.text}",
+        )
 
     async def get_send_text(self, match_cfg: MatchConfig, message: Message) -> str:
         send_text = match_cfg.get_send_text(message.text)
         if match_cfg.ai_reply and match_cfg.ai_prompt:
-            ai_client = get_openai_client()
+            ai_client = get_ai_client()
             if not ai_client:
                 self.log("未配置OpenAI API Key，无法使用AI服务", level="WARNING")
                 return send_text
-            send_text = await get_reply(
-                match_cfg.ai_prompt, message.text, client=ai_client
+
+            async def call_model():
+                with self.events.timed(
+                    "ai_call", chat=message.chat.id, message_id=message.id, kind="reply"
+                ):
+                    return await get_reply(
+                        match_cfg.ai_prompt, message.text, client=ai_client
+                    )
+
+            # 刷屏时相同的消息只调用一次大模型
+            send_text = await self.reply_cache.get_or_call(
+                self.reply_cache_key(match_cfg, message), call_model
             )
         return send_text
 
+    def apply_config(self, cfg: "MonitorConfig", chat_filter: filters.chat):
+        """
+        应用新配置：先完整构建新的匹配索引再整体替换，正在处理的消息仍使用旧索引；
+        监听的chat原地更新，无需重新注册处理函数或重新连接。
+        """
+        try:
+            match_index = MatchIndex(cfg.match_cfgs)
+        except Exception as e:
+            self.log(f"新配置的监控规则无效，继续使用原规则: {e}", level="WARNING")
+            return
+        self._match_index = match_index
+        new_filter = filters.chat(cfg.chat_ids)
+        chat_filter.clear()
+        chat_filter.update(new_filter)
+        self.log(f"监控规则已更新，共{len(match_index)}条，监听的Chat: {cfg.chat_ids}")
+
+    async def watch_config(self, chat_filter: filters.chat):
+        while True:
+            cfg = await self.wait_for_config_change(math.inf)
+            if cfg is not None:
+                self.apply_config(cfg, chat_filter)
+
     async def run(self, num_of_dialogs=20):
-        if self.user is None:
-            await self.login(num_of_dialogs, print_chat=True)
+        await self.ensure_login(num_of_dialogs, print_chat=True)
 
         cfg = self.load_config(self.cfg_cls)
+        self._match_index = MatchIndex(cfg.match_cfgs)
+        chat_filter = filters.chat(cfg.chat_ids)
         self.app.add_handler(
-            MessageHandler(self.on_message, filters.text & filters.chat(cfg.chat_ids)),
+            MessageHandler(self.on_message, filters.text & chat_filter),
         )
         async with self.app:
             self.log("开始监控...")
-            await idle()
-
-
-class _UDPProtocol(asyncio.DatagramProtocol):
-    """内部使用的UDP协议处理类"""
-
-    def __init__(self):
-        self.transport = None
-
-    def connection_made(self, transport):
-        self.transport = transport
-
-    def datagram_received(self, data, addr):
-        pass  # 不需要处理接收的数据
-
-    def error_received(self, exc):
-        print(f"UDP error received: {exc}")
+            self.pipeline.start()
+            self.delete_scheduler.start()
+            watcher = asyncio.create_task(self.watch_config(chat_filter))
+            try:
+                await idle()
+            finally:
+                watcher.cancel()
+                await self.pipeline.stop(timeout=30)
+                self.log(f"任务队列统计: {self.pipeline.stats()}")
+                if pending := len(self.delete_scheduler):
+                    self.log(f"仍有{pending}条消息等待删除，将在下次运行时处理")
+                await self.delete_scheduler.stop()
+                close_udp_pool()
+                await close_http_pool()
+                await close_ai_clients()
@@ -0,0 +1,205 @@
+"""
+结构化事件日志（JSON lines），字段参考 ARCHITECTURE.md §15.13。
+
+每行一个事件，常用字段：
+    ts, event, account, task, chat, message_id, latency_ms, outcome
+事件类型：
+    send_command  发送消息/点击按钮，latency_ms为排队+请求耗时
+    recv_message  收到消息，latency_ms为距离该chat上一次发送的耗时
+    action_result 签到动作完成，latency_ms为动作开始到完成的耗时
+    ai_call       调用大模型，latency_ms为请求耗时
+"""
+
+import asyncio
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import pathlib
+import queue
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .logger import (
+    BatchingQueueListener,
+    BufferedRotatingFileHandler,
+    LazyStr,
+    ThreadQueueHandler,
+)
+
+EVENT_LOG_NAME = "events.jsonl"
+
+_event_logger = logging.getLogger("tg-signer.events")
+_event_logger.propagate = False
+_event_logger.setLevel(logging.INFO)
+_listener: Optional[BatchingQueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def configure_events(
+    filename: str, max_bytes: int = 1024 * 1024 * 10, backup_count: int = 10
+):
+    """开启事件日志，写入由后台线程完成，不阻塞事件循环"""
+    global _listener, _handler
+    shutdown_events()
+    path = pathlib.Path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = BufferedRotatingFileHandler(
+        path,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    q = queue.SimpleQueue()
+    _listener = BatchingQueueListener(q, [file_handler])
+    _listener.start()
+    _handler = ThreadQueueHandler(q)
+    _event_logger.addHandler(_handler)
+
+
+def shutdown_events():
+    global _listener, _handler
+    if _handler is not None:
+        _event_logger.removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_events)
+
+
+def events_enabled_by_env() -> bool:
+    """可通过环境变量`TG_EVENTS=0`关闭事件日志"""
+    return os.environ.get("TG_EVENTS", "1") == "1"
+
+
+def events_enabled() -> bool:
+    return _handler is not None
+
+
+def emit(event: str, **fields):
+    """记录一个事件，值为None的字段会被省略；未开启事件日志时不做任何事"""
+    if _handler is None:
+        return
+    payload = {"ts": round(time.time(), 3), "event": event}
+    payload.update((k, v) for k, v in fields.items() if v is not None)
+    _event_logger.info(LazyStr(_dumps, payload))
+
+
+def _dumps(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class EventEmitter:
+    """绑定了account/task等公共字段的事件记录器"""
+
+    def __init__(self, **base):
+        self.base = base
+
+    def emit(self, event: str, **fields):
+        if _handler is None:
+            return
+        emit(event, **{**self.base, **fields})
+
+    @contextmanager
+    def timed(self, event: str, **fields):
+        """
+        记录代码块的耗时，yield出的dict可用于补充字段，如`message_id`或`outcome`：
+
+            with events.timed("ai_call", chat=chat_id) as ev:
+                ...
+                ev["outcome"] = "timeout"
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        except asyncio.CancelledError:
+            fields.setdefault("outcome", "cancelled")
+            raise
+        except Exception as e:
+            fields.setdefault("outcome", "error")
+            fields.setdefault("error", repr(e))
+            raise
+        finally:
+            fields.setdefault("outcome", "ok")
+            self.emit(
+                event,
+                latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                **fields,
+            )
+
+
+def default_event_files(workdir: str) -> List[str]:
+    """工作目录下的事件日志，包括多进程worker各自的文件和轮转出的旧文件"""
+    return sorted(glob.glob(os.path.join(workdir, "events*.jsonl*")))
+
+
+def iter_events(paths: Iterable[str]) -> Iterator[dict]:
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> Optional[float]:
+    """最近秩法计算分位数，`sorted_values`需已排序"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(
+    events: Iterable[dict],
+    group_by: Sequence[str] = ("event",),
+    event_types: Sequence[str] = None,
+    since: float = None,
+) -> List[Dict]:
+    """按`group_by`字段分组，统计数量、各outcome数量以及latency_ms的p50/p95/p99"""
+    groups: Dict[tuple, Dict] = {}
+    for ev in events:
+        if event_types and ev.get("event") not in event_types:
+            continue
+        if since is not None and ev.get("ts", 0) < since:
+            continue
+        key = tuple(ev.get(k) for k in group_by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"count": 0, "outcomes": {}, "latencies": []}
+        group["count"] += 1
+        outcome = ev.get("outcome")
+        if outcome is not None:
+            group["outcomes"][outcome] = group["outcomes"].get(outcome, 0) + 1
+        latency = ev.get("latency_ms")
+        if isinstance(latency, (int, float)):
+            group["latencies"].append(latency)
+
+    rows = []
+    for key in sorted(groups, key=lambda k: tuple(str(x) for x in k)):
+        group = groups[key]
+        latencies = sorted(group["latencies"])
+        row = dict(zip(group_by, key))
+        row.update(
+            count=group["count"],
+            outcomes=group["outcomes"],
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            p99=percentile(latencies, 99),
+        )
+        rows.append(row)
+    return rows
@@ -0,0 +1,147 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+# httpx导入较慢，只在真正发送请求时才导入
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger("tg-signer")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpPoolLimits:
+    """连接池配置，默认值可通过环境变量覆盖"""
+
+    def __init__(
+        self,
+        max_connections: int = None,
+        max_keepalive_connections: int = None,
+        keepalive_expiry: float = 60.0,
+        max_concurrency: int = None,
+        timeout: float = 10.0,
+        http2: bool = None,
+    ):
+        self.max_connections = max_connections or _env_int(
+            "TG_HTTP_MAX_CONNECTIONS", 20
+        )
+        self.max_keepalive_connections = max_keepalive_connections or _env_int(
+            "TG_HTTP_MAX_KEEPALIVE", 10
+        )
+        self.keepalive_expiry = keepalive_expiry
+        self.max_concurrency = max_concurrency or _env_int(
+            "TG_HTTP_MAX_CONCURRENCY", 50
+        )
+        self.timeout = timeout
+        if http2 is None:
+            http2 = os.environ.get("TG_HTTP2", "1") == "1"
+        # HTTP/2需要安装`h2`（`pip install "tg-signer[http2]"`）
+        self.http2 = http2 and h2_available()
+
+    def to_httpx(self) -> "httpx.Limits":
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class HttpClientPool:
+    """
+    按目标主机复用`httpx.AsyncClient`，保持长连接，避免每次请求都重新进行TCP/TLS握手。
+    所有请求共享一个信号量，限制同时进行的请求数。
+    """
+
+    def __init__(self, limits: HttpPoolLimits = None):
+        self.limits = limits or HttpPoolLimits()
+        self._clients: Dict[Tuple[str, str, Optional[int]], "httpx.AsyncClient"] = {}
+        self._semaphore = asyncio.Semaphore(self.limits.max_concurrency)
+        self.closed = False
+
+    def get_client(self, url: str) -> "httpx.AsyncClient":
+        import httpx
+
+        u = httpx.URL(url)
+        origin = (u.scheme, u.host, u.port)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=self.limits.to_httpx(),
+                timeout=self.limits.timeout,
+                http2=self.limits.http2,
+            )
+            self._clients[origin] = client
+        return client
+
+    async def request(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        if self.closed:
+            raise RuntimeError("HttpClientPool is closed")
+        client = self.get_client(url)
+        async with self._semaphore:
+            return await client.request(method, url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("POST", url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self):
+        self.closed = True
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭HTTP连接失败: {e}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+
+# 每个事件循环一个连接池，连接不能跨事件循环复用
+_HTTP_POOLS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HttpClientPool]" = (
+    weakref.WeakKeyDictionary()
+)
+_DEFAULT_LIMITS: Optional[HttpPoolLimits] = None
+
+
+def configure_http_pool(**kwargs) -> HttpPoolLimits:
+    """设置之后新建连接池使用的配置，参数见`HttpPoolLimits`"""
+    global _DEFAULT_LIMITS
+    _DEFAULT_LIMITS = HttpPoolLimits(**kwargs)
+    return _DEFAULT_LIMITS
+
+
+def get_http_pool() -> HttpClientPool:
+    loop = asyncio.get_running_loop()
+    pool = _HTTP_POOLS.get(loop)
+    if pool is None or pool.closed:
+        pool = HttpClientPool(_DEFAULT_LIMITS)
+        _HTTP_POOLS[loop] = pool
+    return pool
+
+
+async def close_http_pool():
+    loop = asyncio.get_running_loop()
+    pool = _HTTP_POOLS.pop(loop, None)
+    if pool is not None:
+        await pool.aclose()
@@ -0,0 +1,241 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence, Set, Union
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger("tg-signer")
+
+IMAGE_CACHE_LOOKUPS = REGISTRY.counter(
+    "tg_signer_image_cache_lookups_total",
+    "图片选择缓存查询次数，result为file_id/sha256/dhash命中或miss",
+    ["result"],
+)
+
+
+def dhash(image: bytes, size: int = 8) -> Optional[int]:
+    """
+    差值感知哈希，需要安装Pillow，未安装或无法解码时返回None。
+    同一张图片重新压缩、缩放后哈希值基本不变。
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(image)) as img:
+            pixels = list(img.convert("L").resize((size + 1, size)).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def options_key(options: Sequence[str]) -> str:
+    data = json.dumps(sorted(o.strip() for o in options), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+class ImageChoiceCache:
+    """
+    图片选择题答案缓存，命中时无需再调用大模型。
+
+    键为 图片 + 排序后的选项集合，图片依次按以下方式匹配：
+      1. Telegram的`file_unique_id`，命中时连图片都不需要下载
+      2. 图片内容的sha256
+      3. dHash感知哈希的汉明距离不超过`max_distance`（需要Pillow）。
+         同一模板生成的验证码图片往往差异很小，仅凭dHash相近可能重放错误答案，
+         因此默认关闭（`max_distance=None`，此时也不计算dHash），
+         可通过环境变量`TG_IMAGE_DHASH_DISTANCE`开启
+    值为选项文本而不是序号，因为同一题目的选项顺序可能变化。
+    调用方应只在答案被验证正确后写入，答案错误时调用`invalidate`。
+    按最近使用淘汰，超过`ttl`秒的条目视为失效，持久化为JSON文件。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        max_entries: int = 2000,
+        ttl: float = 30 * 24 * 3600,
+        max_distance: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = pathlib.Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.clock = clock
+        # sha256|options_key -> {"answer", "dhash", "options", "file_id", "ts"}
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._by_file_id: Dict[str, str] = {}
+        self._by_options: Dict[str, Set[str]] = {}
+        self.stats = {"file_id": 0, "sha256": 0, "dhash": 0, "miss": 0}
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = sum(self.stats.values())
+        return (total - self.stats["miss"]) / total if total else 0.0
+
+    def _index(self, key: str, entry: dict):
+        if entry.get("file_id"):
+            self._by_file_id[f"{entry['file_id']}|{entry['options']}"] = key
+        self._by_options.setdefault(entry["options"], set()).add(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.get("file_id"):
+            self._by_file_id.pop(f"{entry['file_id']}|{entry['options']}", None)
+        keys = self._by_options.get(entry["options"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_options[entry["options"]]
+
+    def _fresh(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() - entry["ts"] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _hit(self, kind: str, entry: dict) -> str:
+        self.stats[kind] += 1
+        IMAGE_CACHE_LOOKUPS.inc(result=kind)
+        return entry["answer"]
+
+    def get_by_file_id(self, file_id: str, options: Sequence[str]) -> Optional[str]:
+        """只按`file_unique_id`查询，未命中不计入miss（之后还会按图片内容查询）"""
+        key = self._by_file_id.get(f"{file_id}|{options_key(options)}")
+        entry = self._fresh(key) if key else None
+        if entry is None:
+            return None
+        return self._hit("file_id", entry)
+
+    def get(self, image: bytes, options: Sequence[str]) -> Optional[str]:
+        opt_key = options_key(options)
+        key = f"{hashlib.sha256(image).hexdigest()}|{opt_key}"
+        entry = self._fresh(key)
+        if entry is not None:
+            return self._hit("sha256", entry)
+        image_hash = dhash(image) if self.max_distance is not None else None
+        if image_hash is not None:
+            best_key, best_distance = None, self.max_distance + 1
+            for candidate in list(self._by_options.get(opt_key, ())):
+                other = self._entries[candidate].get("dhash")
+                if other is None:
+                    continue
+                distance = bin(image_hash ^ other).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = candidate, distance
+            entry = self._fresh(best_key) if best_key else None
+            if entry is not None:
+                return self._hit("dhash", entry)
+        self.stats["miss"] += 1
+        IMAGE_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(
+        self,
+        image: bytes,
+        options: Sequence[str],
+        answer: str,
+        file_id: str = None,
+    ):
+        opt_key = options_key(options)
+        key = f"{hashlib.sha256(image).hexdigest()}|{opt_key}"
+        self._remove(key)
+        entry = {
+            "answer": answer,
+            "dhash": dhash(image) if self.max_distance is not None else None,
+            "options": opt_key,
+            "file_id": file_id,
+            "ts": self.clock(),
+        }
+        self._entries[key] = entry
+        self._index(key, entry)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        self.save()
+
+    def invalidate(
+        self, image: Optional[bytes], options: Sequence[str], file_id: str = None
+    ):
+        """删除该图片（按内容和/或`file_unique_id`）与选项对应的答案"""
+        opt_key = options_key(options)
+        if image is not None:
+            self._remove(f"{hashlib.sha256(image).hexdigest()}|{opt_key}")
+        if file_id:
+            key = self._by_file_id.get(f"{file_id}|{opt_key}")
+            if key is not None:
+                self._remove(key)
+        self.save()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取图片选择缓存失败: {e}")
+            return
+        now = self.clock()
+        for key, entry in data.get("entries", []):
+            if now - entry.get("ts", 0) <= self.ttl:
+                self._entries[key] = entry
+                self._index(key, entry)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({"entries": list(self._entries.items())}, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+_IMAGE_CACHES: Dict[str, ImageChoiceCache] = {}
+
+
+def _env_max_distance() -> Optional[int]:
+    """`TG_IMAGE_DHASH_DISTANCE`：dHash匹配的最大汉明距离，未设置或不合法时不按dHash匹配"""
+    try:
+        value = int(os.environ.get("TG_IMAGE_DHASH_DISTANCE", ""))
+    except ValueError:
+        return None
+    return value if value >= 0 else None
+
+
+def get_image_choice_cache(
+    workdir: Union[str, pathlib.Path],
+) -> Optional[ImageChoiceCache]:
+    """同一工作目录共享一个缓存；环境变量`TG_IMAGE_CACHE=0`时关闭缓存，返回None"""
+    if os.environ.get("TG_IMAGE_CACHE", "1") != "1":
+        return None
+    path = pathlib.Path(workdir) / "cache" / "image_choices.json"
+    key = str(path.resolve())
+    cache = _IMAGE_CACHES.get(key)
+    if cache is None:
+        cache = _IMAGE_CACHES[key] = ImageChoiceCache(
+            path, max_distance=_env_max_distance()
+        )
+    return cache
@@ -1,6 +1,13 @@
+import atexit
+import copy
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import pathlib
+import queue
+import re
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Dict, List, Optional
 
 format_str = (
     "[%(levelname)s] [%(name)s] %(asctime)s %(filename)s %(lineno)s %(message)s"
@@ -8,29 +15,250 @@ format_str = (
 formatter = logging.Formatter(format_str)
 
 
+class LazyStr:
+    """延迟到日志真正输出时才计算的字符串，用于开销较大的日志参数"""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """写入后不立即flush，由后台监听线程处理完一批日志后调用`flush_buffer`统一flush"""
+
+    def flush(self):
+        pass
+
+    def flush_buffer(self):
+        super().flush()
+
+
+class PerAccountFileHandler(logging.Handler):
+    """
+    按日志记录中的`account`字段（由`BaseUserWorker.log`传入）写入独立的日志文件：
+    `tg-signer.log` -> `tg-signer.<account>.log`
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_bytes: int = 1024 * 1024 * 3,
+        backup_count: int = 10,
+        buffered: bool = False,
+    ):
+        super().__init__()
+        self.path = pathlib.Path(filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffered = buffered
+        self._handlers: Dict[str, RotatingFileHandler] = {}
+
+    def get_filename(self, account: str) -> str:
+        account = re.sub(r"[^\w.-]", "_", account)
+        return str(self.path.with_name(f"{self.path.stem}.{account}{self.path.suffix}"))
+
+    def _get_handler(self, account: str) -> RotatingFileHandler:
+        handler = self._handlers.get(account)
+        if handler is None:
+            handler_cls = (
+                BufferedRotatingFileHandler if self.buffered else RotatingFileHandler
+            )
+            handler = handler_cls(
+                self.get_filename(account),
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8",
+            )
+            handler.setFormatter(self.formatter)
+            self._handlers[account] = handler
+        return handler
+
+    def emit(self, record: logging.LogRecord):
+        account = getattr(record, "account", None)
+        if account:
+            self._get_handler(str(account)).handle(record)
+
+    def flush_buffer(self):
+        for handler in list(self._handlers.values()):
+            getattr(handler, "flush_buffer", handler.flush)()
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+
+class ThreadQueueHandler(QueueHandler):
+    """
+    只把日志记录放入队列，格式化（包括%参数和异常堆栈）留给监听线程完成。
+    队列仅在同一进程的线程间传递，记录无需序列化。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BatchingQueueListener:
+    """
+    后台线程从队列中取出日志记录并交给实际的handlers，
+    每处理完一批（队列暂时为空或达到`batch_size`）统一flush一次。
+    """
+
+    _sentinel = None
+
+    def __init__(
+        self,
+        queue_: "queue.SimpleQueue",
+        handlers: List[logging.Handler],
+        batch_size: int = 256,
+    ):
+        self.queue = queue_
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="tg-signer-logger", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+    def handle(self, record: logging.LogRecord):
+        # 只格式化一次，供所有handlers复用；复制一份，避免影响仍在主线程传播的原记录
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self):
+        for handler in self.handlers:
+            try:
+                getattr(handler, "flush_buffer", handler.flush)()
+            except Exception:
+                pass
+
+    def _run(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = False
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    try:
+                        self.handle(record)
+                    except Exception:
+                        # 例如%参数不匹配，不能让后台线程因此退出
+                        logging.Handler().handleError(record)
+            self.flush()
+            if stopping:
+                return
+
+
+_listener: Optional[BatchingQueueListener] = None
+# logger名 -> 添加到该logger上的handlers
+_installed: Dict[str, List[logging.Handler]] = {}
+_owned_handlers: List[logging.Handler] = []
+
+
+def shutdown_logger():
+    """停止后台日志线程（会先写完队列中剩余的日志），并移除`configure_logger`添加的handlers"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for name, handlers in _installed.items():
+        target = logging.getLogger(name)
+        for handler in handlers:
+            target.removeHandler(handler)
+    _installed.clear()
+    for handler in _owned_handlers:
+        handler.close()
+    _owned_handlers.clear()
+
+
+atexit.register(shutdown_logger)
+
+
 def configure_logger(
     log_level: str = "INFO",
     filename: str = "tg-signer.log",
     max_bytes: int = 1024 * 1024 * 3,
+    async_mode: bool = None,
+    per_account: bool = None,
 ):
+    """
+    :param async_mode: 日志经队列交给后台线程写入，避免阻塞事件循环。
+        默认开启，可通过环境变量`TG_LOG_ASYNC=0`关闭
+    :param per_account: 额外为每个账号写一份日志文件，默认取环境变量`TG_LOG_PER_ACCOUNT`
+    """
+    global _listener
+    if async_mode is None:
+        async_mode = os.environ.get("TG_LOG_ASYNC", "1") == "1"
+    if per_account is None:
+        per_account = os.environ.get("TG_LOG_PER_ACCOUNT", "0") == "1"
+    shutdown_logger()
+
     level = log_level.strip().upper()
     logger = logging.getLogger("tg-signer")
     logger.setLevel(level)
 
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    file_handler = RotatingFileHandler(
+    file_handler_cls = (
+        BufferedRotatingFileHandler if async_mode else RotatingFileHandler
+    )
+    file_handler = file_handler_cls(
         filename,
         maxBytes=max_bytes,
         backupCount=10,
         encoding="utf-8",
     )
     file_handler.setFormatter(formatter)
+    handlers = [console_handler, file_handler]
+    if per_account:
+        account_handler = PerAccountFileHandler(
+            filename, max_bytes=max_bytes, buffered=async_mode
+        )
+        account_handler.setFormatter(formatter)
+        handlers.append(account_handler)
+
+    if async_mode:
+        q = queue.SimpleQueue()
+        _listener = BatchingQueueListener(q, handlers)
+        _listener.start()
+        logger_handlers = [ThreadQueueHandler(q)]
+    else:
+        logger_handlers = handlers
+    for handler in logger_handlers:
+        logger.addHandler(handler)
+    _installed["tg-signer"] = logger_handlers
+    _owned_handlers.extend(handlers)
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
     if os.environ.get("PYROGRAM_LOG_ON", "0") == "1":
         pyrogram_logger = logging.getLogger("pyrogram")
         pyrogram_logger.setLevel(level)
         pyrogram_logger.addHandler(console_handler)
+        _installed["pyrogram"] = [console_handler]
     return logger
@@ -0,0 +1,143 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pyrogram.types import Message
+
+from tg_signer.config import MatchConfig
+
+
+class LiteralMatcher:
+    """
+    将多个字面量合并为一个正则进行子串匹配，一次扫描即可得到文本中出现的所有字面量。
+
+    使用零宽前瞻``(?=(a|b|...))``使每个位置都会被尝试，字面量按长度降序排列，
+    因此每个位置命中的是该位置最长的字面量；被其包含的其它字面量通过预先计算的
+    包含关系补全。
+    """
+
+    def __init__(self, literals: Iterable[str]):
+        self.literals: List[str] = list(dict.fromkeys(literals))
+        self._always: Set[str] = {lit for lit in self.literals if lit == ""}
+        non_empty = sorted((lit for lit in self.literals if lit), key=len, reverse=True)
+        self._pattern: Optional[re.Pattern] = None
+        if non_empty:
+            self._pattern = re.compile(
+                "(?=(" + "|".join(re.escape(lit) for lit in non_empty) + "))"
+            )
+        # 字面量 -> 所有被它包含的字面量（含自身）
+        self._closure: Dict[str, Tuple[str, ...]] = {
+            lit: tuple(other for other in non_empty if other in lit)
+            for lit in non_empty
+        }
+
+    def __bool__(self):
+        return bool(self.literals)
+
+    def search(self, text: str) -> Set[str]:
+        found = set(self._always)
+        if self._pattern is None:
+            return found
+        hits = {m.group(1) for m in self._pattern.finditer(text)}
+        for hit in hits:
+            found.update(self._closure[hit])
+        return found
+
+
+class _ChatRules:
+    """同一个chat下的监控项，按规则类型预先编译"""
+
+    def __init__(self):
+        self.all: List[int] = []
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.exact_folded: Dict[str, List[int]] = defaultdict(list)
+        self.contains: Dict[str, List[int]] = defaultdict(list)
+        self.contains_folded: Dict[str, List[int]] = defaultdict(list)
+        self.regex: List[Tuple[int, re.Pattern]] = []
+        self.contains_matcher = LiteralMatcher(())
+        self.contains_folded_matcher = LiteralMatcher(())
+
+    def add(self, index: int, cfg: MatchConfig):
+        if cfg.rule == "all":
+            self.all.append(index)
+        elif cfg.rule_value is None:
+            return
+        elif cfg.rule == "exact":
+            if cfg.ignore_case:
+                self.exact_folded[cfg.folded_rule_value].append(index)
+            else:
+                self.exact[cfg.rule_value].append(index)
+        elif cfg.rule == "contains":
+            if cfg.ignore_case:
+                self.contains_folded[cfg.folded_rule_value].append(index)
+            else:
+                self.contains[cfg.rule_value].append(index)
+        elif cfg.rule == "regex":
+            self.regex.append((index, cfg.rule_pattern))
+
+    def compile(self):
+        self.contains_matcher = LiteralMatcher(self.contains)
+        self.contains_folded_matcher = LiteralMatcher(self.contains_folded)
+
+    def match_text(self, text: Optional[str]) -> List[int]:
+        matched = list(self.all)
+        if text is None:
+            return matched
+        folded = None
+        if self.exact:
+            matched.extend(self.exact.get(text, ()))
+        if self.exact_folded:
+            folded = text.lower()
+            matched.extend(self.exact_folded.get(folded, ()))
+        if self.contains_matcher:
+            for lit in self.contains_matcher.search(text):
+                matched.extend(self.contains[lit])
+        if self.contains_folded_matcher:
+            folded = text.lower() if folded is None else folded
+            for lit in self.contains_folded_matcher.search(folded):
+                matched.extend(self.contains_folded[lit])
+        for index, pattern in self.regex:
+            if pattern.search(text):
+                matched.append(index)
+        return matched
+
+
+class MatchIndex:
+    """
+    监控项索引：按chat id/username分桶，正则和忽略大小写的规则值在构建时预处理，
+    同一chat内的所有`contains`规则合并为一次扫描。
+
+    `match`返回的结果与按顺序逐个调用`MatchConfig.match`得到的结果相同。
+    """
+
+    def __init__(self, match_cfgs: Iterable[MatchConfig]):
+        self.match_cfgs: List[MatchConfig] = list(match_cfgs)
+        self._by_id: Dict[int, _ChatRules] = defaultdict(_ChatRules)
+        self._by_username: Dict[Optional[str], _ChatRules] = defaultdict(_ChatRules)
+        for index, cfg in enumerate(self.match_cfgs):
+            if isinstance(cfg.chat_id, int):
+                self._by_id[cfg.chat_id].add(index, cfg)
+            else:
+                self._by_username[cfg.chat_id].add(index, cfg)
+        for rules in (*self._by_id.values(), *self._by_username.values()):
+            rules.compile()
+        self._by_id = dict(self._by_id)
+        self._by_username = dict(self._by_username)
+
+    def __len__(self):
+        return len(self.match_cfgs)
+
+    def match(self, message: "Message") -> List[MatchConfig]:
+        chat = message.chat
+        indexes = []
+        if rules := self._by_id.get(chat.id):
+            indexes.extend(rules.match_text(message.text))
+        if rules := self._by_username.get(chat.username):
+            indexes.extend(rules.match_text(message.text))
+        if not indexes:
+            return []
+        return [
+            self.match_cfgs[i]
+            for i in sorted(indexes)
+            if self.match_cfgs[i].match_user(message)
+        ]
@@ -0,0 +1,469 @@
+"""
+进程内指标（counter / gauge / histogram），可通过本地HTTP端口以Prometheus文本格式暴露，
+也可以定期写入快照文件。未开启时`labels()`返回空操作对象，开销可以忽略。
+"""
+
+import asyncio
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("tg-signer")
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NoopChild:
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def set_function(self, func: Callable[[], float]):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+_NOOP = _NoopChild()
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def get(self) -> float:
+        return self.value
+
+
+class _GaugeChild:
+    __slots__ = ("value", "func")
+
+    def __init__(self):
+        self.value = 0.0
+        self.func: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, func: Callable[[], float]):
+        """读取指标时才调用`func`获取当前值，如队列长度"""
+        self.func = func
+
+    def get(self) -> float:
+        if self.func is not None:
+            try:
+                return float(self.func())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        result = []
+        total = 0
+        for upper, n in zip(self.buckets, self.counts):
+            total += n
+            result.append((_format_value(upper), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class Metric:
+    type_ = ""
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        if not self.registry.enabled:
+            return _NOOP
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+
+class Counter(Metric):
+    type_ = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1, **labels):
+        self.labels(**labels).inc(amount)
+
+
+class Gauge(Metric):
+    type_ = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float, **labels):
+        self.labels(**labels).set(value)
+
+
+class Histogram(Metric):
+    type_ = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if math.isnan(value):
+        return "NaN"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self._metrics: Dict[str, Metric] = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(self, name, documentation, labelnames, **kwargs)
+            self._metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_}")
+            for values, child in metric.samples():
+                if isinstance(child, _HistogramChild):
+                    for le, n in child.cumulative():
+                        labels = _format_labels(metric.labelnames, values, le=le)
+                        lines.append(f"{metric.name}_bucket{labels} {n}")
+                    labels = _format_labels(metric.labelnames, values)
+                    lines.append(
+                        f"{metric.name}_sum{labels} {_format_value(child.sum)}"
+                    )
+                    lines.append(f"{metric.name}_count{labels} {child.count}")
+                else:
+                    labels = _format_labels(metric.labelnames, values)
+                    lines.append(f"{metric.name}{labels} {_format_value(child.get())}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        result = {}
+        for metric in self._metrics.values():
+            samples = []
+            for values, child in metric.samples():
+                sample = {"labels": dict(zip(metric.labelnames, values))}
+                if isinstance(child, _HistogramChild):
+                    sample.update(
+                        count=child.count,
+                        sum=child.sum,
+                        buckets=dict(child.cumulative()),
+                    )
+                else:
+                    value = child.get()
+                    sample["value"] = None if math.isnan(value) else value
+                samples.append(sample)
+            result[metric.name] = {
+                "type": metric.type_,
+                "help": metric.documentation,
+                "samples": samples,
+            }
+        return result
+
+
+REGISTRY = MetricsRegistry()
+
+WAIT_FOR_SECONDS = REGISTRY.histogram(
+    "tg_signer_wait_for_seconds",
+    "签到动作等待回复并处理完成的耗时",
+    ["action", "outcome"],
+)
+MONITOR_MESSAGES = REGISTRY.counter(
+    "tg_signer_monitor_messages_total", "监控收到的消息数", ["account"]
+)
+MONITOR_MATCHES = REGISTRY.counter(
+    "tg_signer_monitor_matches_total", "消息匹配到监控项的次数", ["account", "rule"]
+)
+PIPELINE_DEPTH = REGISTRY.gauge(
+    "tg_signer_pipeline_depth", "监控任务队列中等待处理的任务数", ["account", "stage"]
+)
+FORWARDS = REGISTRY.counter(
+    "tg_signer_forwards_total", "转发到外部的次数", ["target", "outcome"]
+)
+FORWARD_SECONDS = REGISTRY.histogram(
+    "tg_signer_forward_seconds", "转发到外部的耗时", ["target"]
+)
+AI_CALLS = REGISTRY.counter(
+    "tg_signer_ai_calls_total", "调用大模型的次数", ["func", "outcome"]
+)
+AI_CALL_SECONDS = REGISTRY.histogram(
+    "tg_signer_ai_call_seconds", "调用大模型的耗时", ["func"]
+)
+AI_RETRIES = REGISTRY.counter(
+    "tg_signer_ai_retries_total", "调用大模型失败后重试的次数", ["error"]
+)
+AI_INFLIGHT = REGISTRY.gauge("tg_signer_ai_inflight", "正在进行的大模型请求数")
+CLIENT_STARTS = REGISTRY.counter(
+    "tg_signer_client_starts_total", "Telegram客户端启动次数", ["account"]
+)
+CLIENT_STOPS = REGISTRY.counter(
+    "tg_signer_client_stops_total", "Telegram客户端停止次数", ["account"]
+)
+CLIENTS_ACTIVE = REGISTRY.gauge("tg_signer_clients_active", "已启动的Telegram客户端数")
+FLOOD_WAITS = REGISTRY.counter(
+    "tg_signer_flood_waits_total", "遇到FloodWait/SlowmodeWait的次数", ["error"]
+)
+FLOOD_WAIT_SECONDS = REGISTRY.counter(
+    "tg_signer_flood_wait_seconds_total",
+    "FloodWait/SlowmodeWait要求等待的总秒数",
+    ["error"],
+)
+
+
+@contextmanager
+def track(counter: Counter, histogram: Histogram, **labels):
+    """
+    记录代码块耗时到`histogram`，并按outcome(ok/error)计数到`counter`。
+    被取消（如正常退出时）只记录耗时，不计入`counter`。
+    """
+    if not REGISTRY.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        outcome = None
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+        if outcome is not None:
+            counter.inc(outcome=outcome, **labels)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(
+    port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY
+) -> ThreadingHTTPServer:
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="tg-signer-metrics-http", daemon=True
+    ).start()
+    return server
+
+
+class SnapshotWriter:
+    """后台线程定期将指标快照原子写入JSON文件"""
+
+    def __init__(
+        self, path: str, interval: float = 15.0, registry: MetricsRegistry = REGISTRY
+    ):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="tg-signer-metrics-snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def write(self):
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(
+                {"ts": time.time(), "metrics": self.registry.snapshot()},
+                fp,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning(f"写入指标快照失败: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.write()
+        except OSError as e:
+            logger.warning(f"写入指标快照失败: {e}")
+
+
+_http_server: Optional[ThreadingHTTPServer] = None
+_snapshot_writer: Optional[SnapshotWriter] = None
+
+
+def configure_metrics(
+    port: int = None,
+    snapshot_file: str = None,
+    interval: float = 15.0,
+    host: str = "127.0.0.1",
+):
+    """开启指标采集；`port`和`snapshot_file`都未指定时保持关闭"""
+    global _http_server, _snapshot_writer
+    shutdown_metrics()
+    if not port and not snapshot_file:
+        return
+    REGISTRY.enabled = True
+    if port:
+        _http_server = start_http_server(port, host)
+        logger.info(f"指标地址: http://{host}:{port}/metrics")
+    if snapshot_file:
+        _snapshot_writer = SnapshotWriter(snapshot_file, interval)
+        _snapshot_writer.start()
+
+
+def shutdown_metrics():
+    global _http_server, _snapshot_writer
+    if _http_server is not None:
+        _http_server.shutdown()
+        _http_server.server_close()
+        _http_server = None
+    if _snapshot_writer is not None:
+        _snapshot_writer.stop()
+        _snapshot_writer = None
+    REGISTRY.enabled = False
+
+
+atexit.register(shutdown_metrics)
@@ -1,9 +1,9 @@
 import re
 
-from httpx import AsyncClient
+from tg_signer.http_pool import HttpClientPool, get_http_pool
 
 
-async def sc_send(sendkey, title, desp="", options=None):
+async def sc_send(sendkey, title, desp="", options=None, pool: HttpClientPool = None):
     if options is None:
         options = {}
     # 判断 sendkey 是否以 'sctp' 开头，并提取数字构造 URL
@@ -18,7 +18,7 @@ async def sc_send(sendkey, title, desp="", options=None):
         url = f"https://sctapi.ftqq.com/{sendkey}.send"
     params = {"title": title, "desp": desp, **options}
     headers = {"Content-Type": "application/json;charset=utf-8"}
-    async with AsyncClient(headers=headers) as client:
-        response = await client.post(url, json=params)
-        result = response.json()
+    pool = pool or get_http_pool()
+    response = await pool.post(url, json=params, headers=headers)
+    result = response.json()
     return result
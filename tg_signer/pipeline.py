@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("tg-signer")
+
+JobT = Callable[[], Awaitable]
+
+
+class StageStats:
+    __slots__ = ("submitted", "completed", "failed", "max_depth")
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class Stage:
+    def __init__(self, name: str, concurrency: int, maxsize: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue: "asyncio.Queue[JobT]" = asyncio.Queue(maxsize)
+        self.stats = StageStats()
+        self.workers: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await job()
+                self.stats.completed += 1
+            except Exception as e:
+                self.stats.failed += 1
+                logger.exception(e)
+            finally:
+                self.queue.task_done()
+
+
+class DispatchPipeline:
+    """
+    分阶段的异步任务派发：每个阶段一个有界队列和固定数量的worker。
+
+    `submit`在队列已满时等待（反压），从而限制积压的任务数；
+    某个阶段的慢任务（如AI回复）只占用该阶段的worker，不影响其它阶段和后续消息的匹配。
+    """
+
+    def __init__(self, stages: Dict[str, int], maxsize: int = 1000):
+        self._stage_conf = dict(stages)
+        self.maxsize = maxsize
+        self.stages: Dict[str, Stage] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self.stages)
+
+    def start(self):
+        if self.running:
+            return
+        for name, concurrency in self._stage_conf.items():
+            stage = Stage(name, concurrency, self.maxsize)
+            stage.workers = [
+                asyncio.create_task(stage._work()) for _ in range(concurrency)
+            ]
+            self.stages[name] = stage
+
+    async def submit(self, stage_name: str, job: JobT):
+        self.start()
+        stage = self.stages[stage_name]
+        if stage.queue.full():
+            logger.warning(f"任务队列「{stage_name}」已满({self.maxsize})，等待处理...")
+        await stage.queue.put(job)
+        stage.stats.submitted += 1
+        stage.stats.max_depth = max(stage.stats.max_depth, stage.depth)
+
+    def depth(self, stage_name: str) -> int:
+        stage = self.stages.get(stage_name)
+        return stage.depth if stage else 0
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "depth": stage.depth,
+                "concurrency": stage.concurrency,
+                **stage.stats.to_dict(),
+            }
+            for name, stage in self.stages.items()
+        }
+
+    async def join(self):
+        for stage in self.stages.values():
+            await stage.queue.join()
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = None):
+        if drain:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"任务队列未能在{timeout}秒内处理完毕: {self.stats()}")
+        tasks = [t for stage in self.stages.values() for t in stage.workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stages = {}
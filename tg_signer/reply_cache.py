@@ -0,0 +1,101 @@
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .metrics import REGISTRY
+
+REPLY_CACHE_LOOKUPS = REGISTRY.counter(
+    "tg_signer_reply_cache_lookups_total",
+    "AI回复缓存查询次数，result为hit/coalesced/miss",
+    ["result"],
+)
+
+_ZERO_WIDTH_RE = re.compile("[\u200b-\u200f\u2060\ufeff]")
+_WHITESPACE_RE = re.compile(r"\s+")
+# 连续重复的标点、符号（如"！！！"、"~~~"）折叠为一个
+_REPEATED_PUNCT_RE = re.compile(r"([^\w\s])\1+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    归一化消息文本作为缓存键：全角转半角、忽略大小写、去除零宽字符、
+    合并空白和重复标点，首尾的标点与空白不参与比较。
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _ZERO_WIDTH_RE.sub("", text)
+    text = _WHITESPACE_RE.sub(" ", text)
+    text = _REPEATED_PUNCT_RE.sub(r"\1", text)
+    return text.strip(" \t\r\n.,!?;:~。，！？；：、…")
+
+
+class ReplyCache:
+    """
+    有界、带过期时间的回复缓存，并对相同键的并发请求做合并（single-flight）：
+    同一时刻只有一个请求在进行，其他调用方等待并共享其结果。
+    请求失败时不缓存，等待中的调用方会收到相同的异常。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hit": 0, "coalesced": 0, "miss": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        REPLY_CACHE_LOOKUPS.inc(result=result)
+
+    def get(self, key: Hashable) -> Optional[str]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if self.clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: str):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _on_done(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            if value := future.result():
+                self.put(key, value)
+
+    async def get_or_call(
+        self, key: Hashable, func: Callable[[], Awaitable[str]]
+    ) -> str:
+        value = self.get(key)
+        if value is not None:
+            self._count("hit")
+            return value
+        future = self._inflight.get(key)
+        if future is not None:
+            self._count("coalesced")
+        else:
+            self._count("miss")
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._on_done(key, f))
+        # 某个调用方被取消时不影响进行中的请求和其他调用方
+        return await asyncio.shield(future)
@@ -0,0 +1,287 @@
+import asyncio
+import inspect
+import json
+import logging
+import math
+import os
+import pathlib
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger("tg-signer")
+
+TimerCallbackT = Callable[[], Union[None, Awaitable]]
+
+# 重试也无法成功的删除错误（pyrogram RPCError的ID），遇到时不再重试
+PERMANENT_DELETE_ERRORS = frozenset(
+    {
+        "MESSAGE_DELETE_FORBIDDEN",
+        "MESSAGE_ID_INVALID",
+        "CHANNEL_PRIVATE",
+        "PEER_ID_INVALID",
+    }
+)
+
+
+class TimerEntry:
+    __slots__ = ("callback", "rounds", "cancelled")
+
+    def __init__(self, callback: TimerCallbackT, rounds: int):
+        self.callback = callback
+        self.rounds = rounds
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    单层哈希时间轮，用于大量延时任务（如延时删除消息）。
+
+    所有定时任务共用一个后台协程，每`tick`秒推进一格，到期的回调在该格内被触发，
+    回调可以是普通函数或返回awaitable的函数。超出一圈的延时通过`rounds`计数处理。
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 60):
+        self.tick = tick
+        self.slots: List[List[TimerEntry]] = [[] for _ in range(slots)]
+        self.cursor = 0
+        # 尚未触发的任务数，包括通过`call_soon`立即执行的任务
+        self.pending = 0
+        self._immediate = 0
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+    def __len__(self):
+        return self.pending
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, delay: float, callback: TimerCallbackT) -> TimerEntry:
+        """`delay`秒后执行`callback`，精度为`tick`"""
+        ticks = max(0, math.ceil(delay / self.tick))
+        if ticks == 0:
+            entry = TimerEntry(callback, 0)
+            self.pending += 1
+            self._immediate += 1
+            asyncio.get_running_loop().call_soon(self._fire_immediate, entry)
+            return entry
+        # 放在第`ticks`格之后，保证不会早于`delay`触发（最多晚一个tick）
+        rounds, offset = divmod(ticks, len(self.slots))
+        entry = TimerEntry(callback, rounds)
+        self.slots[(self.cursor + offset) % len(self.slots)].append(entry)
+        self.pending += 1
+        self.start()
+        return entry
+
+    def _fire_immediate(self, entry: TimerEntry):
+        self.pending -= 1
+        self._immediate -= 1
+        self._fire(entry)
+
+    def _fire(self, entry: TimerEntry):
+        if entry.cancelled:
+            return
+        try:
+            result = entry.callback()
+        except Exception as e:
+            logger.exception(e)
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._running.add(task)
+            task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error("定时任务执行失败", exc_info=task.exception())
+
+    def advance(self):
+        """推进一格并触发该格中到期的任务"""
+        slot = self.slots[self.cursor]
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        due = [e for e in slot if e.rounds <= 0]
+        remaining = [e for e in slot if e.rounds > 0]
+        for entry in remaining:
+            entry.rounds -= 1
+        slot[:] = remaining
+        self.pending -= len(due)
+        for entry in due:
+            self._fire(entry)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while self.pending:
+            next_at += self.tick
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            self.advance()
+
+    async def join(self):
+        """等待所有已安排的任务执行完毕"""
+        while self.pending or self._running:
+            if self._running:
+                await asyncio.gather(*self._running, return_exceptions=True)
+            elif self._immediate:
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(self.tick)
+
+
+class DeleteScheduler:
+    """
+    集中管理延时删除消息。
+
+    到期时间相同（同一个tick内到期）的同一chat的消息合并为一次`delete_messages`调用；
+    待删除的消息持久化到`state_file`，进程重启后通过`start`重新安排，已过期的立即删除。
+    删除失败时按指数退避重试，最多`max_retries`次，之后留待下次启动时重试；
+    `PERMANENT_DELETE_ERRORS`中的错误不再重试。
+    """
+
+    def __init__(
+        self,
+        client,
+        state_file: Union[str, pathlib.Path, None] = None,
+        tick: float = 1.0,
+        retry_delay: float = 2.0,
+        retry_max_delay: float = 60.0,
+        max_retries: int = 3,
+    ):
+        self.client = client
+        self.state_file = pathlib.Path(state_file) if state_file else None
+        self.wheel = TimerWheel(tick=tick)
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_retries = max_retries
+        # (chat_id, message_id) -> 已失败次数
+        self._attempts: Dict[Tuple[Union[int, str], int], int] = {}
+        # (chat_id, message_id) -> 到期时间戳
+        self._pending: Dict[Tuple[Union[int, str], int], float] = {}
+        self._due: Dict[Union[int, str], List[int]] = defaultdict(list)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _load(self) -> Dict[Tuple[Union[int, str], int], float]:
+        if not self.state_file or not self.state_file.is_file():
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as fp:
+                items = json.load(fp)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取待删除消息失败: {e}")
+            return {}
+        return {(i["chat_id"], i["message_id"]): i["due_at"] for i in items}
+
+    def _save(self):
+        if not self.state_file:
+            return
+        items = [
+            {"chat_id": chat_id, "message_id": message_id, "due_at": due_at}
+            for (chat_id, message_id), due_at in self._pending.items()
+        ]
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(items, fp)
+        os.replace(tmp, self.state_file)
+
+    def start(self):
+        """重新安排上次运行未完成的删除"""
+        if self._loaded:
+            return
+        self._loaded = True
+        now = time.time()
+        restored = self._load()
+        for (chat_id, message_id), due_at in restored.items():
+            self._schedule(chat_id, message_id, due_at, max(0.0, due_at - now))
+        if restored:
+            logger.info(f"恢复了{len(restored)}条待删除消息")
+
+    def schedule(self, chat_id: Union[int, str], message_id: int, delay: float):
+        self.start()
+        self._schedule(chat_id, message_id, time.time() + delay, delay)
+        self._save()
+
+    def _schedule(self, chat_id, message_id, due_at: float, delay: float):
+        self._pending[(chat_id, message_id)] = due_at
+        self.wheel.schedule(delay, lambda: self._mark_due(chat_id, message_id))
+
+    def _on_failed(self, chat_id, message_ids: List[int], error: Exception):
+        keys = [(chat_id, message_id) for message_id in message_ids]
+        if getattr(error, "ID", None) in PERMANENT_DELETE_ERRORS:
+            logger.warning(f"无法删除消息，不再重试: {chat_id} {message_ids}: {error}")
+            for key in keys:
+                self._pending.pop(key, None)
+                self._attempts.pop(key, None)
+            return
+        attempt = max(self._attempts.get(key, 0) for key in keys) + 1
+        if attempt > self.max_retries:
+            # 保留在待删除列表中，下次启动时重试
+            logger.warning(
+                f"删除消息失败{attempt}次，下次启动时重试: {chat_id} {message_ids}: {error}"
+            )
+            return
+        delay = min(self.retry_max_delay, self.retry_delay * 2 ** (attempt - 1))
+        logger.warning(
+            f"删除消息失败，{delay:g}秒后重试: {chat_id} {message_ids}: {error}"
+        )
+        for key in keys:
+            self._attempts[key] = attempt
+        for message_id in message_ids:
+            self.wheel.schedule(delay, lambda m=message_id: self._mark_due(chat_id, m))
+
+    def _mark_due(self, chat_id, message_id):
+        self._due[chat_id].append(message_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        # 让出一次，使同一tick内到期的消息都进入本批次
+        await asyncio.sleep(0)
+        while self._due:
+            due, self._due = self._due, defaultdict(list)
+            for chat_id, message_ids in due.items():
+                try:
+                    await self.client.delete_messages(chat_id, message_ids)
+                    logger.info(f"Messages {message_ids} in {chat_id} deleted!")
+                except Exception as e:
+                    self._on_failed(chat_id, message_ids, e)
+                    continue
+                for message_id in message_ids:
+                    self._pending.pop((chat_id, message_id), None)
+                    self._attempts.pop((chat_id, message_id), None)
+        self._save()
+
+    async def drain(self):
+        """等待所有已安排的删除（包括失败后的重试）完成"""
+        while True:
+            await self.wheel.join()
+            if self._flush_task is not None and not self._flush_task.done():
+                await self._flush_task
+            elif self._due:
+                await self._flush()
+            elif not self.wheel.pending:
+                return
+
+    async def stop(self):
+        await self.wheel.stop()
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._save()
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger("tg-signer")
+
+PathT = Union[str, pathlib.Path]
+
+
+class StateStore:
+    """
+    任务执行记录存储接口。
+    记录按 (account, task, date) 定位，value为该日期最后一次执行时间（ISO格式）。
+    """
+
+    def get(self, account: str, task: str, date: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def upsert(self, account: str, task: str, date: str, value: str):
+        raise NotImplementedError
+
+    def upsert_many(self, account: str, task: str, records: Dict[str, str]):
+        for date, value in records.items():
+            self.upsert(account, task, date, value)
+
+    def records(self, account: str, task: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def last(self, account: str, task: str) -> Optional[Tuple[str, str]]:
+        """返回最近一条记录 (date, value)"""
+        records = self.records(account, task)
+        if not records:
+            return None
+        date = max(records)
+        return date, records[date]
+
+    def prune(self, before: str, account: str = None, task: str = None) -> int:
+        """删除日期早于`before`的记录，返回删除条数"""
+        raise NotImplementedError
+
+    def migrate_json(self, account: str, task: str, path: PathT) -> int:
+        """
+        导入旧版`sign_record.json`，已存在的记录不会被覆盖。
+        导入成功后原文件重命名为`*.migrated`，避免重复导入。
+        """
+        path = pathlib.Path(path)
+        if not path.is_file():
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                records = json.load(fp) or {}
+        except ValueError:
+            logger.warning(f"无法解析签到记录文件: {path}, 跳过迁移")
+            return 0
+        existing = self.records(account, task)
+        new_records = {k: v for k, v in records.items() if k not in existing}
+        self.upsert_many(account, task, new_records)
+        os.replace(path, path.with_name(path.name + ".migrated"))
+        logger.info(f"已迁移签到记录: {path}, 共{len(new_records)}条")
+        return len(new_records)
+
+    def close(self):
+        pass
+
+
+class JSONStateStore(StateStore):
+    """
+    兼容旧版布局的JSON存储：`<root>/<task>/<account>/sign_record.json`。
+    每次写入都会重写整个文件（原子替换）。
+    """
+
+    def __init__(self, root: PathT):
+        self.root = pathlib.Path(root)
+
+    def _file(self, account: str, task: str) -> pathlib.Path:
+        return self.root / task / account / "sign_record.json"
+
+    def records(self, account: str, task: str) -> Dict[str, str]:
+        try:
+            with open(self._file(account, task), "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, account: str, task: str, records: Dict[str, str]):
+        path = self._file(account, task)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(records, fp)
+        os.replace(tmp_path, path)
+
+    def get(self, account: str, task: str, date: str) -> Optional[str]:
+        return self.records(account, task).get(date)
+
+    def upsert(self, account: str, task: str, date: str, value: str):
+        self.upsert_many(account, task, {date: value})
+
+    def upsert_many(self, account: str, task: str, records: Dict[str, str]):
+        if not records:
+            return
+        current = self.records(account, task)
+        current.update(records)
+        self._write(account, task, current)
+
+    def _iter_record_keys(self, account: str = None, task: str = None):
+        tasks = [task] if task else [p.name for p in self.root.iterdir() if p.is_dir()]
+        for t in tasks:
+            task_dir = self.root / t
+            if not task_dir.is_dir():
+                continue
+            accounts = [account] if account else [p.name for p in task_dir.iterdir()]
+            for a in accounts:
+                if self._file(a, t).is_file():
+                    yield a, t
+
+    def prune(self, before: str, account: str = None, task: str = None) -> int:
+        if not self.root.is_dir():
+            return 0
+        removed = 0
+        for a, t in list(self._iter_record_keys(account, task)):
+            records = self.records(a, t)
+            kept = {k: v for k, v in records.items() if k >= before}
+            if len(kept) != len(records):
+                removed += len(records) - len(kept)
+                self._write(a, t, kept)
+        return removed
+
+    def migrate_json(self, account: str, task: str, path: PathT) -> int:
+        if pathlib.Path(path).resolve() == self._file(account, task).resolve():
+            return 0
+        return super().migrate_json(account, task, path)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    基于SQLite（WAL模式）的存储，同一工作目录下的所有任务和账号共享一个数据库文件。
+    主键 (account, task, date) 即索引，单条写入为原子upsert。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sign_records (
+        account TEXT NOT NULL,
+        task TEXT NOT NULL,
+        date TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (account, task, date)
+    ) WITHOUT ROWID
+    """
+
+    def __init__(self, path: PathT, timeout: float = 30.0):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(self.SCHEMA)
+
+    def _executemany(self, sql: str, params: Iterable[tuple]) -> int:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.executemany(sql, params)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return cursor.rowcount
+
+    def get(self, account: str, task: str, date: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM sign_records"
+                " WHERE account = ? AND task = ? AND date = ?",
+                (account, task, date),
+            ).fetchone()
+        return row[0] if row else None
+
+    def upsert(self, account: str, task: str, date: str, value: str):
+        self.upsert_many(account, task, {date: value})
+
+    def upsert_many(self, account: str, task: str, records: Dict[str, str]):
+        if not records:
+            return
+        self._executemany(
+            "INSERT INTO sign_records (account, task, date, value)"
+            " VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (account, task, date) DO UPDATE SET value = excluded.value",
+            ((account, task, date, value) for date, value in records.items()),
+        )
+
+    def records(self, account: str, task: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, value FROM sign_records"
+                " WHERE account = ? AND task = ? ORDER BY date",
+                (account, task),
+            ).fetchall()
+        return dict(rows)
+
+    def last(self, account: str, task: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT date, value FROM sign_records"
+                " WHERE account = ? AND task = ? ORDER BY date DESC LIMIT 1",
+                (account, task),
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def prune(self, before: str, account: str = None, task: str = None) -> int:
+        sql = "DELETE FROM sign_records WHERE date < ?"
+        params = [before]
+        if account is not None:
+            sql += " AND account = ?"
+            params.append(account)
+        if task is not None:
+            sql += " AND task = ?"
+            params.append(task)
+        return self._executemany(sql, [tuple(params)])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_STATE_STORES: Dict[Tuple[str, str], StateStore] = {}
+_STATE_STORES_LOCK = threading.Lock()
+
+
+def get_state_store(workdir: PathT, backend: str = None) -> StateStore:
+    """
+    获取工作目录对应的执行记录存储，同一进程内按路径复用。
+    `backend`默认取环境变量`TG_STATE_BACKEND`，可选`sqlite`（默认）或`json`。
+    """
+    backend = (backend or os.environ.get("TG_STATE_BACKEND") or "sqlite").lower()
+    workdir = pathlib.Path(workdir)
+    key = (str(workdir.resolve()), backend)
+    with _STATE_STORES_LOCK:
+        store = _STATE_STORES.get(key)
+        if store is None:
+            if backend == "json":
+                store = JSONStateStore(workdir / "signs")
+            elif backend == "sqlite":
+                store = SQLiteStateStore(workdir / "state.sqlite3")
+            else:
+                raise ValueError(f"不支持的状态存储类型: {backend}")
+            _STATE_STORES[key] = store
+        return store
+
+
+def close_state_stores():
+    with _STATE_STORES_LOCK:
+        for store in _STATE_STORES.values():
+            store.close()
+        _STATE_STORES.clear()
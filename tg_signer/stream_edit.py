@@ -0,0 +1,78 @@
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+SendFuncT = Callable[[str], Awaitable[Any]]
+EditFuncT = Callable[[Any, str], Awaitable[Any]]
+
+# Telegram单条文本消息的长度上限
+MAX_MESSAGE_LENGTH = 4096
+
+
+class ProgressiveMessage:
+    """
+    流式聚合发送：收到首段文本立即发送，之后的片段先累积，
+    距离上次发送/编辑超过`min_interval`秒时再合并为一次编辑，
+    避免每个token都编辑消息而触发限流。
+
+    :param send: 发送新消息，参数为文本，返回消息对象
+    :param edit: 编辑消息，参数为`send`返回的消息对象和完整文本
+    :param min_interval: 两次编辑之间的最小间隔（秒）
+    :param min_first_chars: 首段至少累积多少个非空白字符才发送
+    """
+
+    def __init__(
+        self,
+        send: SendFuncT,
+        edit: EditFuncT,
+        min_interval: float = 1.5,
+        min_first_chars: int = 1,
+        max_length: int = MAX_MESSAGE_LENGTH,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.send = send
+        self.edit = edit
+        self.min_interval = min_interval
+        self.min_first_chars = min_first_chars
+        self.max_length = max_length
+        self.clock = clock
+        self.text = ""
+        self.message = None
+        self.edits = 0
+        self._shown = ""
+        self._last_update = 0.0
+
+    @property
+    def _visible(self) -> str:
+        return self.text[: self.max_length].strip()
+
+    async def _send(self):
+        self._shown = self._visible
+        self.message = await self.send(self._shown)
+        self._last_update = self.clock()
+
+    async def _edit(self):
+        text = self._visible
+        # 内容没有变化时Telegram会报错MESSAGE_NOT_MODIFIED
+        if text == self._shown:
+            return
+        self._shown = text
+        self._last_update = self.clock()
+        await self.edit(self.message, text)
+        self.edits += 1
+
+    async def feed(self, delta: str):
+        self.text += delta
+        if self.message is None:
+            if len(self._visible) >= self.min_first_chars:
+                await self._send()
+        elif self.clock() - self._last_update >= self.min_interval:
+            await self._edit()
+
+    async def finish(self) -> Optional[Any]:
+        """发送剩余内容，返回消息对象；没有任何内容时返回None"""
+        if self.message is None:
+            if self._visible:
+                await self._send()
+        else:
+            await self._edit()
+        return self.message
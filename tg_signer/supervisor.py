@@ -0,0 +1,320 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import queue
+import time
+from typing import Dict, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger("tg-signer")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """一致性哈希环，增减节点时只有少量key会被重新分配"""
+
+    def __init__(self, nodes: Iterable[Hashable] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._keys: List[int] = []
+        self._nodes: Dict[int, Hashable] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: Hashable):
+        for i in range(self.replicas):
+            h = _hash(f"{node}#{i}")
+            self._nodes[h] = node
+            bisect.insort(self._keys, h)
+
+    def remove(self, node: Hashable):
+        for i in range(self.replicas):
+            h = _hash(f"{node}#{i}")
+            del self._nodes[h]
+            self._keys.remove(h)
+
+    def get(self, key: str) -> Hashable:
+        if not self._keys:
+            raise LookupError("HashRing is empty")
+        idx = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[self._keys[idx]]
+
+    def assign(self, keys: Iterable[str]) -> Dict[Hashable, List[str]]:
+        shards: Dict[Hashable, List[str]] = {}
+        for key in keys:
+            shards.setdefault(self.get(key), []).append(key)
+        return shards
+
+
+def _report(status_queue, worker: int, account: Optional[str], state: str, **kw):
+    try:
+        status_queue.put_nowait(
+            {
+                "worker": worker,
+                "pid": os.getpid(),
+                "account": account,
+                "state": state,
+                "ts": time.time(),
+                **kw,
+            }
+        )
+    except Exception:  # 状态上报失败不影响签到
+        pass
+
+
+async def _run_account(
+    worker: int,
+    account: str,
+    task_name: str,
+    ctx_obj: dict,
+    num_of_dialogs: int,
+    status_queue,
+    restart_delay: float,
+):
+    from tg_signer.core import UserSigner
+
+    delay = restart_delay
+    while True:
+        _report(status_queue, worker, account, "running", task=task_name)
+        try:
+            signer = UserSigner(
+                task_name=task_name,
+                account=account,
+                proxy=ctx_obj["proxy"],
+                session_dir=ctx_obj["session_dir"],
+                workdir=ctx_obj["workdir"],
+                session_string=ctx_obj["session_string"],
+                in_memory=ctx_obj["in_memory"],
+                refresh_dialogs=ctx_obj.get("refresh_dialogs", False),
+            )
+            await signer.run(num_of_dialogs)
+            _report(status_queue, worker, account, "stopped", task=task_name)
+            return
+        except Exception as e:
+            logger.exception(e)
+            _report(
+                status_queue, worker, account, "error", task=task_name, error=str(e)
+            )
+        # 单个账号出错只重启该账号，不影响同进程的其它账号
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 300)
+
+
+def worker_main(
+    worker: int,
+    accounts: List[str],
+    task_name: str,
+    ctx_obj: dict,
+    num_of_dialogs: int,
+    status_queue,
+    log_level: str = "INFO",
+    log_file: str = "tg-signer.log",
+    restart_delay: float = 5,
+):
+    """子进程入口：在独立的事件循环中运行分配到的账号"""
+    from tg_signer.events import configure_events, events_enabled_by_env
+    from tg_signer.logger import configure_logger
+    from tg_signer.metrics import configure_metrics
+
+    # 每个worker写自己的日志文件，避免多进程同时轮转同一个文件
+    log_path = pathlib.Path(log_file)
+    configure_logger(
+        log_level,
+        str(log_path.with_name(f"{log_path.stem}.worker-{worker}{log_path.suffix}")),
+    )
+    if events_enabled_by_env():
+        configure_events(
+            pathlib.Path(ctx_obj["workdir"]) / f"events.worker-{worker}.jsonl"
+        )
+    metrics_port = ctx_obj.get("metrics_port")
+    metrics_file = ctx_obj.get("metrics_file")
+    if metrics_port or metrics_file:
+        if metrics_file:
+            metrics_path = pathlib.Path(metrics_file)
+            metrics_file = str(
+                metrics_path.with_name(
+                    f"{metrics_path.stem}.worker-{worker}{metrics_path.suffix}"
+                )
+            )
+        configure_metrics(
+            port=metrics_port + 1 + worker if metrics_port else None,
+            snapshot_file=metrics_file,
+        )
+    logger.info(f"Worker {worker} (pid {os.getpid()}) 负责账号: {accounts}")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    coros = [
+        _run_account(
+            worker,
+            account,
+            task_name,
+            ctx_obj,
+            num_of_dialogs,
+            status_queue,
+            restart_delay,
+        )
+        for account in accounts
+    ]
+    try:
+        loop.run_until_complete(asyncio.gather(*coros))
+    finally:
+        loop.close()
+
+
+class Supervisor:
+    """
+    多账号多进程运行：账号按一致性哈希分配到`num_workers`个子进程，每个子进程有自己的事件循环。
+    子进程异常退出后自动重启（指数退避），各账号的状态汇总到`status_file`。
+    """
+
+    def __init__(
+        self,
+        accounts: Iterable[str],
+        task_name: str,
+        ctx_obj: dict,
+        num_workers: int,
+        num_of_dialogs: int = 50,
+        log_level: str = "INFO",
+        log_file: str = "tg-signer.log",
+        status_file: Optional[pathlib.Path] = None,
+        restart_delay: float = 5,
+        max_restart_delay: float = 300,
+    ):
+        self.accounts = list(dict.fromkeys(accounts))
+        self.task_name = task_name
+        self.ctx_obj = ctx_obj
+        self.num_workers = max(1, min(num_workers, len(self.accounts)))
+        self.num_of_dialogs = num_of_dialogs
+        self.log_level = log_level
+        self.log_file = log_file
+        self.status_file = status_file
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.ring = HashRing(range(self.num_workers))
+        self.shards: Dict[int, List[str]] = self.ring.assign(self.accounts)
+        self._mp = multiprocessing.get_context("spawn")
+        self.status_queue = self._mp.Queue()
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.restarts: Dict[int, int] = dict.fromkeys(self.shards, 0)
+        self._restart_at: Dict[int, float] = {}
+        self.account_status: Dict[str, dict] = {}
+
+    def _spawn(self, worker: int):
+        process = self._mp.Process(
+            target=worker_main,
+            name=f"tg-signer-worker-{worker}",
+            args=(
+                worker,
+                self.shards[worker],
+                self.task_name,
+                self.ctx_obj,
+                self.num_of_dialogs,
+                self.status_queue,
+                self.log_level,
+                self.log_file,
+                self.restart_delay,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self.processes[worker] = process
+        logger.info(
+            f"启动worker {worker} (pid {process.pid}), 账号: {self.shards[worker]}"
+        )
+
+    def start(self):
+        for worker in self.shards:
+            self._spawn(worker)
+
+    def collect_status(self) -> bool:
+        changed = False
+        while True:
+            try:
+                item = self.status_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.account_status[item["account"]] = item
+            changed = True
+        return changed
+
+    def check_workers(self) -> bool:
+        """重启异常退出的worker，返回是否还有worker需要运行"""
+        now = time.monotonic()
+        alive = False
+        for worker, process in list(self.processes.items()):
+            if process.is_alive():
+                alive = True
+                continue
+            if process.exitcode == 0:
+                continue
+            alive = True
+            if worker not in self._restart_at:
+                self.restarts[worker] += 1
+                delay = min(
+                    self.restart_delay * 2 ** (self.restarts[worker] - 1),
+                    self.max_restart_delay,
+                )
+                logger.warning(
+                    f"worker {worker} 异常退出(exitcode={process.exitcode}), {delay}秒后重启"
+                )
+                self._restart_at[worker] = now + delay
+            elif now >= self._restart_at[worker]:
+                del self._restart_at[worker]
+                self._spawn(worker)
+        return alive
+
+    def status(self) -> dict:
+        return {
+            "task": self.task_name,
+            "workers": {
+                worker: {
+                    "pid": process.pid,
+                    "alive": process.is_alive(),
+                    "restarts": self.restarts[worker],
+                    "accounts": self.shards[worker],
+                }
+                for worker, process in self.processes.items()
+            },
+            "accounts": self.account_status,
+        }
+
+    def write_status(self):
+        if not self.status_file:
+            return
+        self.status_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.status_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(self.status(), fp, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.status_file)
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(10)
+
+    def run(self, interval: float = 1.0):
+        self.start()
+        self.write_status()
+        try:
+            while True:
+                time.sleep(interval)
+                changed = self.collect_status()
+                alive = self.check_workers()
+                if changed:
+                    self.write_status()
+                if not alive:
+                    break
+        except KeyboardInterrupt:
+            logger.info("正在停止所有worker...")
+        finally:
+            self.stop()
+            self.collect_status()
+            self.write_status()
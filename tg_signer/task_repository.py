@@ -0,0 +1,97 @@
+import json
+import os
+import pathlib
+from typing import Generic, List, Type, TypeVar, Union
+
+from .config import BaseJSONConfig
+from .config_cache import ConfigLoadError, get_config_cache
+from .workdir import get_task_index
+
+ConfigT = TypeVar("ConfigT", bound=BaseJSONConfig)
+PathT = Union[str, pathlib.Path]
+
+CONFIG_FILE_NAME = "config.json"
+# 签到任务和监控任务的配置分别存放在工作目录下的这两个子目录中
+SIGN_TASKS_DIR = "signs"
+MONITOR_TASKS_DIR = "monitors"
+
+
+def write_json_atomic(path: pathlib.Path, data):
+    """先写临时文件再替换，运行中的任务热加载时不会读到写了一半的文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False)
+    os.replace(tmp_file, path)
+
+
+class TaskConfigRepository(Generic[ConfigT]):
+    """
+    `tasks_dir`下各任务配置文件的读写，只访问文件系统。
+    `list`、`export`、`import`、`reconfig`等离线命令通过它读写配置，
+    不需要创建Telegram客户端。
+    """
+
+    def __init__(self, tasks_dir: PathT, cfg_cls: Type[ConfigT]):
+        self.tasks_dir = pathlib.Path(tasks_dir)
+        self.cfg_cls = cfg_cls
+        self.index = get_task_index(self.tasks_dir)
+
+    def task_dir(self, task_name: str) -> pathlib.Path:
+        return self.tasks_dir / task_name
+
+    def config_file(self, task_name: str) -> pathlib.Path:
+        return self.task_dir(task_name) / CONFIG_FILE_NAME
+
+    def list_tasks(self, with_config: bool = False) -> List[str]:
+        """按名称排序的任务列表，`with_config`为True时只返回已有配置文件的任务"""
+        names = self.index.names()
+        if with_config:
+            names = [name for name in names if self.config_file(name).is_file()]
+        return names
+
+    def parse(self, data) -> ConfigT:
+        """
+        校验配置数据，旧版本配置升级为当前版本。
+        :raises ConfigLoadError: 不是合法的配置
+        """
+        loaded = self.cfg_cls.load(data)
+        if loaded is None:
+            raise ConfigLoadError(f"配置无法解析为{self.cfg_cls.__name__}")
+        return loaded[0]
+
+    def loads(self, config_str: str) -> ConfigT:
+        try:
+            data = json.loads(config_str)
+        except json.JSONDecodeError as e:
+            raise ConfigLoadError(f"配置不是合法的JSON: {e}") from e
+        return self.parse(data)
+
+    def load(self, task_name: str) -> ConfigT:
+        """
+        读取任务配置，旧版本配置会升级后写回。
+        :raises FileNotFoundError: 配置文件不存在
+        :raises ConfigLoadError: 配置文件内容不合法
+        """
+        config_file = self.config_file(task_name)
+        config, from_old, _ = get_config_cache().load(config_file, self.cfg_cls)
+        if from_old:
+            self.write(task_name, config)
+        return config
+
+    def write(self, task_name: str, config: Union[ConfigT, dict]):
+        if isinstance(config, BaseJSONConfig):
+            config = config.to_jsonable()
+        config_file = self.config_file(task_name)
+        write_json_atomic(config_file, config)
+        get_config_cache().invalidate(config_file)
+
+    def export(self, task_name: str) -> str:
+        with open(self.config_file(task_name), "r", encoding="utf-8") as fp:
+            return fp.read()
+
+    def import_(self, task_name: str, config_str: str) -> ConfigT:
+        """校验并导入配置，旧版本配置升级后带版本号写入"""
+        config = self.loads(config_str)
+        self.write(task_name, config)
+        return config
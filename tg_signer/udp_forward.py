@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import weakref
+from typing import Dict, List, Literal, Optional, Tuple
+
+from pyrogram.types import Message
+from typing_extensions import TypeAlias
+
+logger = logging.getLogger("tg-signer")
+
+UDPFormatT: TypeAlias = Literal["str", "json"]
+RECORD_SEP = b"\n"
+
+
+def serialize_message(message: Message, fmt: UDPFormatT = "str") -> bytes:
+    """
+    序列化消息。``str``为pyrogram默认的多行JSON（包含所有字段），
+    ``json``为只包含常用字段的紧凑单行JSON，适合合并发送。
+    """
+    if fmt == "json":
+        from_user = message.from_user
+        chat = message.chat
+        data = {
+            "id": message.id,
+            "chat_id": chat.id if chat else None,
+            "chat_username": chat.username if chat else None,
+            "from_user_id": from_user.id if from_user else None,
+            "from_username": from_user.username if from_user else None,
+            "date": message.date.isoformat() if message.date else None,
+            "text": message.text or message.caption,
+        }
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+    return str(message).encode("utf-8")
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    """内部使用的UDP协议处理类"""
+
+    def __init__(self):
+        self.transport = None
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        pass  # 不需要处理接收的数据
+
+    def error_received(self, exc):
+        logger.warning(f"UDP error received: {exc}")
+
+    def connection_lost(self, exc):
+        self.closed = True
+
+
+class UDPSender:
+    """
+    一个长连接的UDP发送端。
+    开启合并模式时，在`batch_interval`内到达的多条记录会以``\\n``分隔打包为一个数据报，
+    单个数据报不超过`max_datagram_size`字节（单条记录超过该大小时单独发送）。
+    """
+
+    def __init__(
+        self,
+        transport: asyncio.DatagramTransport,
+        protocol: _UDPProtocol,
+    ):
+        self.transport = transport
+        self.protocol = protocol
+        self._buffer: List[bytes] = []
+        self._buffer_size = 0
+        self._max_size = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.datagrams_sent = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.protocol.closed or self.transport.is_closing()
+
+    def _sendto(self, data: bytes):
+        self.transport.sendto(data)
+        self.datagrams_sent += 1
+
+    def send(
+        self,
+        data: bytes,
+        batch: bool = False,
+        max_datagram_size: int = 1400,
+        batch_interval: float = 0.05,
+    ):
+        if not batch:
+            self._sendto(data)
+            return
+        # 同一地址的多个配置可能设置了不同的上限，已缓冲的数据报按其中最小的限制
+        limit = min(self._max_size, max_datagram_size) if self._buffer else 0
+        needed = len(data) + (len(RECORD_SEP) if self._buffer else 0)
+        if self._buffer and self._buffer_size + needed > limit:
+            self.flush()
+            needed = len(data)
+        self._max_size = (
+            min(self._max_size, max_datagram_size)
+            if self._buffer
+            else max_datagram_size
+        )
+        self._buffer.append(data)
+        self._buffer_size += needed
+        if self._buffer_size >= self._max_size:
+            self.flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(batch_interval, self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buffer:
+            return
+        data = RECORD_SEP.join(self._buffer)
+        self._buffer.clear()
+        self._buffer_size = 0
+        self._max_size = 0
+        if not self.closed:
+            self._sendto(data)
+
+    def close(self):
+        self.flush()
+        self.transport.close()
+
+
+class UDPTransportPool:
+    """按``(host, port)``缓存长期存在的UDP发送端，避免每条消息都创建和关闭socket"""
+
+    def __init__(self):
+        self._senders: Dict[Tuple[str, int], UDPSender] = {}
+        self._lock = asyncio.Lock()
+
+    async def get_sender(self, host: str, port: int) -> UDPSender:
+        key = (host, port)
+        sender = self._senders.get(key)
+        if sender is not None and not sender.closed:
+            return sender
+        async with self._lock:
+            sender = self._senders.get(key)
+            if sender is None or sender.closed:
+                loop = asyncio.get_running_loop()
+                transport, protocol = await loop.create_datagram_endpoint(
+                    _UDPProtocol, remote_addr=key
+                )
+                sender = self._senders[key] = UDPSender(transport, protocol)
+        return sender
+
+    def close(self):
+        senders, self._senders = list(self._senders.values()), {}
+        for sender in senders:
+            sender.close()
+
+
+_UDP_POOLS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, UDPTransportPool]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_udp_pool() -> UDPTransportPool:
+    loop = asyncio.get_running_loop()
+    pool = _UDP_POOLS.get(loop)
+    if pool is None:
+        pool = _UDP_POOLS[loop] = UDPTransportPool()
+    return pool
+
+
+def close_udp_pool():
+    loop = asyncio.get_running_loop()
+    pool = _UDP_POOLS.pop(loop, None)
+    if pool is not None:
+        pool.close()
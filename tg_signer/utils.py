@@ -1,7 +1,30 @@
-from typing import Dict, Literal
+import os
+from typing import Dict, Literal, Optional
+from urllib import parse
 
 from typing_extensions import TypeAlias
 
+
+def get_api_config():
+    api_id = int(os.environ.get("TG_API_ID", 611335))
+    api_hash = os.environ.get("TG_API_HASH", "d524b414d21f4d37f08684c1df41ac9c")
+    return api_id, api_hash
+
+
+def get_proxy(proxy: str = None) -> Optional[dict]:
+    proxy = proxy or os.environ.get("TG_PROXY")
+    if proxy:
+        r = parse.urlparse(proxy)
+        return {
+            "scheme": r.scheme,
+            "hostname": r.hostname,
+            "port": r.port,
+            "username": r.username,
+            "password": r.password,
+        }
+    return None
+
+
 NumberingLangT: TypeAlias = Literal[
     "arabic",
     "chinese_simple",
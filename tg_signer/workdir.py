@@ -0,0 +1,118 @@
+import os
+import pathlib
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+PathT = Union[str, pathlib.Path]
+
+# mtime粒度较粗的文件系统（如FAT为2秒）上，同一时间粒度内的修改不会改变mtime，
+# 目录mtime距扫描时间不足该值（秒）时不信任缓存
+RACY_WINDOW = 2.0
+
+
+class TaskIndex:
+    """
+    任务目录索引：一次`os.scandir`列出全部任务目录（不对每个条目单独stat），
+    `tasks_dir`本身的mtime、inode和链接数都不变时直接返回上次的结果。
+    扫描时目录刚被修改过（见`RACY_WINDOW`）则下次仍重新扫描，
+    避免同一mtime粒度内新建的目录一直不可见。
+    """
+
+    def __init__(self, tasks_dir: PathT):
+        self.tasks_dir = pathlib.Path(tasks_dir)
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._racy = False
+        self._names: List[str] = []
+        self.scans = 0
+
+    def names(self) -> List[str]:
+        """按名称排序的任务目录名"""
+        try:
+            st = os.stat(self.tasks_dir)
+        except FileNotFoundError:
+            self._stamp = None
+            return []
+        # 先stat再扫描，扫描期间新增的目录会在下次调用时被发现；
+        # 新增子目录会改变多数文件系统上目录的链接数，mtime未变时也能发现
+        stamp = (st.st_mtime_ns, st.st_ino, st.st_nlink)
+        if stamp != self._stamp or self._racy:
+            with os.scandir(self.tasks_dir) as it:
+                self._names = sorted(entry.name for entry in it if entry.is_dir())
+            self._stamp = stamp
+            self._racy = time.time() - st.st_mtime < RACY_WINDOW
+            self.scans += 1
+        return list(self._names)
+
+    def __contains__(self, task_name: str) -> bool:
+        return task_name in self.names()
+
+    def invalidate(self):
+        self._stamp = None
+        self._racy = False
+
+
+class WorkdirLayout:
+    """
+    工作目录结构。路径对象只构造一次并缓存，目录在第一次访问时创建，
+    之后的访问不再检查文件系统。目录被外部删除后需调用`forget`。
+    """
+
+    def __init__(self, workdir: PathT, tasks_dir_name: str):
+        self.root = pathlib.Path(workdir)
+        self.tasks_dir_name = tasks_dir_name
+        self.task_index = get_task_index(self.root / tasks_dir_name)
+        self._dirs: Dict[Tuple[str, ...], pathlib.Path] = {}
+
+    def dir(self, *parts: str) -> pathlib.Path:
+        """工作目录下的子目录，第一次访问时创建"""
+        path = self._dirs.get(parts)
+        if path is None:
+            path = self.root.joinpath(*parts)
+            os.makedirs(path, exist_ok=True)
+            self._dirs[parts] = path
+        return path
+
+    @property
+    def workdir(self) -> pathlib.Path:
+        return self.dir()
+
+    @property
+    def tasks_dir(self) -> pathlib.Path:
+        return self.dir(self.tasks_dir_name)
+
+    def task_dir(self, task_name: str) -> pathlib.Path:
+        return self.dir(self.tasks_dir_name, task_name)
+
+    def user_dir(self, user_id: int) -> pathlib.Path:
+        return self.dir("users", str(user_id))
+
+    def forget(self):
+        self._dirs.clear()
+        self.task_index.invalidate()
+
+
+_LAYOUTS: Dict[Tuple[str, str], WorkdirLayout] = {}
+_TASK_INDEXES: Dict[str, TaskIndex] = {}
+_LOCK = threading.Lock()
+
+
+def get_task_index(tasks_dir: PathT) -> TaskIndex:
+    key = os.path.abspath(tasks_dir)
+    with _LOCK:
+        index = _TASK_INDEXES.get(key)
+        if index is None:
+            index = _TASK_INDEXES[key] = TaskIndex(tasks_dir)
+        return index
+
+
+def get_workdir_layout(workdir: PathT, tasks_dir_name: str) -> WorkdirLayout:
+    """同一工作目录的多个任务/账号共享同一个实例"""
+    key = (os.path.abspath(workdir), tasks_dir_name)
+    with _LOCK:
+        layout = _LAYOUTS.get(key)
+    if layout is None:
+        layout = WorkdirLayout(workdir, tasks_dir_name)
+        with _LOCK:
+            layout = _LAYOUTS.setdefault(key, layout)
+    return layout